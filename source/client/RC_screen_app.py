@@ -6,17 +6,29 @@ __author__ = "Ron Remets"
 
 from kivy.app import App
 from kivy.properties import (BooleanProperty,
+                             BoundedNumericProperty,
                              NumericProperty,
                              ObjectProperty,
+                             OptionProperty,
                              StringProperty,
                              ListProperty)
 # this import is required by kivy
 # noinspection PyUnresolvedReferences
 import ui
 from connection_manager import ConnectionManager
+from frames.color_modes import COLOR_MODES
+from frames.delta_codec import (DEFAULT_KEYFRAME_INTERVAL,
+                                MIN_KEYFRAME_INTERVAL)
+from frames.tile_codec import MAX_QUALITY, MIN_QUALITY
 
 DEFAULT_SCREEN_IMAGE_FORMAT = "png"
+DEFAULT_SCREEN_IMAGE_QUALITY = 75
+DEFAULT_SCREEN_COLOR_MODE = "rgb"
+DEFAULT_SCREEN_TARGET_FPS = 30
+DEFAULT_SCREEN_MAX_FPS = 60
+MIN_SCREEN_FPS = 1
 ICON_PATH = "icon.ico"
+FULL_VIEWPORT = [0, 0, 1, 1]
 
 
 class RCScreenApp(App):
@@ -24,6 +36,47 @@ class RCScreenApp(App):
     Responsible for the whole client's application.
     """
     screen_image_format = StringProperty(DEFAULT_SCREEN_IMAGE_FORMAT)
+    # Values out of the range become the nearest end of it
+    screen_image_quality = BoundedNumericProperty(
+        DEFAULT_SCREEN_IMAGE_QUALITY,
+        min=MIN_QUALITY,
+        max=MAX_QUALITY,
+        errorhandler=lambda quality: max(MIN_QUALITY,
+                                         min(quality, MAX_QUALITY)))
+    # Whether the quality changes by how fast the link delivers frames
+    screen_adaptive_quality = BooleanProperty(False)
+    # Fewer colors for slow links, "auto" chooses by the link
+    screen_color_mode = OptionProperty(
+        DEFAULT_SCREEN_COLOR_MODE,
+        options=[*COLOR_MODES, "auto"])
+    # The frames per second to stream at and the most frames per second
+    # to stream at when catching up, values under 1 become 1
+    screen_target_fps = BoundedNumericProperty(
+        DEFAULT_SCREEN_TARGET_FPS,
+        min=MIN_SCREEN_FPS,
+        errorhandler=lambda fps: MIN_SCREEN_FPS)
+    screen_max_fps = BoundedNumericProperty(
+        DEFAULT_SCREEN_MAX_FPS,
+        min=MIN_SCREEN_FPS,
+        errorhandler=lambda fps: MIN_SCREEN_FPS)
+    # The most frames between keyframes of the delta and video formats,
+    # values under 1 become 1
+    screen_keyframe_interval = BoundedNumericProperty(
+        DEFAULT_KEYFRAME_INTERVAL,
+        min=MIN_KEYFRAME_INTERVAL,
+        errorhandler=lambda keyframe_interval: MIN_KEYFRAME_INTERVAL)
+    # Whether large changes are sent as a draft first and refined once
+    # they stop changing
+    screen_progressive = BooleanProperty(False)
+    # Whether the frames carry timestamps of every stage of their way.
+    # The controller turns it on while it shows or logs the latency.
+    screen_frame_timing = BooleanProperty(False)
+    # Whether the controller shows the frame rate and the latency of
+    # every stage of the frames over the frames
+    show_latency_overlay = BooleanProperty(False)
+    # The file the controller appends the latency summaries to as JSON
+    # lines, empty to not log them
+    latency_log_path = StringProperty("")
     username = StringProperty("")
     password = StringProperty("")
     # TODO: can connect_screen handle this?
@@ -36,6 +89,13 @@ class RCScreenApp(App):
     screen_size = ListProperty()
     other_screen_width = NumericProperty(0)
     other_screen_height = NumericProperty(0)
+    # The size the other side shows the frames at, empty if unknown
+    other_view_size = ListProperty()
+    # The region of the other screen that is shown and the region of
+    # this screen the other side shows, like (x, y, width, height) in
+    # fractions of the screen from the top left corner
+    viewport = ListProperty(FULL_VIEWPORT)
+    other_viewport = ListProperty(FULL_VIEWPORT)
 
     def on_stop(self):
         """
@@ -0,0 +1,3 @@
+"""
+Measure how fast the frame codecs are and how many bytes they send
+"""
@@ -0,0 +1,279 @@
+"""
+Run corpora of desktop frames through every frame codec and report how
+fast they are, how many bytes they send and how much they lose, as JSON,
+so runs before and after a change can be compared.
+Run from the client directory:
+    python -m benchmark.frame_codecs --frames 60 --bandwidth 10
+Recorded frames (a directory of images, ordered by name) can be added
+as another corpus:
+    python -m benchmark.frame_codecs --replay-path recordings/office
+"""
+__author__ = "Ron Remets"
+
+import argparse
+import datetime
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+import numpy
+
+from capture.synthetic_backend import SyntheticBackend
+from components.screen_recorder import ScreenRecorder
+from frames.color_modes import COLOR_MODES, PNG_ONLY_COLOR_MODES
+from frames.frame_buffer import FrameBuffer
+from frames.frame_update import FrameUpdate
+from frames.tile_codec import IMAGE_FORMATS, is_image_format_supported
+from frames.video_codec import VIDEO_FORMATS
+
+# The corpora and the synthetic content that makes them up
+CORPORA = {"office": "typing",
+           "scrolling": "scrolling text",
+           "terminal": "terminal",
+           "video": "video"}
+DEFAULT_FRAMES = 60
+DEFAULT_FRAME_SIZE = "1280x720"
+# The bandwidth of the link in megabits per second
+DEFAULT_BANDWIDTH = 10
+DEFAULT_QUALITY = 75
+DEFAULT_OUTPUT_FILE_NAME = "codec_results.jsonl"
+# Capture as fast as the codec can encode
+FRAME_RATE = 1000
+# The time in seconds to wait for the recorder to close
+CLOSE_TIMEOUT = 5
+# The time in seconds to wait for a frame before giving up on a codec
+FRAME_TIMEOUT = 30
+PIXEL_MAX = 255
+
+
+def find_codecs():
+    """
+    Find every frame codec this device supports, an image format and a
+    color mode. The video and delta formats only keep full color and
+    some color modes are always encoded as PNG, so those are skipped.
+    :return: A list of codecs like (image format, color mode).
+    """
+    codecs = []
+    for image_format in IMAGE_FORMATS + VIDEO_FORMATS:
+        if not is_image_format_supported(image_format):
+            continue
+        for color_mode in COLOR_MODES:
+            if color_mode != "rgb" and (image_format == "delta"
+                                        or image_format in VIDEO_FORMATS):
+                continue
+            if color_mode in PNG_ONLY_COLOR_MODES and image_format != "png":
+                continue
+            codecs.append((image_format, color_mode))
+    return codecs
+
+
+class _MeasuredRecorder(ScreenRecorder):
+    """
+    A screen recorder that keeps the captured pixels of every update,
+    so the frames the receiver rebuilds can be compared to them.
+    """
+    def __init__(self, capture_backend):
+        super().__init__(capture_backend)
+        self._sources_lock = threading.Lock()
+        # The updates that were not taken yet and their captured pixels,
+        # the oldest first
+        self._sources = {}
+
+    def _set_frame(self, update, pixels, *args):
+        with self._sources_lock:
+            # The update is kept too, so its id is not reused
+            self._sources[id(update)] = (update, pixels)
+        super()._set_frame(update, pixels, *args)
+
+    def take_frame(self):
+        """
+        Take the next update like frame.
+        :return: The update and its captured pixels like (update,
+                 pixels), or None if no new frame is available.
+        """
+        update = self.frame
+        if update is None:
+            return None
+        with self._sources_lock:
+            _, pixels = self._sources[id(update)]
+            # The updates before it were dropped
+            for key in list(self._sources):
+                del self._sources[key]
+                if key == id(update):
+                    break
+        return update, pixels
+
+
+def _squared_error(pixels, frame_buffer):
+    """
+    :param pixels: The captured frame as an array like (height, width,
+                   3).
+    :param frame_buffer: The FrameBuffer that rebuilt it.
+    :return: The mean squared error of the rebuilt frame.
+    """
+    rebuilt = frame_buffer.pixels[:, :, :3].astype(numpy.int32)
+    return float(numpy.mean((rebuilt - pixels) ** 2))
+
+
+def measure(capture_backend,
+            image_format,
+            color_mode,
+            quality=DEFAULT_QUALITY,
+            frames=DEFAULT_FRAMES,
+            bandwidth=DEFAULT_BANDWIDTH):
+    """
+    Stream frames through the screen recorder and rebuild them like the
+    receiver does.
+    :param capture_backend: The backend of the corpus, not opened.
+    :param image_format: The image format of the frames.
+    :param color_mode: The color mode of the frames.
+    :param quality: The quality of lossy formats.
+    :param frames: The amount of frames to stream.
+    :param bandwidth: The bandwidth of the link in megabits per second.
+    :return: A dict of the results, "psnr db" is None if every frame
+             was rebuilt exactly.
+    :raise RuntimeError: If the recorder stopped sending frames.
+    """
+    screen_recorder = _MeasuredRecorder(capture_backend)
+    screen_recorder.image_format = image_format
+    screen_recorder.color_mode = color_mode
+    screen_recorder.quality = quality
+    screen_recorder.set_frame_rate(FRAME_RATE, FRAME_RATE)
+    frame_buffer = FrameBuffer()
+    decode_time = 0
+    squared_error = 0
+    taken = 0
+    keyframes = 0
+    last_frame_time = time.perf_counter()
+    screen_recorder.start()
+    screen_recorder.frame_wanted = True
+    try:
+        while taken < frames:
+            frame = screen_recorder.take_frame()
+            if frame is None:
+                if time.perf_counter() - last_frame_time > FRAME_TIMEOUT:
+                    raise RuntimeError(f"No frame for {FRAME_TIMEOUT} "
+                                       f"seconds")
+                time.sleep(0.001)
+                continue
+            update, pixels = frame
+            last_frame_time = time.perf_counter()
+            taken += 1
+            decode_start_time = time.perf_counter()
+            frame_update = FrameUpdate.unpack(update)
+            frame_buffer.apply(frame_update)
+            decode_time += time.perf_counter() - decode_start_time
+            keyframes += frame_update.keyframe
+            squared_error += _squared_error(pixels, frame_buffer)
+    finally:
+        screen_recorder.close(CLOSE_TIMEOUT)
+    summary = screen_recorder.report.summary()
+    decode_ms = round(decode_time / taken * 1000, 3)
+    bytes_per_frame = summary["bytes per frame"]
+    # The stages run at the same time, so the slowest one sets the rate
+    fps_limits = [bandwidth * 1000 * 1000 / 8 / max(bytes_per_frame, 1),
+                  1000 / max(summary["encode ms"], 0.001),
+                  1000 / max(decode_ms, 0.001)]
+    mean_squared_error = squared_error / taken
+    psnr = None
+    if mean_squared_error:
+        psnr = round(10 * math.log10(PIXEL_MAX ** 2 / mean_squared_error),
+                     2)
+    return {"image_format": image_format,
+            "color_mode": color_mode,
+            "frames": taken,
+            "keyframes": keyframes,
+            "encode_ms": summary["encode ms"],
+            "decode_ms": decode_ms,
+            "bytes_per_frame": bytes_per_frame,
+            "fps_at_bandwidth": round(min(fps_limits), 2),
+            "psnr_db": psnr}
+
+
+def _parse_arguments():
+    """
+    :return: The arguments of the benchmark.
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark the frame codecs on desktop corpora")
+    parser.add_argument("--corpora", nargs="+", default=list(CORPORA),
+                        choices=list(CORPORA),
+                        help="The synthetic corpora to run")
+    parser.add_argument("--replay-path", nargs="*", default=[],
+                        help="Directories of recorded frames to run as "
+                             "more corpora, named by the directory")
+    parser.add_argument("--codecs", nargs="+",
+                        help="The image formats to run, all the "
+                             "supported formats by default")
+    parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES,
+                        help="The frames to stream of every corpus")
+    parser.add_argument("--frame-size", default=DEFAULT_FRAME_SIZE,
+                        help="The size of the synthetic frames like "
+                             "WIDTHxHEIGHT")
+    parser.add_argument("--bandwidth", type=float,
+                        default=DEFAULT_BANDWIDTH,
+                        help="The bandwidth of the link in megabits per "
+                             "second, for fps_at_bandwidth")
+    parser.add_argument("--quality", type=int, default=DEFAULT_QUALITY,
+                        help="The quality of the lossy formats")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_FILE_NAME,
+                        help="The file to append the JSON report to")
+    return parser.parse_args()
+
+
+def _create_corpora(arguments):
+    """
+    :param arguments: The arguments of the benchmark.
+    :return: A dict of the corpora like {name: function that creates
+             its capture backend}.
+    """
+    width, height = (int(number)
+                     for number in arguments.frame_size.split("x"))
+    corpora = {}
+    for name in arguments.corpora:
+        corpora[name] = (lambda content=CORPORA[name]: SyntheticBackend(
+            content, size=(width, height)))
+    for replay_path in arguments.replay_path:
+        name = os.path.basename(os.path.normpath(replay_path))
+        corpora[name] = (lambda path=replay_path: SyntheticBackend(
+            "replay", replay_path=path))
+    return corpora
+
+
+def main():
+    """
+    The entry point of the benchmark.
+    """
+    arguments = _parse_arguments()
+    codecs = [codec for codec in find_codecs()
+              if arguments.codecs is None or codec[0] in arguments.codecs]
+    results = {}
+    for corpus, create_backend in _create_corpora(arguments).items():
+        results[corpus] = []
+        for image_format, color_mode in codecs:
+            logging.info(f"BENCHMARK:Running {image_format} {color_mode} "
+                         f"on {corpus}")
+            results[corpus].append(measure(create_backend(),
+                                           image_format,
+                                           color_mode,
+                                           arguments.quality,
+                                           arguments.frames,
+                                           arguments.bandwidth))
+    report = {
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "frames": arguments.frames,
+        "frame_size": arguments.frame_size,
+        "bandwidth_mbps": arguments.bandwidth,
+        "quality": arguments.quality,
+        "corpora": results}
+    print(json.dumps(report, indent=4))
+    with open(arguments.output, "a") as output_file:
+        output_file.write(json.dumps(report) + "\n")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
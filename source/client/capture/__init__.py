@@ -0,0 +1,3 @@
+"""
+This is where all the ways to capture the screen are stored
+"""
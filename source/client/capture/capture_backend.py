@@ -0,0 +1,37 @@
+"""
+Base class for the ways to capture the screen
+"""
+__author__ = "Ron Remets"
+
+
+class CaptureBackend(object):
+    """
+    Base class for the ways to capture the screen.
+    open, grab and close are always called from the same thread, since
+    some backends can only be used from the thread that opened them.
+    """
+    @staticmethod
+    def is_available():
+        """
+        Check whether the backend can be used on this device.
+        :return: True if it can, False otherwise
+        """
+        return True
+
+    def open(self):
+        """
+        Prepare to capture. Call this before grab.
+        """
+
+    def grab(self):
+        """
+        Capture the screen without the cursor, which is streamed on its
+        own (See CursorBackend).
+        :return: The screen as an RGB PIL image.
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        """
+        Free everything the backend used.
+        """
@@ -0,0 +1,87 @@
+"""
+Choose and create the way to capture the screen
+"""
+__author__ = "Ron Remets"
+
+import logging
+
+from capture.image_grab_backend import ImageGrabBackend
+from capture.mss_backend import MssBackend
+from capture.synthetic_backend import SyntheticBackend
+from capture.x11_shm_backend import X11ShmBackend
+
+CAPTURE_BACKENDS = {
+    "image grab": ImageGrabBackend,
+    "mss": MssBackend,
+    "x11 shm": X11ShmBackend,
+    "synthetic": SyntheticBackend}
+# The backends to try when none was chosen, fastest first. The
+# synthetic backend is never chosen on its own.
+PREFERRED_CAPTURE_BACKENDS = ("x11 shm", "mss", "image grab")
+
+
+def find_capture_backends():
+    """
+    Find the backends that have what they need on this device.
+    :return: The names of the backends, fastest first.
+    :raise RuntimeError: If no backend is available on this device.
+    """
+    names = [name for name in PREFERRED_CAPTURE_BACKENDS
+             if CAPTURE_BACKENDS[name].is_available()]
+    if not names:
+        raise RuntimeError("No capture backend is available on this device")
+    return names
+
+
+def create_capture_backend(name=None, **options):
+    """
+    Create a capture backend.
+    :param name: The name of the backend (See CAPTURE_BACKENDS). If
+                 None, the fastest available backend is used.
+    :param options: Arguments for the backend, like the content of the
+                    synthetic backend.
+    :return: The backend object (not opened yet).
+    :raise ValueError: If there is no backend with this name.
+    :raise RuntimeError: If the backend cannot be used on this device.
+    """
+    if name is None:
+        name = find_capture_backends()[0]
+    try:
+        backend_class = CAPTURE_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"No such capture backend: {name}")
+    if not backend_class.is_available():
+        raise RuntimeError(f"Capture backend {name} is not available")
+    return backend_class(**options)
+
+
+def open_capture_backend(name=None, **options):
+    """
+    Create a capture backend and open it. Call this from the thread
+    that captures.
+    A backend can be available and still fail to open, like the x11 shm
+    backend on an X server without MIT-SHM or on a remote display, so
+    when no backend was chosen every available one is tried, fastest
+    first.
+    :param name: The name of the backend (See CAPTURE_BACKENDS). If
+                 None, the fastest backend that opens is used.
+    :param options: Arguments for the backend, like the content of the
+                    synthetic backend.
+    :return: The opened backend object.
+    :raise ValueError: If there is no backend with this name.
+    :raise RuntimeError: If no backend can capture on this device.
+    """
+    if name is not None:
+        capture_backend = create_capture_backend(name, **options)
+        capture_backend.open()
+        return capture_backend
+    for name in find_capture_backends():
+        capture_backend = create_capture_backend(name, **options)
+        try:
+            capture_backend.open()
+        except Exception:  # Every backend fails in its own way
+            logging.warning(f"FRAME:Capture backend {name} failed to "
+                            f"open, trying the next one", exc_info=True)
+            continue
+        return capture_backend
+    raise RuntimeError("No capture backend could open on this device")
@@ -0,0 +1,48 @@
+"""
+Base class for the ways to find the cursor of the screen
+"""
+__author__ = "Ron Remets"
+
+
+class CursorBackend(object):
+    """
+    Base class for the ways to find the cursor of the screen. The
+    capture backends capture the screen without the cursor, it is
+    streamed on its own (See CursorStreamer).
+    open, grab, grab_shape and close are always called from the same
+    thread.
+    """
+    @staticmethod
+    def is_available():
+        """
+        Check whether the backend can be used on this device.
+        :return: True if it can, False otherwise
+        """
+        return True
+
+    def open(self):
+        """
+        Prepare to find the cursor. Call this before grab.
+        """
+
+    def grab(self):
+        """
+        Find where the cursor is and which shape it has. This is called
+        much more often than frames are captured, so it must be cheap.
+        :return: A tuple like (x, y, shape id) with x and y in fractions
+                 of the screen from the top left corner and the id as a
+                 string, or None if the cursor is hidden.
+        """
+        raise NotImplementedError()
+
+    def grab_shape(self):
+        """
+        Capture the image of the shape the cursor has.
+        :return: A CursorShape object or None if the cursor is hidden.
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        """
+        Free everything the backend used.
+        """
@@ -0,0 +1,50 @@
+"""
+Choose and create the way to find the cursor of the screen
+"""
+__author__ = "Ron Remets"
+
+from capture.synthetic_cursor_backend import SyntheticCursorBackend
+from capture.win32_cursor_backend import Win32CursorBackend
+from capture.x11_cursor_backend import X11CursorBackend
+
+CURSOR_BACKENDS = {
+    "win32": Win32CursorBackend,
+    "x11": X11CursorBackend,
+    "synthetic": SyntheticCursorBackend}
+# The backends to try when none was chosen. The synthetic backend is
+# never chosen on its own.
+PREFERRED_CURSOR_BACKENDS = ("win32", "x11")
+
+
+def find_cursor_backend():
+    """
+    Find a backend that can find the cursor on this device.
+    :return: The name of the backend.
+    :raise RuntimeError: If no backend can find the cursor on this
+                         device.
+    """
+    for name in PREFERRED_CURSOR_BACKENDS:
+        if CURSOR_BACKENDS[name].is_available():
+            return name
+    raise RuntimeError("No cursor backend is available on this device")
+
+
+def create_cursor_backend(name=None, **options):
+    """
+    Create a cursor backend.
+    :param name: The name of the backend (See CURSOR_BACKENDS). If
+                 None, the first available backend is used.
+    :param options: Arguments for the backend.
+    :return: The backend object (not opened yet).
+    :raise ValueError: If there is no backend with this name.
+    :raise RuntimeError: If the backend cannot be used on this device.
+    """
+    if name is None:
+        name = find_cursor_backend()
+    try:
+        backend_class = CURSOR_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"No such cursor backend: {name}")
+    if not backend_class.is_available():
+        raise RuntimeError(f"Cursor backend {name} is not available")
+    return backend_class(**options)
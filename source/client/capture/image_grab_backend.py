@@ -0,0 +1,38 @@
+"""
+Capture the screen with PIL's ImageGrab
+"""
+__author__ = "Ron Remets"
+
+import os
+import sys
+
+import PIL.features
+import PIL.ImageGrab
+
+from capture.capture_backend import CaptureBackend
+
+
+class ImageGrabBackend(CaptureBackend):
+    """
+    Capture the screen with PIL's ImageGrab. Works on Windows and
+    macOS, and on Linux only if PIL was built with XCB.
+    """
+    @staticmethod
+    def is_available():
+        """
+        Check whether ImageGrab can capture on this device.
+        :return: True if it can, False otherwise
+        """
+        if sys.platform in ("win32", "darwin"):
+            return True
+        # On Linux ImageGrab captures through XCB
+        return (sys.platform.startswith("linux")
+                and "DISPLAY" in os.environ
+                and PIL.features.check("xcb"))
+
+    def grab(self):
+        """
+        Capture the screen.
+        :return: The screen as an RGB PIL image.
+        """
+        return PIL.ImageGrab.grab().convert("RGB")
@@ -0,0 +1,71 @@
+"""
+Capture the screen with mss
+"""
+__author__ = "Ron Remets"
+
+import os
+import sys
+
+import PIL.Image
+
+from capture.capture_backend import CaptureBackend
+
+try:
+    import mss
+except ImportError:
+    mss = None
+
+# The monitor to capture, 0 is all the monitors together and 1 is the
+# first monitor.
+DEFAULT_MONITOR = 1
+
+
+class MssBackend(CaptureBackend):
+    """
+    Capture the screen with mss, which uses the native API of every
+    platform (GDI, Quartz or X11) and is a lot faster than ImageGrab.
+    """
+    def __init__(self, monitor=DEFAULT_MONITOR):
+        """
+        :param monitor: The index of the monitor to capture.
+        """
+        self._monitor = monitor
+        self._screenshot = None
+
+    @staticmethod
+    def is_available():
+        """
+        Check whether mss is installed and has a screen to capture.
+        :return: True if it is, False otherwise
+        """
+        if mss is None:
+            return False
+        # On Linux mss uses X11
+        return not sys.platform.startswith("linux") or "DISPLAY" in os.environ
+
+    def open(self):
+        """
+        Create the mss instance. It can only be used in this thread.
+        """
+        self._screenshot = mss.mss()
+
+    def grab(self):
+        """
+        Capture the screen.
+        :return: The screen as an RGB PIL image.
+        """
+        shot = self._screenshot.grab(
+            self._screenshot.monitors[self._monitor])
+        return PIL.Image.frombuffer("RGB",
+                                    shot.size,
+                                    shot.bgra,
+                                    "raw",
+                                    "BGRX")
+
+    def close(self):
+        """
+        Close the mss instance.
+        """
+        if self._screenshot is not None:
+            self._screenshot.close()
+            self._screenshot = None
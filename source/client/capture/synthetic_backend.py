@@ -0,0 +1,243 @@
+"""
+Capture made up frames, for profiling and benchmarking without a screen
+"""
+__author__ = "Ron Remets"
+
+import os
+import random
+
+import numpy
+import PIL.Image
+import PIL.ImageDraw
+
+from capture.capture_backend import CaptureBackend
+
+SYNTHETIC_CONTENTS = ("typing", "scrolling text", "terminal", "video",
+                      "replay")
+DEFAULT_CONTENT = "scrolling text"
+DEFAULT_SIZE = (1920, 1080)
+DEFAULT_SEED = 0
+# The pixels the text scrolls every frame
+DEFAULT_SCROLL_SPEED = 4
+TEXT_LINE_HEIGHT = 14
+TEXT_MARGIN = 8
+TEXT_WORDS = ("remote", "screen", "frame", "tile", "mouse", "keyboard",
+              "server", "client", "partner", "socket", "buffer", "token",
+              "the", "a", "of", "to", "and", "is", "in", "it")
+BACKGROUND_COLOR = (255, 255, 255)
+TEXT_COLOR = (0, 0, 0)
+TERMINAL_BACKGROUND_COLOR = (12, 12, 12)
+TERMINAL_TEXT_COLOR = (204, 204, 204)
+TERMINAL_PROMPT = "$ "
+# The extensions of the images a replay can be made of
+REPLAY_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+
+
+class SyntheticBackend(CaptureBackend):
+    """
+    Capture made up frames. The same arguments always give the same
+    frames in the same order, so runs can be compared.
+    Contents:
+        typing - a page of text that a word is typed on every frame,
+                 like writing a document.
+        scrolling text - a page of text that scrolls down, like reading
+                         a document.
+        terminal - a dark terminal that prints a line of output every
+                   frame and scrolls up by a line, like a build log.
+        video - moving color waves and noise that change the whole
+                frame every time, like a playing video.
+        replay - frames recorded to image files, played in a loop.
+    """
+    def __init__(self,
+                 content=DEFAULT_CONTENT,
+                 size=DEFAULT_SIZE,
+                 seed=DEFAULT_SEED,
+                 scroll_speed=DEFAULT_SCROLL_SPEED,
+                 replay_path=None):
+        """
+        :param content: One of SYNTHETIC_CONTENTS.
+        :param size: The size of the frames like (width, height). Not
+                     used when replaying.
+        :param seed: The seed of the made up content.
+        :param scroll_speed: The pixels the text scrolls every frame.
+        :param replay_path: A directory of recorded frames to replay.
+        :raise ValueError: If the content does not exist or a replay
+                           has no path.
+        """
+        if content not in SYNTHETIC_CONTENTS:
+            raise ValueError(f"No such synthetic content: {content}")
+        if content == "replay" and replay_path is None:
+            raise ValueError("A replay needs a path to the frames")
+        self._content = content
+        self._size = size
+        self._seed = seed
+        self._scroll_speed = scroll_speed
+        self._replay_path = replay_path
+        self._frame_index = 0
+        self._page = None
+        self._typing_page = None
+        self._typing_position = None
+        self._typing_generator = None
+        self._terminal_lines = None
+        self._terminal_generator = None
+        self._noise = None
+        self._replay_frames = None
+
+    def _create_page(self):
+        """
+        Draw a page of random text, twice the height of the frame so
+        scrolling can wrap around it.
+        :return: The page as an array like (height, width, 3).
+        """
+        width, height = self._size
+        generator = random.Random(self._seed)
+        page = PIL.Image.new("RGB", (width, height * 2), BACKGROUND_COLOR)
+        draw = PIL.ImageDraw.Draw(page)
+        for y in range(TEXT_MARGIN, height * 2, TEXT_LINE_HEIGHT):
+            words = [generator.choice(TEXT_WORDS)
+                     for _ in range(generator.randint(0, width // 40))]
+            draw.text((TEXT_MARGIN, y), " ".join(words), fill=TEXT_COLOR)
+        return numpy.asarray(page)
+
+    def _load_replay_frames(self):
+        """
+        Load the recorded frames, ordered by file name.
+        :return: A list of RGB PIL images.
+        :raise ValueError: If the directory has no frames.
+        """
+        file_names = sorted(
+            name for name in os.listdir(self._replay_path)
+            if name.lower().endswith(REPLAY_EXTENSIONS))
+        if not file_names:
+            raise ValueError(f"No frames in {self._replay_path}")
+        return [PIL.Image.open(os.path.join(self._replay_path, name))
+                .convert("RGB") for name in file_names]
+
+    def open(self):
+        """
+        Create everything the content needs before the first frame.
+        """
+        self._frame_index = 0
+        if self._content == "scrolling text":
+            self._page = self._create_page()
+        elif self._content == "typing":
+            self._typing_page = PIL.Image.fromarray(
+                self._create_page()[:self._size[1]])
+            self._typing_position = (TEXT_MARGIN, self._size[1] // 2)
+            self._typing_generator = random.Random(self._seed)
+        elif self._content == "terminal":
+            self._terminal_lines = PIL.Image.new("RGB",
+                                                 self._size,
+                                                 TERMINAL_BACKGROUND_COLOR)
+            self._terminal_generator = random.Random(self._seed)
+        elif self._content == "video":
+            width, height = self._size
+            generator = numpy.random.default_rng(self._seed)
+            self._noise = generator.integers(0,
+                                             32,
+                                             (height, width, 1),
+                                             dtype=numpy.uint8)
+        else:
+            self._replay_frames = self._load_replay_frames()
+
+    def _grab_scrolling_text(self):
+        """
+        :return: The next window of the page as an array.
+        """
+        height = self._size[1]
+        top = (self._frame_index * self._scroll_speed) % height
+        return self._page[top:top + height]
+
+    def _grab_typing(self):
+        """
+        Type the next word on the page, on the next line when the line
+        is full. The line is cleared before typing on it.
+        :return: The page as an RGB PIL image.
+        """
+        width, height = self._size
+        draw = PIL.ImageDraw.Draw(self._typing_page)
+        word = self._typing_generator.choice(TEXT_WORDS) + " "
+        x, y = self._typing_position
+        word_width = draw.textlength(word)
+        if x + word_width > width - TEXT_MARGIN:
+            x = TEXT_MARGIN
+            y += TEXT_LINE_HEIGHT
+            if y + TEXT_LINE_HEIGHT > height:
+                y = TEXT_MARGIN
+            draw.rectangle((0, y, width, y + TEXT_LINE_HEIGHT - 1),
+                           fill=BACKGROUND_COLOR)
+        draw.text((x, y), word, fill=TEXT_COLOR)
+        self._typing_position = (x + word_width, y)
+        return self._typing_page.copy()
+
+    def _grab_terminal(self):
+        """
+        Scroll the terminal up by a line and print the next line at the
+        bottom, a prompt every few lines.
+        :return: The terminal as an RGB PIL image.
+        """
+        width, height = self._size
+        generator = self._terminal_generator
+        lines = numpy.asarray(self._terminal_lines)
+        scrolled = numpy.empty_like(lines)
+        scrolled[:height - TEXT_LINE_HEIGHT] = lines[TEXT_LINE_HEIGHT:]
+        scrolled[height - TEXT_LINE_HEIGHT:] = TERMINAL_BACKGROUND_COLOR
+        self._terminal_lines = PIL.Image.fromarray(scrolled)
+        words = [generator.choice(TEXT_WORDS)
+                 for _ in range(generator.randint(1, width // 60))]
+        line = " ".join(words)
+        if generator.random() < 0.1:
+            line = TERMINAL_PROMPT + line
+        draw = PIL.ImageDraw.Draw(self._terminal_lines)
+        draw.text((TEXT_MARGIN, height - TEXT_LINE_HEIGHT),
+                  line,
+                  fill=TERMINAL_TEXT_COLOR)
+        return self._terminal_lines.copy()
+
+    def _grab_video(self):
+        """
+        :return: The next frame of the color waves as an array.
+        """
+        width, height = self._size
+        phase = self._frame_index / 10
+        x = numpy.arange(width, dtype=numpy.float32)[numpy.newaxis, :]
+        y = numpy.arange(height, dtype=numpy.float32)[:, numpy.newaxis]
+        red = numpy.sin(x / 97 + phase) * 100 + 110
+        green = numpy.sin(y / 61 - phase * 1.3) * 100 + 110
+        blue = numpy.sin((x + y) / 143 + phase * 0.7) * 100 + 110
+        frame = numpy.empty((height, width, 3), dtype=numpy.uint8)
+        frame[:, :, 0] = red
+        frame[:, :, 1] = green
+        frame[:, :, 2] = blue
+        # Move the noise so the frames never repeat exactly
+        frame += numpy.roll(self._noise, self._frame_index * 7, axis=1)
+        return frame
+
+    def grab(self):
+        """
+        Make up the next frame.
+        :return: The frame as an RGB PIL image.
+        """
+        if self._content == "scrolling text":
+            frame = PIL.Image.fromarray(self._grab_scrolling_text())
+        elif self._content == "typing":
+            frame = self._grab_typing()
+        elif self._content == "terminal":
+            frame = self._grab_terminal()
+        elif self._content == "video":
+            frame = PIL.Image.fromarray(self._grab_video())
+        else:
+            frame = self._replay_frames[
+                self._frame_index % len(self._replay_frames)]
+        self._frame_index += 1
+        return frame
+
+    def close(self):
+        """
+        Forget the content.
+        """
+        self._page = None
+        self._typing_page = None
+        self._terminal_lines = None
+        self._noise = None
+        self._replay_frames = None
@@ -0,0 +1,80 @@
+"""
+A made up cursor, for profiling and benchmarking without a screen
+"""
+__author__ = "Ron Remets"
+
+import math
+import time
+
+import PIL.Image
+import PIL.ImageDraw
+
+from capture.cursor_backend import CursorBackend
+from frames.cursor_update import CursorShape
+
+# The turns per second the cursor moves in a circle at and the seconds
+# between changes of its shape
+DEFAULT_CURSOR_SPEED = 0.5
+DEFAULT_SHAPE_INTERVAL = 1
+CURSOR_SIZE = (16, 16)
+CIRCLE_RADIUS = 0.3
+SYNTHETIC_SHAPES = ("arrow", "circle")
+OUTLINE_COLOR = (0, 0, 0, 255)
+FILL_COLOR = (255, 255, 255, 255)
+
+
+class SyntheticCursorBackend(CursorBackend):
+    """
+    A made up cursor that moves in a circle around the middle of the
+    screen and switches between an arrow and a circle.
+    """
+    def __init__(self,
+                 speed=DEFAULT_CURSOR_SPEED,
+                 shape_interval=DEFAULT_SHAPE_INTERVAL):
+        """
+        :param speed: The turns per second the cursor moves at.
+        :param shape_interval: The seconds between changes of the shape.
+        """
+        self._speed = speed
+        self._shape_interval = shape_interval
+        self._start_time = None
+
+    def open(self):
+        """
+        Start moving the cursor.
+        """
+        self._start_time = time.monotonic()
+
+    def _get_shape_id(self, elapsed_time):
+        return SYNTHETIC_SHAPES[int(elapsed_time / self._shape_interval)
+                                % len(SYNTHETIC_SHAPES)]
+
+    def grab(self):
+        """
+        Find where the cursor is and which shape it has.
+        :return: A tuple like (x, y, shape id), see CursorBackend.
+        """
+        elapsed_time = time.monotonic() - self._start_time
+        angle = 2 * math.pi * self._speed * elapsed_time
+        return (0.5 + CIRCLE_RADIUS * math.cos(angle),
+                0.5 + CIRCLE_RADIUS * math.sin(angle),
+                self._get_shape_id(elapsed_time))
+
+    def grab_shape(self):
+        """
+        Draw the shape the cursor has.
+        :return: A CursorShape object.
+        """
+        shape_id = self._get_shape_id(time.monotonic() - self._start_time)
+        width, height = CURSOR_SIZE
+        image = PIL.Image.new("RGBA", CURSOR_SIZE)
+        draw = PIL.ImageDraw.Draw(image)
+        if shape_id == "arrow":
+            draw.polygon([(0, 0), (0, height - 1), (width // 2, height // 2)],
+                         fill=FILL_COLOR,
+                         outline=OUTLINE_COLOR)
+            return CursorShape(shape_id, 0, 0, image)
+        draw.ellipse((0, 0, width - 1, height - 1),
+                     fill=FILL_COLOR,
+                     outline=OUTLINE_COLOR)
+        return CursorShape(shape_id, width // 2, height // 2, image)
@@ -0,0 +1,136 @@
+"""
+Find the cursor with the cursor functions of Windows
+"""
+__author__ = "Ron Remets"
+
+import sys
+
+import numpy
+import PIL.Image
+
+from capture.cursor_backend import CursorBackend
+from frames.cursor_update import CursorShape
+
+try:
+    import win32api
+    import win32con
+    import win32gui
+    import win32ui
+except ImportError:
+    win32gui = None
+
+# The backgrounds the cursor is drawn on to find how transparent every
+# pixel of it is, as COLORREF values.
+BLACK = 0x000000
+WHITE = 0xffffff
+MAX_CHANNEL = 255
+
+
+class Win32CursorBackend(CursorBackend):
+    """
+    Find the cursor with the cursor functions of Windows. The handle of
+    the cursor is the id of its shape, Windows keeps one handle for
+    every shape it shows.
+    """
+    @staticmethod
+    def is_available():
+        """
+        Check whether this is Windows with pywin32 installed.
+        :return: True if it is, False otherwise
+        """
+        return sys.platform == "win32" and win32gui is not None
+
+    @staticmethod
+    def _get_screen_size():
+        """
+        :return: The size of the primary screen like (width, height),
+                 which is the screen that is captured.
+        """
+        return (win32api.GetSystemMetrics(win32con.SM_CXSCREEN),
+                win32api.GetSystemMetrics(win32con.SM_CYSCREEN))
+
+    def grab(self):
+        """
+        Find where the cursor is and which shape it has.
+        :return: A tuple like (x, y, shape id), see CursorBackend.
+        """
+        flags, cursor, (x, y) = win32gui.GetCursorInfo()
+        if not flags & win32con.CURSOR_SHOWING:
+            return None
+        width, height = self._get_screen_size()
+        return x / width, y / height, str(int(cursor))
+
+    @staticmethod
+    def _draw_cursor(cursor, size, background):
+        """
+        Draw the cursor on a background.
+        :param cursor: The handle of the cursor.
+        :param size: The size of the cursor like (width, height).
+        :param background: The color of the background as a COLORREF.
+        :return: The drawing as an array like (height, width, 3).
+        """
+        width, height = size
+        screen_dc_handle = win32gui.GetDC(0)
+        try:
+            screen_dc = win32ui.CreateDCFromHandle(screen_dc_handle)
+            memory_dc = screen_dc.CreateCompatibleDC()
+            bitmap = win32ui.CreateBitmap()
+            bitmap.CreateCompatibleBitmap(screen_dc, width, height)
+            memory_dc.SelectObject(bitmap)
+            memory_dc.FillSolidRect((0, 0, width, height), background)
+            win32gui.DrawIconEx(memory_dc.GetSafeHdc(),
+                                0,
+                                0,
+                                cursor,
+                                width,
+                                height,
+                                0,
+                                None,
+                                win32con.DI_NORMAL)
+            data = bitmap.GetBitmapBits(True)
+            memory_dc.DeleteDC()
+            win32gui.DeleteObject(bitmap.GetHandle())
+        finally:
+            win32gui.ReleaseDC(0, screen_dc_handle)
+        # The bitmap is BGRX
+        pixels = numpy.frombuffer(data, numpy.uint8).reshape(height,
+                                                             width,
+                                                             4)
+        return pixels[:, :, 2::-1].astype(numpy.int32)
+
+    def grab_shape(self):
+        """
+        Capture the image of the shape the cursor has. Windows can only
+        draw the cursor, so it is drawn on black and on white, and the
+        difference between them is how transparent every pixel is.
+        :return: A CursorShape object or None if the cursor is hidden.
+        """
+        flags, cursor, _ = win32gui.GetCursorInfo()
+        if not flags & win32con.CURSOR_SHOWING:
+            return None
+        _, hotspot_x, hotspot_y, _, _ = win32gui.GetIconInfo(cursor)
+        size = (win32api.GetSystemMetrics(win32con.SM_CXCURSOR),
+                win32api.GetSystemMetrics(win32con.SM_CYCURSOR))
+        on_black = self._draw_cursor(cursor, size, BLACK)
+        on_white = self._draw_cursor(cursor, size, WHITE)
+        alpha = numpy.clip(
+            MAX_CHANNEL - (on_white - on_black).max(axis=2),
+            0,
+            MAX_CHANNEL)
+        pixels = numpy.zeros((size[1], size[0], 4), dtype=numpy.uint8)
+        # On black, every pixel is its color times its opacity
+        pixels[:, :, :3] = numpy.clip(
+            on_black * MAX_CHANNEL // numpy.maximum(alpha, 1)[:, :, None],
+            0,
+            MAX_CHANNEL)
+        pixels[:, :, 3] = alpha
+        return CursorShape(str(int(cursor)),
+                           hotspot_x,
+                           hotspot_y,
+                           PIL.Image.frombuffer("RGBA",
+                                                size,
+                                                pixels.tobytes(),
+                                                "raw",
+                                                "RGBA",
+                                                0,
+                                                1))
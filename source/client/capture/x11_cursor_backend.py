@@ -0,0 +1,164 @@
+"""
+Find the cursor with the XFixes extension of X11
+"""
+__author__ = "Ron Remets"
+
+import ctypes
+import ctypes.util
+import os
+import sys
+
+import numpy
+import numpy.ctypeslib
+import PIL.Image
+
+from capture.cursor_backend import CursorBackend
+from frames.cursor_update import CursorShape
+
+
+class XFixesCursorImage(ctypes.Structure):
+    """
+    The XFixesCursorImage struct of the XFixes extension
+    """
+    _fields_ = [("x", ctypes.c_short),
+                ("y", ctypes.c_short),
+                ("width", ctypes.c_ushort),
+                ("height", ctypes.c_ushort),
+                ("xhot", ctypes.c_ushort),
+                ("yhot", ctypes.c_ushort),
+                ("cursor_serial", ctypes.c_ulong),
+                ("pixels", ctypes.POINTER(ctypes.c_ulong)),
+                ("atom", ctypes.c_ulong),
+                ("name", ctypes.c_char_p)]
+
+
+def _load_libraries():
+    """
+    Load X11 and its XFixes extension and declare the functions this
+    backend uses.
+    :return: A tuple like (xlib, xfixes)
+    :raise OSError: If a library is missing.
+    """
+    xlib = ctypes.CDLL(ctypes.util.find_library("X11"))
+    xfixes = ctypes.CDLL(ctypes.util.find_library("Xfixes"))
+
+    xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+    xlib.XOpenDisplay.restype = ctypes.c_void_p
+    xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+    xlib.XDefaultScreen.argtypes = [ctypes.c_void_p]
+    xlib.XDefaultScreen.restype = ctypes.c_int
+    xlib.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    xlib.XDisplayWidth.restype = ctypes.c_int
+    xlib.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    xlib.XDisplayHeight.restype = ctypes.c_int
+    xlib.XFree.argtypes = [ctypes.c_void_p]
+
+    xfixes.XFixesQueryExtension.argtypes = [ctypes.c_void_p,
+                                            ctypes.POINTER(ctypes.c_int),
+                                            ctypes.POINTER(ctypes.c_int)]
+    xfixes.XFixesQueryExtension.restype = ctypes.c_int
+    xfixes.XFixesGetCursorImage.argtypes = [ctypes.c_void_p]
+    xfixes.XFixesGetCursorImage.restype = ctypes.POINTER(
+        XFixesCursorImage)
+    return xlib, xfixes
+
+
+class X11CursorBackend(CursorBackend):
+    """
+    Find the cursor with the XFixes extension of X11. Every shape the
+    X server shows gets a new serial number, which is the id of the
+    shape.
+    """
+    def __init__(self):
+        self._xlib = None
+        self._xfixes = None
+        self._display = None
+        self._size = None
+        # The last cursor image, its pixels are only read for new shapes
+        self._cursor_image = None
+
+    @staticmethod
+    def is_available():
+        """
+        Check whether this is X11 with the libraries this backend needs.
+        :return: True if it is, False otherwise
+        """
+        return (sys.platform.startswith("linux")
+                and "DISPLAY" in os.environ
+                and ctypes.util.find_library("X11") is not None
+                and ctypes.util.find_library("Xfixes") is not None)
+
+    def open(self):
+        """
+        Connect to the X server.
+        :raise OSError: If the X server or its extension are missing.
+        """
+        self._xlib, self._xfixes = _load_libraries()
+        self._display = self._xlib.XOpenDisplay(None)
+        if not self._display:
+            raise OSError("Could not open the X display")
+        event_base = ctypes.c_int()
+        error_base = ctypes.c_int()
+        if not self._xfixes.XFixesQueryExtension(self._display,
+                                                 ctypes.byref(event_base),
+                                                 ctypes.byref(error_base)):
+            self.close()
+            raise OSError("The X server does not support XFixes")
+        screen = self._xlib.XDefaultScreen(self._display)
+        self._size = (self._xlib.XDisplayWidth(self._display, screen),
+                      self._xlib.XDisplayHeight(self._display, screen))
+
+    def _free_cursor_image(self):
+        if self._cursor_image:
+            self._xlib.XFree(self._cursor_image)
+            self._cursor_image = None
+
+    def grab(self):
+        """
+        Find where the cursor is and which shape it has.
+        :return: A tuple like (x, y, shape id), see CursorBackend.
+        :raise OSError: If the X server did not send the cursor.
+        """
+        self._free_cursor_image()
+        self._cursor_image = self._xfixes.XFixesGetCursorImage(
+            self._display)
+        if not self._cursor_image:
+            raise OSError("XFixesGetCursorImage failed")
+        cursor_image = self._cursor_image.contents
+        width, height = self._size
+        return (cursor_image.x / width,
+                cursor_image.y / height,
+                str(cursor_image.cursor_serial))
+
+    def grab_shape(self):
+        """
+        Capture the image of the shape the cursor had in the last grab.
+        :return: A CursorShape object.
+        """
+        cursor_image = self._cursor_image.contents
+        size = (cursor_image.width, cursor_image.height)
+        # The pixels are premultiplied ARGB in unsigned longs, which are
+        # longer than a pixel on 64 bit.
+        pixels = numpy.ctypeslib.as_array(
+            cursor_image.pixels,
+            shape=(cursor_image.height, cursor_image.width))
+        image = PIL.Image.frombuffer("RGBA",
+                                     size,
+                                     pixels.astype(numpy.uint32).tobytes(),
+                                     "raw",
+                                     "BGRa",
+                                     0,
+                                     1)
+        return CursorShape(str(cursor_image.cursor_serial),
+                           cursor_image.xhot,
+                           cursor_image.yhot,
+                           image)
+
+    def close(self):
+        """
+        Disconnect from the X server.
+        """
+        if self._display:
+            self._free_cursor_image()
+            self._xlib.XCloseDisplay(self._display)
+            self._display = None
@@ -0,0 +1,250 @@
+"""
+Capture the screen with the shared memory extension of X11
+"""
+__author__ = "Ron Remets"
+
+import ctypes
+import ctypes.util
+import os
+import sys
+
+import PIL.Image
+
+from capture.capture_backend import CaptureBackend
+
+# Values from the X11 and System V shared memory headers
+Z_PIXMAP = 2
+ALL_PLANES = ctypes.c_ulong(-1).value
+IPC_PRIVATE = 0
+IPC_CREAT = 0o1000
+IPC_RMID = 0
+SHARED_MEMORY_PERMISSIONS = 0o600
+# The only pixel layout this backend reads (BGRX, 4 bytes a pixel)
+SUPPORTED_BITS_PER_PIXEL = 32
+
+
+class XShmSegmentInfo(ctypes.Structure):
+    """
+    The XShmSegmentInfo struct of the XShm extension
+    """
+    _fields_ = [("shmseg", ctypes.c_ulong),
+                ("shmid", ctypes.c_int),
+                ("shmaddr", ctypes.c_void_p),
+                ("readOnly", ctypes.c_int)]
+
+
+class XImage(ctypes.Structure):
+    """
+    The start of the XImage struct of X11, only the fields this backend
+    reads
+    """
+    _fields_ = [("width", ctypes.c_int),
+                ("height", ctypes.c_int),
+                ("xoffset", ctypes.c_int),
+                ("format", ctypes.c_int),
+                ("data", ctypes.c_void_p),
+                ("byte_order", ctypes.c_int),
+                ("bitmap_unit", ctypes.c_int),
+                ("bitmap_bit_order", ctypes.c_int),
+                ("bitmap_pad", ctypes.c_int),
+                ("depth", ctypes.c_int),
+                ("bytes_per_line", ctypes.c_int),
+                ("bits_per_pixel", ctypes.c_int)]
+
+
+def _load_libraries():
+    """
+    Load X11, its shared memory extension and libc and declare the
+    functions this backend uses.
+    :return: A tuple like (xlib, xext, libc)
+    :raise OSError: If a library is missing.
+    """
+    xlib = ctypes.CDLL(ctypes.util.find_library("X11"))
+    xext = ctypes.CDLL(ctypes.util.find_library("Xext"))
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+    xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+    xlib.XOpenDisplay.restype = ctypes.c_void_p
+    xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+    xlib.XDefaultScreen.argtypes = [ctypes.c_void_p]
+    xlib.XDefaultScreen.restype = ctypes.c_int
+    xlib.XRootWindow.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    xlib.XRootWindow.restype = ctypes.c_ulong
+    xlib.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    xlib.XDefaultVisual.restype = ctypes.c_void_p
+    xlib.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    xlib.XDefaultDepth.restype = ctypes.c_int
+    xlib.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    xlib.XDisplayWidth.restype = ctypes.c_int
+    xlib.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    xlib.XDisplayHeight.restype = ctypes.c_int
+    xlib.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    xlib.XFree.argtypes = [ctypes.c_void_p]
+
+    xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+    xext.XShmQueryExtension.restype = ctypes.c_int
+    xext.XShmCreateImage.argtypes = [ctypes.c_void_p,
+                                     ctypes.c_void_p,
+                                     ctypes.c_uint,
+                                     ctypes.c_int,
+                                     ctypes.c_char_p,
+                                     ctypes.POINTER(XShmSegmentInfo),
+                                     ctypes.c_uint,
+                                     ctypes.c_uint]
+    xext.XShmCreateImage.restype = ctypes.POINTER(XImage)
+    xext.XShmAttach.argtypes = [ctypes.c_void_p,
+                                ctypes.POINTER(XShmSegmentInfo)]
+    xext.XShmAttach.restype = ctypes.c_int
+    xext.XShmDetach.argtypes = [ctypes.c_void_p,
+                                ctypes.POINTER(XShmSegmentInfo)]
+    xext.XShmGetImage.argtypes = [ctypes.c_void_p,
+                                  ctypes.c_ulong,
+                                  ctypes.POINTER(XImage),
+                                  ctypes.c_int,
+                                  ctypes.c_int,
+                                  ctypes.c_ulong]
+    xext.XShmGetImage.restype = ctypes.c_int
+
+    libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+    libc.shmget.restype = ctypes.c_int
+    libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+    libc.shmat.restype = ctypes.c_void_p
+    libc.shmdt.argtypes = [ctypes.c_void_p]
+    libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+    return xlib, xext, libc
+
+
+class X11ShmBackend(CaptureBackend):
+    """
+    Capture the screen with the shared memory extension of X11. The X
+    server copies the screen straight into memory this process shares
+    with it, which saves sending the whole screen through the X socket
+    every frame.
+    """
+    def __init__(self):
+        self._xlib = None
+        self._xext = None
+        self._libc = None
+        self._display = None
+        self._root = None
+        self._image = None
+        self._segment_info = XShmSegmentInfo()
+        self._size = None
+        self._image_length = None
+
+    @staticmethod
+    def is_available():
+        """
+        Check whether this is X11 with the libraries this backend needs.
+        :return: True if it is, False otherwise
+        """
+        return (sys.platform.startswith("linux")
+                and "DISPLAY" in os.environ
+                and ctypes.util.find_library("X11") is not None
+                and ctypes.util.find_library("Xext") is not None)
+
+    def _create_shared_memory(self):
+        """
+        Create the shared memory, give it to the image and let the X
+        server attach to it.
+        :raise OSError: If the shared memory could not be created.
+        """
+        image = self._image.contents
+        self._image_length = image.bytes_per_line * image.height
+        shared_memory_id = self._libc.shmget(
+            IPC_PRIVATE,
+            self._image_length,
+            IPC_CREAT | SHARED_MEMORY_PERMISSIONS)
+        if shared_memory_id == -1:
+            raise OSError(ctypes.get_errno(), "shmget failed")
+        address = self._libc.shmat(shared_memory_id, None, 0)
+        if address == ctypes.c_void_p(-1).value:
+            self._libc.shmctl(shared_memory_id, IPC_RMID, None)
+            raise OSError(ctypes.get_errno(), "shmat failed")
+        self._segment_info.shmid = shared_memory_id
+        self._segment_info.shmaddr = address
+        self._segment_info.readOnly = False
+        image.data = address
+        if not self._xext.XShmAttach(self._display,
+                                     ctypes.byref(self._segment_info)):
+            raise OSError("X server could not attach the shared memory")
+        self._xlib.XSync(self._display, False)
+        # The memory is removed when both this process and the X server
+        # detach from it, even if this process crashes.
+        self._libc.shmctl(shared_memory_id, IPC_RMID, None)
+
+    def open(self):
+        """
+        Connect to the X server and create the shared image.
+        :raise OSError: If the X server or its extension are missing.
+        """
+        self._xlib, self._xext, self._libc = _load_libraries()
+        self._display = self._xlib.XOpenDisplay(None)
+        if not self._display:
+            raise OSError("Could not open the X display")
+        if not self._xext.XShmQueryExtension(self._display):
+            self.close()
+            raise OSError("The X server does not support XShm")
+        screen = self._xlib.XDefaultScreen(self._display)
+        self._root = self._xlib.XRootWindow(self._display, screen)
+        self._size = (self._xlib.XDisplayWidth(self._display, screen),
+                      self._xlib.XDisplayHeight(self._display, screen))
+        self._image = self._xext.XShmCreateImage(
+            self._display,
+            self._xlib.XDefaultVisual(self._display, screen),
+            self._xlib.XDefaultDepth(self._display, screen),
+            Z_PIXMAP,
+            None,
+            ctypes.byref(self._segment_info),
+            *self._size)
+        if (not self._image
+                or self._image.contents.bits_per_pixel
+                != SUPPORTED_BITS_PER_PIXEL):
+            self.close()
+            raise OSError("Only 32 bits per pixel screens are supported")
+        try:
+            self._create_shared_memory()
+        except OSError:
+            self.close()
+            raise
+
+    def grab(self):
+        """
+        Capture the screen.
+        :return: The screen as an RGB PIL image.
+        :raise OSError: If the X server could not copy the screen.
+        """
+        if not self._xext.XShmGetImage(self._display,
+                                       self._root,
+                                       self._image,
+                                       0,
+                                       0,
+                                       ALL_PLANES):
+            raise OSError("XShmGetImage failed")
+        data = ctypes.string_at(self._segment_info.shmaddr,
+                                self._image_length)
+        return PIL.Image.frombuffer("RGB",
+                                    self._size,
+                                    data,
+                                    "raw",
+                                    "BGRX",
+                                    self._image.contents.bytes_per_line,
+                                    1)
+
+    def close(self):
+        """
+        Detach the shared memory and disconnect from the X server.
+        """
+        if self._segment_info.shmaddr:
+            self._xext.XShmDetach(self._display,
+                                  ctypes.byref(self._segment_info))
+            self._libc.shmdt(self._segment_info.shmaddr)
+            self._segment_info.shmaddr = None
+        if self._image:
+            # The data is the shared memory, so only free the struct.
+            self._image.contents.data = None
+            self._xlib.XFree(self._image)
+            self._image = None
+        if self._display:
+            self._xlib.XCloseDisplay(self._display)
+            self._display = None
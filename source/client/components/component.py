@@ -39,9 +39,12 @@ class Component(object):
         function until component closes
         """
         self._setup()
-        while self.running:
-            time.sleep(0)
-            self._update()
+        try:
+            while self.running:
+                time.sleep(0)
+                self._update()
+        finally:
+            self._teardown()
 
     def _update(self):
         """
@@ -54,6 +57,12 @@ class Component(object):
         the same thread the self._update runs in
         """
 
+    def _teardown(self):
+        """
+        This is what the component does after it stops, this runs in
+        the same thread the self._update runs in
+        """
+
     def _start(self):  # TODO: maybe rename to start_tracking
         """
         Create and start the main thread. Call this from sub class
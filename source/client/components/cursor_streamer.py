@@ -0,0 +1,105 @@
+"""
+Streams the cursor of the screen through a socket
+"""
+__author__ = "Ron Remets"
+
+import logging
+import time
+
+from capture.cursor_backends import create_cursor_backend
+from communication.message import Message, MESSAGE_TYPES
+from components.component import Component
+from frames.cursor_update import CursorUpdate
+
+# The time in seconds between checks of the cursor. It is much shorter
+# than a frame, so the cursor moves as soon as the mouse does, however
+# slow the frames are.
+CURSOR_POLL_INTERVAL = 0.004
+
+
+class CursorStreamer(Component):
+    """
+    Streams the cursor of the screen through a socket, apart from the
+    frames. Every move is one small message and the image of a shape is
+    only sent the first time the cursor has it.
+    """
+    def __init__(self, cursor_backend=None):
+        """
+        :param cursor_backend: The CursorBackend object to find the
+                               cursor with. If None, the first backend
+                               available is used.
+        """
+        super().__init__()
+        self._name = "Cursor streamer"
+        self.cursor_backend = cursor_backend
+        self._connection = None
+        # The last cursor that was sent like (x, y, shape id) or None
+        # if it is hidden
+        self._cursor = None
+        # The ids of the shapes the other side has
+        self._sent_shape_ids = set()
+
+    def _setup(self):
+        """
+        Open the cursor backend in the thread that uses it.
+        """
+        logging.info(f"CURSOR:Finding the cursor with "
+                     f"{type(self.cursor_backend).__name__}")
+        self.cursor_backend.open()
+
+    def _teardown(self):
+        """
+        Close the cursor backend.
+        """
+        self.cursor_backend.close()
+
+    def _create_update(self, cursor):
+        """
+        Create the update of the cursor, with the image of its shape if
+        the other side does not have it.
+        :param cursor: The cursor like (x, y, shape id) or None if it is
+                       hidden.
+        :return: A CursorUpdate object.
+        """
+        if cursor is None:
+            return CursorUpdate()
+        x, y, shape_id = cursor
+        shape = None
+        if shape_id not in self._sent_shape_ids:
+            shape = self.cursor_backend.grab_shape()
+            if shape is None:
+                return CursorUpdate()
+            # The shape could change since the cursor was found
+            shape_id = shape.shape_id
+            self._sent_shape_ids.add(shape_id)
+        return CursorUpdate(x, y, shape_id, shape)
+
+    def _update(self):
+        """
+        Send the cursor if it moved or changed its shape.
+        """
+        cursor = self.cursor_backend.grab()
+        if cursor != self._cursor:
+            self._cursor = cursor
+            self._connection.socket.send(Message(
+                MESSAGE_TYPES["controlled"],
+                self._create_update(cursor).pack()))
+        time.sleep(CURSOR_POLL_INTERVAL)
+
+    def start(self, connection):
+        """
+        Start streaming the cursor. If this device has no way to find
+        the cursor, nothing is streamed.
+        :param connection: The connection to stream the cursor with.
+        """
+        if self.cursor_backend is None:
+            try:
+                self.cursor_backend = create_cursor_backend()
+            except RuntimeError:
+                logging.warning("CURSOR:The cursor can not be found on "
+                                "this device, it will not be streamed")
+                return
+        self._connection = connection
+        self._cursor = None
+        self._sent_shape_ids.clear()
+        self._start()
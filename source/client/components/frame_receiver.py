@@ -0,0 +1,182 @@
+"""
+Receives the frames of the screen through a socket and decodes them
+"""
+__author__ = "Ron Remets"
+
+import logging
+import threading
+import time
+
+from communication.frame_timing import split_timestamps
+from communication.message import Message, MESSAGE_TYPES
+from components.component import Component
+from frames.frame_buffer import FrameBuffer, FrameSyncError
+from frames.frame_update import FRAME_ACK, KEYFRAME_REQUEST, FrameUpdate
+from frames.latency_report import FrameTiming, LatencyReport
+from frames.region_update import RegionUpdate
+
+# The time in seconds to wait for a frame before checking if the
+# receiver closed
+RECEIVE_TIMEOUT = 0.1
+
+
+class FrameReceiver(Component):
+    """
+    Receives the frame updates of the screen streamer and decodes them
+    in its own thread, so decoding never blocks the UI. It only wakes up
+    when a frame arrives, and only tells the UI when there is something
+    new to draw.
+    """
+    def __init__(self):
+        super().__init__()
+        self._name = "Frame receiver"
+        self._connection = None
+        # Called when there is something new to draw
+        self._callback = None
+        # Set by the socket when a frame arrives
+        self._frame_received = threading.Event()
+        # The pixels of the frame, rebuilt from the updates
+        self._frame_buffer = FrameBuffer()
+        # Whether a keyframe was asked for and did not arrive yet. The
+        # updates sent before it can not be applied either, and should
+        # not ask for more keyframes.
+        self._keyframe_requested = False
+        # The RegionUpdate waiting to be drawn or None. The updates that
+        # are decoded before the UI takes it are merged into it, so the
+        # UI draws all of them at once.
+        self._region_update_lock = threading.Lock()
+        self._region_update = None
+        # The latency of the frames, from the timestamps they carry
+        self.latency_report = LatencyReport()
+
+    def _put_region_update(self, region_update):
+        """
+        Add an update to the one waiting to be drawn, and tell the UI if
+        nothing was waiting, otherwise it was already told.
+        :param region_update: The RegionUpdate object.
+        """
+        with self._region_update_lock:
+            was_empty = self._region_update is None
+            if was_empty:
+                self._region_update = region_update
+            else:
+                self._region_update = RegionUpdate.merge(
+                    [self._region_update, region_update])
+        if was_empty:
+            self._callback()
+
+    def take_region_update(self):
+        """
+        THREAD SAFE
+        Take the update that is waiting to be drawn.
+        :return: A RegionUpdate object of everything that was decoded
+                 since the last call, or None if nothing was.
+        """
+        with self._region_update_lock:
+            region_update = self._region_update
+            self._region_update = None
+            return region_update
+
+    def _sync_frame_update(self, frame_update, frame_timing):
+        """
+        Apply the update, or start waiting for a keyframe if it does not
+        follow the frame, like when the stream is joined in the middle.
+        :param frame_update: The FrameUpdate object
+        :param frame_timing: The FrameTiming object of the update.
+        :return: The answer to the update, FRAME_ACK or KEYFRAME_REQUEST.
+        """
+        try:
+            regions = self._frame_buffer.apply(frame_update)
+        except FrameSyncError as e:
+            self._frame_buffer.clear()
+            if self._keyframe_requested and not frame_update.keyframe:
+                return FRAME_ACK  # Sent before the keyframe request
+            logging.info(f"FRAME:Asking for a keyframe: {e}")
+            self._keyframe_requested = True
+            return KEYFRAME_REQUEST
+        if frame_update.keyframe:
+            self._keyframe_requested = False
+        frame_timing.timestamps["decoded"] = time.time()
+        self._put_region_update(RegionUpdate(frame_update.size,
+                                             regions,
+                                             [frame_timing]))
+        return FRAME_ACK
+
+    def _receive_frame(self, frame_message):
+        """
+        Decode a frame update and answer it.
+        :param frame_message: The message of the update.
+        """
+        received_time = time.time()
+        logging.debug(f"FRAME:Received frame with length: "
+                      f"{len(frame_message.content)}")
+        content, timestamps = split_timestamps(frame_message.content)
+        frame_timing = FrameTiming(int(timestamps.pop("seq", -1)),
+                                   len(content),
+                                   timestamps)
+        if "ack_seq" in timestamps:
+            self.latency_report.add_ack_arrival(
+                int(timestamps.pop("ack_seq")),
+                timestamps.pop("ack_arrival"))
+        timestamps["received"] = received_time
+        frame_update = FrameUpdate.unpack(content)
+        logging.debug(f"FRAME:Decoding {len(frame_update.tiles)} tiles")
+        # Answer after applying, so a receiver that lost its frame asks
+        # for a keyframe right away.
+        self._connection.socket.send(Message(
+            MESSAGE_TYPES["controller"],
+            self._sync_frame_update(frame_update, frame_timing)))
+        timestamps["ack_sent"] = time.time()
+        self.latency_report.add_ack(frame_timing)
+
+    def _update(self):
+        """
+        Wait for frames and decode every frame that arrived.
+        """
+        if not self._frame_received.wait(RECEIVE_TIMEOUT):
+            return
+        # Cleared before receiving, so a frame that arrives while
+        # receiving sets it again
+        self._frame_received.clear()
+        try:
+            frame_message = self._connection.socket.recv(block=False)
+            while frame_message is not None:
+                self._receive_frame(frame_message)
+                frame_message = self._connection.socket.recv(block=False)
+        except Exception as e:  # TODO: dont be broad
+            print(e)
+            logging.error("FRAME:An error occurred", exc_info=True)
+            self._set_running(False)
+            self._callback()  # So the UI sees the receiver stopped
+
+    def start(self, connection, callback):
+        """
+        Start receiving and decoding frames. The first update has the
+        whole frame, so start without a frame.
+        :param connection: The connection the frames arrive through.
+        :param callback: A function that takes no arguments. It is
+                         called from the thread of the receiver when an
+                         update is waiting to be drawn and nothing was
+                         waiting before it (See take_region_update), and
+                         when the receiver stops because of an error.
+        """
+        self._connection = connection
+        self._callback = callback
+        self._frame_buffer.clear()
+        self._keyframe_requested = False
+        self.take_region_update()
+        self.latency_report.reset()
+        connection.socket.set_recv_callback(self._frame_received.set)
+        # Frames could arrive before the callback was set
+        self._frame_received.set()
+        self._start()
+
+    def close(self, timeout=None):
+        """
+        Stop receiving frames.
+        NOTE: DOES NOT CLOSE THE CONNECTION
+        :param timeout: The time in seconds to wait for the thread.
+        """
+        super().close(timeout)
+        if self._connection is not None:
+            self._connection.socket.set_recv_callback(None)
@@ -8,6 +8,7 @@ import time
 import win32api
 import win32con
 
+from communication.mouse_events import MOVE_ACTION, is_mouse_move
 from components.component import Component
 
 DEFAULT_CLICK_DELAY = 0.1
@@ -58,7 +59,7 @@ class MouseController(Component):
         """
         x, y = parameters["pos"]
         x, y = int(x), int(y)
-        if parameters["action"] == "move":
+        if parameters["action"] == MOVE_ACTION:
             win32api.SetCursorPos((x, y))
         elif parameters["action"] == "press":
             if parameters["button"] == "left":
@@ -98,4 +99,7 @@ class MouseController(Component):
         :param connection: The connection to get the info from.
         """
         self._connection = connection
+        # Only the newest of the moves that wait matters, the mouse
+        # jumps there instead of replaying a fast drag
+        connection.socket.set_replaceable(is_mouse_move)
         self._start()
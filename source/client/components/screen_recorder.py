@@ -3,47 +3,307 @@ Record the screen
 """
 __author__ = "Ron Remets"
 
-import io
+import concurrent.futures
+import logging
+import os
+import queue
 import threading
+import time
 
-import PIL.ImageGrab
+import numpy
+import PIL.Image
 
+from capture.capture_backends import open_capture_backend
 from components.component import Component
+from frames.codec_report import CodecReport
+from frames.color_modes import (DEFAULT_COLOR_MODE,
+                                LOSSY_AUTO_COLOR_MODES,
+                                PALETTE_REFRESH_INTERVAL,
+                                create_palette)
+from frames.copy_rectangles import (apply_copy_rectangles,
+                                    find_copy_rectangles)
+from frames.delta_codec import (DEFAULT_KEYFRAME_INTERVAL,
+                                MIN_KEYFRAME_INTERVAL)
+from frames.dirty_tiles import (DEFAULT_TILE_SIZE,
+                                create_tile_grid,
+                                find_dirty_rectangles,
+                                find_tile_rectangles,
+                                mark_tiles)
+from frames.frame_update import FrameUpdate, Tile
+from frames.tile_cache import (TileCache,
+                               create_cached_tile,
+                               find_cell_keys,
+                               split_cached_cells)
+from frames.tile_codec import (DEFAULT_QUALITY,
+                               LOSSY_IMAGE_FORMATS,
+                               MAX_QUALITY,
+                               MIN_QUALITY,
+                               encode_tile,
+                               is_image_format_supported)
+from frames.video_codec import VIDEO_FORMATS, VideoEncoder
 
 DEFAULT_IMAGE_FORMAT = "png"
-DEFAULT_RESOLUTION = (1920, 1080)
+# None captures at the size of the screen until the controller sends
+# the size it shows the frames at.
+DEFAULT_RESOLUTION = None
+# Bilinear after a fast box reduce is much faster than the default
+# filter and looks the same at the sizes frames are shown at.
+RESIZE_FILTER = PIL.Image.BILINEAR
+RESIZE_REDUCING_GAP = 2.0
+# The amount of threads that encode tiles at the same time. PIL releases
+# the GIL while encoding, so they run in parallel.
+DEFAULT_ENCODE_WORKERS = os.cpu_count() or 1
+# The most captured frames that wait to be encoded. One frame waits
+# while another is encoded, so capturing overlaps encoding.
+CAPTURE_QUEUE_SIZE = 1
+# The time in seconds the stages wait for each other before checking if
+# the recorder closed.
+STAGE_POLL_INTERVAL = 0.001
+STAGE_TIMEOUT = 0.1
+# The frames per second to capture at while frames are wanted and the
+# most frames per second to capture at when catching up.
+DEFAULT_TARGET_FPS = 30
+DEFAULT_MAX_FPS = 60
+# The least frames per second to capture at, the capture intervals are
+# 1 / fps.
+MIN_FPS = 1
+# The least dirty tiles a frame must have before looking for parts that
+# moved, fewer tiles are cheaper to just send.
+COPY_MIN_DIRTY_TILES = 8
+# Progressive refinement sends a large change as a small, low quality
+# draft first, so the receiver sees it right away, and sends the drafted
+# tiles again in the chosen codec once they stop changing.
+DEFAULT_PROGRESSIVE = False
+# The least dirty tiles a frame must have to be sent as a draft, small
+# changes like typing are sent in the chosen codec right away.
+DRAFT_MIN_DIRTY_TILES = 16
+DRAFT_IMAGE_FORMAT = "jpeg"
+DRAFT_QUALITY = 20
+# The most drafted tiles refined in a frame, so refining never delays
+# the next change for long.
+REFINE_TILES_PER_FRAME = 32
+
+
+def region_box(size, region):
+    """
+    Turn a region of the screen to the box of pixels it covers.
+    :param size: The size of the screen like (width, height)
+    :param region: The region like (x, y, width, height) in fractions
+                   of the screen, from the top left corner.
+    :return: The box like (left, top, right, bottom) in pixels
+    """
+    width, height = size
+    x, y, region_width, region_height = region
+    left = min(max(int(x * width), 0), width - 1)
+    top = min(max(int(y * height), 0), height - 1)
+    right = min(max(int(round((x + region_width) * width)), left + 1),
+                width)
+    bottom = min(max(int(round((y + region_height) * height)), top + 1),
+                 height)
+    return left, top, right, bottom
+
+
+def fit_size(size, resolution):
+    """
+    Find the largest size with the aspect ratio of size that fits in
+    resolution, without growing larger than size.
+    :param size: The size like (width, height)
+    :param resolution: The size to fit in like (width, height) or None
+                       to keep the size.
+    :return: The fitted size like (width, height)
+    """
+    if resolution is None:
+        return size
+    width, height = size
+    scale = min(resolution[0] / width, resolution[1] / height, 1)
+    return max(int(width * scale), 1), max(int(height * scale), 1)
 
 
 class ScreenRecorder(Component):
     """
     Record the screen
     """
-    def __init__(self):
+    def __init__(self,
+                 capture_backend=None,
+                 encode_workers=DEFAULT_ENCODE_WORKERS):
+        """
+        :param capture_backend: The CaptureBackend object to capture the
+                                screen with. If None, the fastest
+                                backend available is used.
+        :param encode_workers: The amount of threads that encode tiles.
+        """
         super().__init__()
         self._name = "Screen recorder"
+        self.capture_backend = capture_backend
+        self._encode_workers = encode_workers
+        self._encode_thread = None
+        self._encode_executor = None
+        # The captured frames waiting to be encoded, in capture order
+        self._captured_frames = queue.Queue(maxsize=CAPTURE_QUEUE_SIZE)
         self._frame_lock = threading.Lock()
         self._image_format_lock = threading.Lock()
+        self._image_format = DEFAULT_IMAGE_FORMAT
         self._resolution_lock = threading.Lock()
+        self._region_lock = threading.Lock()
+        self._tile_size_lock = threading.Lock()
+        self._quality_lock = threading.Lock()
+        self._color_mode_lock = threading.Lock()
+        self._color_mode = DEFAULT_COLOR_MODE
+        # The palette of the palette color mode and when it was chosen
+        self._palette = None
+        self._palette_time = 0
+        # Counts the palettes that were chosen, tiles quantized with
+        # another palette are decoded to other pixels
+        self._palette_generation = 0
+        self._frame_rate_lock = threading.Lock()
+        self._keyframe_interval_lock = threading.Lock()
+        self._progressive_lock = threading.Lock()
+        # The encoder of the video formats, only the encode stage uses it
+        self._video_encoder = None
+        # Set while the streamer can send another frame. Frames are
+        # only captured while it is set.
+        self._frame_wanted = threading.Event()
+        self._next_capture_time = None
+        self._last_capture_time = 0
+        # The frame waiting to be taken like (update bytes, pixels,
+        # id of the reference it was compared to, encode time, tile
+        # cache after it, drafted tiles after it, timestamps)
         self._frame = None
+        # When the last frame that was taken was captured and encoded
+        self._frame_timestamps = {}
+        # The pixels of the last frame that was taken. The next update
+        # only has the tiles that changed since it.
+        self._reference = None
+        self._reference_id = 0
+        # The frames taken since the last frame without a reference
+        self._frames_since_keyframe = 0
+        # The tiles the receiver has after the last frame that was taken
+        self._tile_cache = TileCache()
+        # The tiles the receiver only has a draft of after the last
+        # frame that was taken, a bool array like (tile rows, tile
+        # columns) or None.
+        self._draft_tiles = None
         self.image_format = DEFAULT_IMAGE_FORMAT
+        self.quality = DEFAULT_QUALITY
         self.resolution = DEFAULT_RESOLUTION
+        self.region = None
+        self.tile_size = DEFAULT_TILE_SIZE
+        self.keyframe_interval = DEFAULT_KEYFRAME_INTERVAL
+        self.progressive = DEFAULT_PROGRESSIVE
+        self.set_frame_rate(DEFAULT_TARGET_FPS, DEFAULT_MAX_FPS)
+        # The encode time and size of the frames that were taken
+        self.report = CodecReport()
 
     @property
     def frame(self):
         """
-        The current screen frame
+        The update of the current screen frame, packed as a FrameUpdate.
         After reading the frame it will turn to None until the next
-        frame is available
-        :return: None if capture has not started, bytes otherwise
+        frame is available. Reading it makes it the reference that the
+        next frame is compared to, so every update that is read must be
+        sent.
+        :return: None if no new frame is available, bytes otherwise
         """
         with self._frame_lock:
             frame = self._frame
             self._frame = None
-            return frame
+            if frame is None:
+                return None
+            (update,
+             pixels,
+             reference_id,
+             encode_time,
+             tile_cache,
+             draft_tiles,
+             timestamps) = frame
+            if reference_id != self._reference_id:
+                return None  # Compared to an old reference, drop it
+            self._frame_timestamps = timestamps
+            self._reference = pixels
+            self._reference_id += 1
+            self._tile_cache = tile_cache
+            self._draft_tiles = draft_tiles
+            self._frames_since_keyframe += 1
+            # The video encoders send keyframes on their own
+            if (self._frames_since_keyframe >= self.keyframe_interval
+                    and self.image_format == "delta"):
+                # Compare the next frame to nothing, so it is a keyframe
+                self._reference = None
+                self._frames_since_keyframe = 0
+        self.report.add_frame(encode_time, len(update))
+        return update
+
+    @property
+    def frame_timestamps(self):
+        """
+        THREAD SAFE
+        :return: When the last frame that was read was captured and
+                 encoded, like {"capture": time, "encode": time} in
+                 seconds since the epoch, or empty if no frame was read.
+        """
+        with self._frame_lock:
+            return self._frame_timestamps
+
+    def _set_frame(self,
+                   update,
+                   pixels,
+                   reference_id,
+                   capture_time,
+                   encode_time,
+                   tile_cache,
+                   draft_tiles=None):
+        timestamps = {"capture": capture_time, "encode": time.time()}
+        with self._frame_lock:
+            self._frame = (update,
+                           pixels,
+                           reference_id,
+                           encode_time,
+                           tile_cache,
+                           draft_tiles,
+                           timestamps)
+
+    def _drop_frame(self):
+        with self._frame_lock:
+            self._frame = None
+
+    def _has_frame(self):
+        with self._frame_lock:
+            return self._frame is not None
+
+    def _get_reference(self):
+        """
+        :return: The reference frame, its id, a copy of the tile cache
+                 after it and the tiles drafted before it like (pixels,
+                 id, tile cache, drafted tiles)
+        """
+        with self._frame_lock:
+            return (self._reference,
+                    self._reference_id,
+                    self._tile_cache.copy(),
+                    self._draft_tiles)
+
+    def reset(self):
+        """
+        THREAD SAFE
+        Forget the reference frame so the next update has the whole
+        frame. Use this when the other side lost its frame.
+        """
+        with self._frame_lock:
+            self._frame = None
+            self._reference = None
+            self._reference_id += 1
+        self._next_capture_time = None
 
-    def _set_frame(self, frame):
+    def send_keyframe(self):
+        """
+        THREAD SAFE
+        Send the next update as a keyframe with an empty tile cache, so a
+        receiver that just attached or lost its frame and its tile cache
+        can start from it.
+        """
         with self._frame_lock:
-            self._frame = frame
+            self._tile_cache = TileCache()
+        self.reset()
 
     @property
     def image_format(self):
@@ -59,18 +319,93 @@ class ScreenRecorder(Component):
     def image_format(self, image_format):
         """
         THEAD SAFE
-        Set the image_format of the screen capture.
+        Set the image_format of the screen capture. Changing it sends
+        the whole frame again, since the delta format needs the receiver
+        to have exactly the reference frame.
         :param image_format: The image_format as a string.
         """
+        if not is_image_format_supported(image_format):
+            logging.warning(f"FRAME:Image format {image_format} is not "
+                            f"supported, using {DEFAULT_IMAGE_FORMAT}")
+            image_format = DEFAULT_IMAGE_FORMAT
         with self._image_format_lock:
+            changed = self._image_format != image_format
             self._image_format = image_format
+        if changed:
+            self.reset()
+
+    @property
+    def quality(self):
+        """
+        THREAD SAFE
+        The quality (1 to 100) of lossy image formats.
+        :return: The quality as an int.
+        """
+        with self._quality_lock:
+            return self._quality
+
+    @quality.setter
+    def quality(self, quality):
+        """
+        THEAD SAFE
+        Set the quality of lossy image formats.
+        :param quality: The quality as an int (1 to 100), clamped to
+                        that range.
+        """
+        quality = max(MIN_QUALITY, min(int(quality), MAX_QUALITY))
+        with self._quality_lock:
+            self._quality = quality
+
+    @property
+    def color_mode(self):
+        """
+        THREAD SAFE
+        The color mode of the frames, see COLOR_MODES.
+        :return: The color mode as a string.
+        """
+        with self._color_mode_lock:
+            return self._color_mode
+
+    @color_mode.setter
+    def color_mode(self, color_mode):
+        """
+        THEAD SAFE
+        Set the color mode of the frames. Changing it sends the whole
+        frame again, so no part of the frame stays in the old mode.
+        :param color_mode: The color mode as a string.
+        """
+        with self._color_mode_lock:
+            changed = self._color_mode != color_mode
+            self._color_mode = color_mode
+        if changed:
+            self.reset()
+
+    def _get_palette(self, pixels):
+        """
+        Get the palette of the palette color mode, choosing it again from
+        the frame every PALETTE_REFRESH_INTERVAL seconds. Every tile
+        uses the same palette, so tiles next to each other have the same
+        colors.
+        :param pixels: The frame as an array like (height, width, 3)
+        :return: The palette image.
+        """
+        current_time = time.monotonic()
+        if (self._palette is None
+                or current_time - self._palette_time
+                > PALETTE_REFRESH_INTERVAL):
+            self._palette = create_palette(pixels)
+            self._palette_time = current_time
+            self._palette_generation += 1
+        return self._palette
 
     @property
     def resolution(self):
         """
         THREAD SAFE
-        The resolution of the screen capture.
-        :return: The resolution as a tuple (pixels, pixels)
+        The largest resolution of the screen capture. Frames keep the
+        aspect ratio of the screen and are never larger than it.
+        :return: The resolution as a tuple (pixels, pixels) or None to
+                 capture at the size of the screen.
         """
         with self._resolution_lock:
             return self._resolution
@@ -79,25 +414,546 @@ class ScreenRecorder(Component):
     def resolution(self, resolution):
         """
         THEAD SAFE
-        Set the resolution of the screen capture.
-        :param resolution: The image_format as a tuple (pixels, pixels).
+        Set the largest resolution of the screen capture.
+        :param resolution: The resolution as a tuple (pixels, pixels) or
+                           None to capture at the size of the screen.
         """
         with self._resolution_lock:
             self._resolution = resolution
 
+    @property
+    def region(self):
+        """
+        THREAD SAFE
+        The region of the screen that is captured. The region is scaled
+        to the resolution, so a small region is captured sharper.
+        :return: The region like (x, y, width, height) in fractions of
+                 the screen, from the top left corner, or None if the
+                 whole screen is captured.
+        """
+        with self._region_lock:
+            return self._region
+
+    @region.setter
+    def region(self, region):
+        """
+        THEAD SAFE
+        Set the region of the screen that is captured.
+        :param region: The region like (x, y, width, height) in
+                       fractions of the screen, or None to capture the
+                       whole screen.
+        """
+        with self._region_lock:
+            self._region = region
+
+    @property
+    def tile_size(self):
+        """
+        THREAD SAFE
+        The width and height in pixels of the tiles the frame is split
+        to.
+        :return: The tile size as an int or None if every update has the
+                 whole frame.
+        """
+        with self._tile_size_lock:
+            return self._tile_size
+
+    @tile_size.setter
+    def tile_size(self, tile_size):
+        """
+        THEAD SAFE
+        Set the size of the tiles the frame is split to.
+        :param tile_size: The tile size as an int or None to send the
+                          whole frame in every update.
+        """
+        with self._tile_size_lock:
+            self._tile_size = tile_size
+
+    @property
+    def keyframe_interval(self):
+        """
+        THREAD SAFE
+        The most frames between keyframes of the delta and the video
+        formats.
+        :return: The keyframe interval as an int.
+        """
+        with self._keyframe_interval_lock:
+            return self._keyframe_interval
+
+    @keyframe_interval.setter
+    def keyframe_interval(self, keyframe_interval):
+        """
+        THEAD SAFE
+        Set the most frames between keyframes. A video encoder that
+        already started keeps its interval until the next keyframe is
+        asked for.
+        :param keyframe_interval: The keyframe interval as an int, at
+                                  least MIN_KEYFRAME_INTERVAL.
+        """
+        keyframe_interval = max(int(keyframe_interval),
+                                MIN_KEYFRAME_INTERVAL)
+        with self._keyframe_interval_lock:
+            self._keyframe_interval = keyframe_interval
+
+    @property
+    def progressive(self):
+        """
+        THREAD SAFE
+        Whether large changes are sent as a draft first and refined once
+        they stop changing.
+        :return: A bool
+        """
+        with self._progressive_lock:
+            return self._progressive
+
+    @progressive.setter
+    def progressive(self, progressive):
+        """
+        THEAD SAFE
+        Set whether large changes are sent as a draft first. Tiles that
+        were already drafted are still refined after it is turned off.
+        :param progressive: A bool
+        """
+        with self._progressive_lock:
+            self._progressive = progressive
+
+    @property
+    def frame_wanted(self):
+        """
+        THREAD SAFE
+        Whether the streamer can send another frame.
+        :return: A bool
+        """
+        return self._frame_wanted.is_set()
+
+    @frame_wanted.setter
+    def frame_wanted(self, value):
+        """
+        THREAD SAFE
+        Tell the recorder whether to capture frames. Capturing stops
+        while no frame is wanted, so no frame is captured for nothing.
+        :param value: A bool
+        """
+        if value:
+            self._frame_wanted.set()
+        else:
+            self._frame_wanted.clear()
+
+    @property
+    def frame_rate(self):
+        """
+        THREAD SAFE
+        :return: The frame rate like (target fps, max fps)
+        """
+        with self._frame_rate_lock:
+            return self._target_fps, self._max_fps
+
+    def set_frame_rate(self, target_fps, max_fps):
+        """
+        THREAD SAFE
+        Set how often frames are captured.
+        :param target_fps: The frames per second to capture at while
+                           frames are wanted.
+        :param max_fps: The most frames per second to capture at, even
+                        when catching up after a delay.
+        Both are at least MIN_FPS.
+        """
+        target_fps = max(target_fps, MIN_FPS)
+        with self._frame_rate_lock:
+            self._target_fps = target_fps
+            self._max_fps = max(max_fps, target_fps)
+
+    def _wait_for_capture_time(self):
+        """
+        Wait until a frame is wanted and it is time to capture it.
+        Capture times are scheduled every 1 / target fps, but never
+        closer than 1 / max fps. If the recorder falls behind by more
+        than a frame, a new schedule starts instead of capturing a burst
+        of frames to catch up.
+        :return: True if it is time to capture, False if no frame is
+                 wanted.
+        """
+        if not self._frame_wanted.wait(STAGE_TIMEOUT):
+            return False
+        target_fps, max_fps = self.frame_rate
+        target_interval = 1 / target_fps
+        current_time = time.monotonic()
+        if (self._next_capture_time is None
+                or current_time - self._next_capture_time > target_interval):
+            self._next_capture_time = current_time
+        capture_time = max(self._next_capture_time,
+                           self._last_capture_time + 1 / max_fps)
+        if capture_time > current_time:
+            time.sleep(capture_time - current_time)
+        self._last_capture_time = time.monotonic()
+        self._next_capture_time = capture_time + target_interval
+        return True
+
+    def _setup(self):
+        """
+        Open the capture backend in the thread that captures, since
+        some backends can only capture in the thread that opened them,
+        and start the encode stage.
+        """
+        if self.capture_backend is None:
+            # The first backend that opens is kept for the next starts
+            self.capture_backend = open_capture_backend()
+        else:
+            self.capture_backend.open()
+        logging.info(f"FRAME:Capturing with "
+                     f"{type(self.capture_backend).__name__}, encoding "
+                     f"with {self._encode_workers} threads")
+        self._captured_frames = queue.Queue(maxsize=CAPTURE_QUEUE_SIZE)
+        self._encode_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self._encode_workers,
+            thread_name_prefix=f"{self._name} encode")
+        self._encode_thread = threading.Thread(
+            name=f"Component {self._name} encode thread",
+            target=self._run_encoder)
+        self._encode_thread.start()
+
+    def _teardown(self):
+        """
+        Stop the encode stage and close the capture backend.
+        """
+        # The capture stage may have stopped because of an error
+        self._set_running(False)
+        self._encode_thread.join()
+        self._encode_executor.shutdown()
+        self.capture_backend.close()
+
     def _update(self):
         """
-        Capture current frame
+        The capture stage. Capture the current frame once the encode
+        stage has room for it, so the frame is as new as possible when
+        it is encoded, and only when a frame is wanted and it is time
+        to capture it.
+        """
+        while self._captured_frames.full():
+            if not self.running:
+                return
+            time.sleep(STAGE_POLL_INTERVAL)
+        if not self._wait_for_capture_time():
+            return
+        capture_time = time.time()
+        frame = self.capture_backend.grab()
+        region = self.region
+        if region is not None:
+            frame = frame.crop(region_box(frame.size, region))
+        size = fit_size(frame.size, self.resolution)
+        if size != frame.size:
+            frame = frame.resize(size,
+                                 RESIZE_FILTER,
+                                 reducing_gap=RESIZE_REDUCING_GAP)
+        if frame.mode != "RGB":
+            frame = frame.convert("RGB")
+        # Only this thread puts frames, so the queue cannot be full
+        self._captured_frames.put((numpy.asarray(frame), capture_time))
+
+    def _run_encoder(self):
+        """
+        The encode stage. Encode the captured frames in the order they
+        were captured until the recorder closes.
+        """
+        try:
+            while self.running:
+                try:
+                    pixels, capture_time = self._captured_frames.get(
+                        timeout=STAGE_TIMEOUT)
+                except queue.Empty:
+                    continue
+                self._encode(pixels, capture_time)
+        except Exception as e:
+            print(e)
+            logging.error("FRAME:Encode stage crashed", exc_info=True)
+            self._set_running(False)
+
+    def _encode(self, pixels, capture_time):
+        """
+        Encode the tiles of the frame that changed since the reference,
+        all the tiles at the same time, and the drafted tiles that are
+        refined in this frame.
+        :param pixels: The frame as an array like (height, width, 3)
+        :param capture_time: When the frame was captured in seconds
+                             since the epoch.
+        """
+        if self.image_format in VIDEO_FORMATS:
+            self._encode_video(pixels, capture_time)
+            return
+        encode_start_time = time.perf_counter()
+        height, width = pixels.shape[:2]
+        reference, reference_id, tile_cache, draft_tiles = (
+            self._get_reference())
+        tile_size = self.tile_size
+        if reference is not None and reference.shape != pixels.shape:
+            reference = None
+        copies = []
+        if tile_size is None:
+            rectangles = [(0, 0, width, height)]
+            draft_tiles = None
+        else:
+            rectangles = find_dirty_rectangles(reference, pixels, tile_size)
+            copies, rectangles, reference = self._find_copies(reference,
+                                                              pixels,
+                                                              rectangles,
+                                                              tile_size)
+        image_format = self.image_format
+        color_mode = self.color_mode
+        encode_options = {"image_format": image_format,
+                          "quality": self.quality,
+                          "color_mode": color_mode}
+        draft = False
+        refine_rectangles = []
+        if tile_size is not None:
+            if reference is None:
+                draft_tiles = None  # The whole frame is sent again
+            draft, refine_rectangles, draft_tiles = self._plan_drafts(
+                (width, height),
+                rectangles,
+                copies,
+                draft_tiles,
+                tile_size,
+                encode_options)
+        if not rectangles and not copies and not refine_rectangles:
+            # Nothing changed since the reference, nothing to send.
+            self._drop_frame()
+            return
+        # The receiver decodes the same cell to other pixels in every
+        # color mode, format, quality and palette, so each has its own
+        # keys in the tile cache.
+        variant = f"{color_mode} {image_format}"
+        if image_format in LOSSY_IMAGE_FORMATS:
+            variant += f" {encode_options['quality']}"
+        if color_mode == "palette":
+            encode_options["palette"] = self._get_palette(pixels)
+            variant += f" {self._palette_generation}"
+        if image_format == "delta":
+            encode_options["reference"] = reference
+        if draft:
+            # Drafts are not cached, the receiver would show them again
+            # instead of the refined tiles.
+            encode_options.update(image_format=DRAFT_IMAGE_FORMAT,
+                                  quality=DRAFT_QUALITY)
+            runs = [(rectangle, None, False) for rectangle in rectangles]
+        elif tile_size is None:
+            runs = [(rectangles[0], None, False)]
+        else:
+            runs = self._split_cached_runs(pixels,
+                                           rectangles + refine_rectangles,
+                                           tile_cache,
+                                           tile_size,
+                                           variant)
+        # map keeps the order of the tiles
+        tiles = self._encode_executor.map(
+            lambda run: self._encode_run(pixels, run, encode_options),
+            runs)
+        update = FrameUpdate(width,
+                             height,
+                             list(tiles),
+                             tile_size,
+                             copies,
+                             keyframe=reference is None).pack()
+        self._set_frame(update,
+                        pixels,
+                        reference_id,
+                        capture_time,
+                        time.perf_counter() - encode_start_time,
+                        tile_cache,
+                        draft_tiles)
+
+    def _plan_drafts(self,
+                     size,
+                     rectangles,
+                     copies,
+                     draft_tiles,
+                     tile_size,
+                     encode_options):
+        """
+        Decide whether the rectangles that changed are sent as a draft,
+        and which drafted tiles that stopped changing are refined.
+        :param size: The size of the frame like (width, height).
+        :param rectangles: The rectangles that changed.
+        :param copies: The CopyRectangle objects of the frame.
+        :param draft_tiles: The tiles the receiver only has a draft of,
+                            or None if it has none.
+        :param tile_size: The width and height of a tile in pixels.
+        :param encode_options: The keyword arguments of encode_tile.
+        :return: A tuple like (whether to send a draft, list of the
+                 rectangles to refine, the drafted tiles after the
+                 frame).
+        """
+        dirty_tiles = create_tile_grid(size, tile_size)
+        if draft_tiles is None or draft_tiles.shape != dirty_tiles.shape:
+            draft_tiles = dirty_tiles.copy()
+        else:
+            draft_tiles = draft_tiles.copy()
+        if draft_tiles.any():
+            # A copy can move a draft, refine wherever it lands
+            for copy in copies:
+                mark_tiles(draft_tiles,
+                           (copy.x, copy.y, copy.width, copy.height),
+                           tile_size)
+        for rectangle in rectangles:
+            mark_tiles(dirty_tiles, rectangle, tile_size)
+        if self._should_draft(int(dirty_tiles.sum()), encode_options):
+            return True, [], draft_tiles | dirty_tiles
+        draft_tiles &= ~dirty_tiles
+        # Refine from the top, a few tiles every frame
+        refine_tiles = create_tile_grid(size, tile_size)
+        rows, columns = numpy.nonzero(draft_tiles)
+        refine_tiles[rows[:REFINE_TILES_PER_FRAME],
+                     columns[:REFINE_TILES_PER_FRAME]] = True
+        draft_tiles &= ~refine_tiles
+        return (False,
+                find_tile_rectangles(refine_tiles, size, tile_size),
+                draft_tiles)
+
+    def _should_draft(self, dirty_tiles, encode_options):
+        """
+        :param dirty_tiles: The amount of tiles that changed.
+        :param encode_options: The keyword arguments of encode_tile.
+        :return: True if the tiles that changed should be sent as a
+                 draft, False otherwise.
+        """
+        image_format = encode_options["image_format"]
+        # The delta format needs the receiver to have the exact frame,
+        # and JPEG can only keep some color modes.
+        return (self.progressive
+                and dirty_tiles >= DRAFT_MIN_DIRTY_TILES
+                and image_format != "delta"
+                and encode_options["color_mode"] in LOSSY_AUTO_COLOR_MODES
+                and not (image_format in LOSSY_IMAGE_FORMATS
+                         and encode_options["quality"] <= DRAFT_QUALITY))
+
+    def _encode_video(self, pixels, capture_time):
+        """
+        Encode the whole frame with the video encoder. A new encoder is
+        started whenever there is no reference, so the receiver gets a
+        keyframe after every reset.
+        :param pixels: The frame as an array like (height, width, 3)
+        :param capture_time: When the frame was captured in seconds
+                             since the epoch.
+        """
+        # Every packet depends on the packet before it, so a packet that
+        # was not taken can not be replaced by the next one like tiles.
+        while self._has_frame():
+            if not self.running:
+                return
+            time.sleep(STAGE_POLL_INTERVAL)
+        encode_start_time = time.perf_counter()
+        height, width = pixels.shape[:2]
+        reference, reference_id, tile_cache, _ = self._get_reference()
+        if reference is not None and numpy.array_equal(reference, pixels):
+            return  # Nothing changed since the reference
+        image_format = self.image_format
+        if (reference is None
+                or self._video_encoder is None
+                or self._video_encoder.video_format != image_format
+                or self._video_encoder.size != (width, height)):
+            self._video_encoder = VideoEncoder(image_format,
+                                               (width, height),
+                                               self.keyframe_interval)
+        packets = self._video_encoder.encode(pixels)
+        if not packets:
+            return  # The encoder keeps the frame for the next packet
+        tiles = [Tile(0, 0, width, height, image_format, data)
+                 for data, _ in packets]
+        keyframe = any(is_keyframe for _, is_keyframe in packets)
+        update = FrameUpdate(width,
+                             height,
+                             tiles,
+                             keyframe=keyframe).pack()
+        self._set_frame(update,
+                        pixels,
+                        reference_id,
+                        capture_time,
+                        time.perf_counter() - encode_start_time,
+                        tile_cache)
+
+    @staticmethod
+    def _find_copies(reference, pixels, rectangles, tile_size):
+        """
+        Find the parts of the reference that moved, like scrolled text,
+        and the rectangles that are still dirty after moving them.
+        :param reference: The reference frame as an array or None.
+        :param pixels: The frame as an array like (height, width, 3)
+        :param rectangles: The rectangles that changed since the
+                           reference.
+        :param tile_size: The width and height of a tile in pixels.
+        :return: A tuple like (list of CopyRectangle objects, list of
+                 rectangles, the reference after the copies).
+        """
+        dirty_area = sum(width * height for _, _, width, height in rectangles)
+        if (reference is None
+                or dirty_area < COPY_MIN_DIRTY_TILES * tile_size ** 2):
+            return [], rectangles, reference
+        copies = find_copy_rectangles(reference, pixels, tile_size)
+        if not copies:
+            return [], rectangles, reference
+        moved_reference = reference.copy()
+        apply_copy_rectangles(moved_reference, copies)
+        moved_rectangles = find_dirty_rectangles(moved_reference,
+                                                 pixels,
+                                                 tile_size)
+        if (sum(width * height for _, _, width, height in moved_rectangles)
+                >= dirty_area):
+            return [], rectangles, reference
+        return copies, moved_rectangles, moved_reference
+
+    def _split_cached_runs(self,
+                           pixels,
+                           rectangles,
+                           tile_cache,
+                           tile_size,
+                           variant):
+        """
+        Split the rectangles to runs of cells the receiver has in its
+        tile cache and runs it does not have.
+        :param pixels: The frame as an array like (height, width, 3)
+        :param rectangles: The rectangles that changed.
+        :param tile_cache: A copy of the tile cache, it is updated like
+                           the receiver will update its cache.
+        :param tile_size: The width and height of a cell in pixels.
+        :param variant: The color mode and image format the cells are
+                        encoded in, the receiver decodes them to other
+                        pixels in every one.
+        :return: A list of runs like (rectangle, keys, cached).
+        """
+        # Hashing releases the GIL, so hash all the rectangles at once
+        keys = self._encode_executor.map(
+            lambda rectangle: find_cell_keys(pixels,
+                                             rectangle,
+                                             tile_size,
+                                             variant),
+            rectangles)
+        runs = []
+        for rectangle, rectangle_keys in zip(rectangles, keys):
+            runs.extend(split_cached_cells(tile_cache,
+                                           rectangle,
+                                           rectangle_keys,
+                                           tile_size))
+        return runs
+
+    @staticmethod
+    def _encode_run(pixels, run, encode_options):
+        """
+        Encode a run of cells, or refer to the cache if it is cached.
+        :param pixels: The frame as an array like (height, width, 3)
+        :param run: The run like (rectangle, keys, cached).
+        :param encode_options: The keyword arguments of encode_tile.
+        :return: A Tile object.
         """
-        frame = PIL.ImageGrab.grab()
-        frame = frame.resize(self.resolution)  # TODO: make dynamic
-        frame_bytes = io.BytesIO()
-        frame.save(frame_bytes, self.image_format)
-        frame_bytes.seek(0)
-        self._set_frame(frame_bytes.read())
+        rectangle, keys, cached = run
+        if cached:
+            return create_cached_tile(rectangle, keys)
+        tile = encode_tile(pixels, rectangle, **encode_options)
+        tile.keys = keys
+        return tile
 
     def start(self):
         """
-        Start the screen capture
+        Start the screen capture. The receiver starts with an empty tile
+        cache, so start with one too.
         """
+        self.send_keyframe()
         self._start()
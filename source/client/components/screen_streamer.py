@@ -3,9 +3,32 @@ Streams the screen through a socket
 """
 __author__ = "Ron Remets"
 
+import collections
+import logging
+import threading
+import time
+
+from communication.frame_timing import add_timestamps
 from communication.message import Message, MESSAGE_TYPES
 from components.component import Component
 from components.screen_recorder import ScreenRecorder
+from frames.adaptive_quality import AdaptiveColorMode, AdaptiveQuality
+from frames.color_modes import (AUTO_COLOR_MODES,
+                                DEFAULT_COLOR_MODE,
+                                LOSSY_AUTO_COLOR_MODES,
+                                COLOR_MODES)
+from frames.frame_update import KEYFRAME_REQUEST
+from frames.tile_codec import LOSSY_IMAGE_FORMATS
+from frames.video_codec import VIDEO_FORMATS
+
+# The time in seconds between logs of the codec report
+REPORT_INTERVAL = 5
+# The most frames that are sent and not ACKed yet. A second frame on the
+# way hides the time the ACK of the first one takes to return.
+SEND_WINDOW = 2
+# The time in seconds to wait when there is nothing to send or receive,
+# so waiting for frames and ACKs does not keep the CPU busy.
+IDLE_INTERVAL = 0.001
 
 
 class ScreenStreamer(Component):
@@ -16,36 +39,195 @@ class ScreenStreamer(Component):
         super().__init__()
         self._name = "Screen streamer"
         self._connection = None
-        self._can_send_frame = True
+        # The sequence numbers and send times of the frames that were
+        # not ACKed yet like (sequence number, send time)
+        self._frame_send_times = collections.deque()
+        self._next_sequence_number = 0
+        # The sequence number of the last frame that was ACKed and when
+        # its ACK arrived, sent with the next frame so the other side
+        # can tell how far apart the clocks are. None before the first
+        # ACK.
+        self._last_ack = None
+        self._frame_timing_lock = threading.Lock()
+        self._frame_timing = False
+        self._last_report_time = None
+        self._adaptive_quality_lock = threading.Lock()
+        self._adaptive_quality = None
+        self._adaptive_color_mode = None
         self.screen_recorder = ScreenRecorder()  # TODO: Lock?
 
+    @property
+    def frame_timing(self):
+        """
+        THREAD SAFE
+        Whether the frames carry timestamps, so the other side can tell
+        how long every stage of their way took.
+        :return: A bool
+        """
+        with self._frame_timing_lock:
+            return self._frame_timing
+
+    @frame_timing.setter
+    def frame_timing(self, frame_timing):
+        """
+        THEAD SAFE
+        Set whether the frames carry timestamps. They cost the mediator
+        a copy of every frame, so they are only sent while the other
+        side shows or logs the latency.
+        :param frame_timing: A bool
+        """
+        with self._frame_timing_lock:
+            self._frame_timing = frame_timing
+
+    def set_frame_codec(self, image_format, quality, adaptive):
+        """
+        THREAD SAFE
+        Set how the frames are encoded.
+        :param image_format: The image format of the tiles, or a video
+                             format to encode whole frames as video.
+        :param quality: The quality (1 to 100) of lossy image formats.
+                        If adaptive, the quality to start from.
+        :param adaptive: Whether to change the quality by the round trip
+                         of the frames.
+        """
+        self.screen_recorder.image_format = image_format
+        self.screen_recorder.quality = quality
+        with self._adaptive_quality_lock:
+            if adaptive:
+                self._adaptive_quality = AdaptiveQuality(quality)
+            else:
+                self._adaptive_quality = None
+        logging.info(f"FRAME:Frame codec set to {image_format}, "
+                     f"quality {quality}, adaptive: {adaptive}")
+
+    def set_color_mode(self, color_mode):
+        """
+        THREAD SAFE
+        Set the color mode of the frames.
+        :param color_mode: One of COLOR_MODES or "auto" to choose it by
+                           the round trip of the frames. Video formats
+                           are always in full color, every change of
+                           the color mode would cost them a keyframe.
+        """
+        if self.screen_recorder.image_format in VIDEO_FORMATS:
+            adaptive_color_mode = None
+            color_mode = DEFAULT_COLOR_MODE
+        elif color_mode == "auto":
+            if self.screen_recorder.image_format in LOSSY_IMAGE_FORMATS:
+                color_modes = LOSSY_AUTO_COLOR_MODES
+            else:
+                color_modes = AUTO_COLOR_MODES
+            adaptive_color_mode = AdaptiveColorMode(color_modes)
+            color_mode = adaptive_color_mode.color_mode
+        elif color_mode in COLOR_MODES:
+            adaptive_color_mode = None
+        else:
+            logging.warning(f"FRAME:No such color mode {color_mode}")
+            return
+        self.screen_recorder.color_mode = color_mode
+        with self._adaptive_quality_lock:
+            self._adaptive_color_mode = adaptive_color_mode
+        logging.info(f"FRAME:Color mode set to {color_mode}, adaptive: "
+                     f"{adaptive_color_mode is not None}")
+
     def _send_frame(self):
         """
         Send a frame to through the socket
+        :return: True if a frame was sent, False otherwise.
         """
         frame = self.screen_recorder.frame
-        if frame is not None:
-            self._connection.socket.send(Message(
-                MESSAGE_TYPES["controlled"],
-                frame))
-            self._can_send_frame = False
+        if frame is None:
+            return False
+        sequence_number = self._next_sequence_number
+        self._next_sequence_number += 1
+        if self.frame_timing:
+            timestamps = dict(self.screen_recorder.frame_timestamps,
+                              seq=sequence_number)
+            if self._last_ack is not None:
+                (timestamps["ack_seq"],
+                 timestamps["ack_arrival"]) = self._last_ack
+            frame = add_timestamps(frame, **timestamps, send=time.time())
+        self._connection.socket.send(Message(MESSAGE_TYPES["controlled"],
+                                             frame))
+        self._frame_send_times.append((sequence_number,
+                                       time.perf_counter()))
+        return True
 
-    def _check_if_can_send_frame(self):
+    def _add_round_trip(self, round_trip):
+        """
+        Add the round trip of a frame to the report and adapt the
+        quality and the color mode to it.
+        :param round_trip: The time in seconds from sending the frame
+                           until its ACK.
         """
-        Check if the connection is ready to receive another frame
+        self.screen_recorder.report.add_round_trip(round_trip)
+        with self._adaptive_quality_lock:
+            is_lowest = is_highest = True
+            if self._adaptive_quality is not None:
+                self.screen_recorder.quality = (
+                    self._adaptive_quality.add_round_trip(round_trip))
+                is_lowest = self._adaptive_quality.is_lowest
+                is_highest = self._adaptive_quality.is_highest
+            if self._adaptive_color_mode is not None:
+                self.screen_recorder.color_mode = (
+                    self._adaptive_color_mode.add_round_trip(round_trip,
+                                                             is_lowest,
+                                                             is_highest))
+
+    def _receive_acks(self):
         """
+        Receive the ACKs of the frames that were sent, which frees room
+        in the send window. An ACK can ask for a keyframe, when the
+        other side joined the stream in the middle or lost its frame.
+        :return: True if an ACK was received, False otherwise.
+        """
+        received = False
         response = self._connection.socket.recv(block=False)
-        if response is not None:
-            self._can_send_frame = True
+        while response is not None:
+            received = True
+            if response.get_content_as_text() == KEYFRAME_REQUEST:
+                logging.info("FRAME:Sending a keyframe as asked")
+                self.screen_recorder.send_keyframe()
+            if self._frame_send_times:
+                sequence_number, send_time = (
+                    self._frame_send_times.popleft())
+                self._last_ack = (sequence_number, time.time())
+                self._add_round_trip(time.perf_counter() - send_time)
+            response = self._connection.socket.recv(block=False)
+        return received
+
+    def _log_report(self):
+        """
+        Log the codec report every REPORT_INTERVAL seconds.
+        """
+        current_time = time.monotonic()
+        if current_time - self._last_report_time < REPORT_INTERVAL:
+            return
+        self._last_report_time = current_time
+        summary = self.screen_recorder.report.summary()
+        logging.info(f"FRAME:{summary['frames']} frames, "
+                     f"{summary['encode ms']} ms encode, "
+                     f"{summary['bytes per frame']} bytes per frame, "
+                     f"{summary['round trip ms']} ms round trip, "
+                     f"{self.screen_recorder.image_format} quality "
+                     f"{self.screen_recorder.quality}, "
+                     f"{self.screen_recorder.color_mode} colors")
 
     def _update(self):
         """
-        Send the next frame
+        Send the next frame while there is room in the send window. The
+        recorder only captures while there is room, so no frame is
+        captured and encoded just to be thrown away.
         """
-        if self._can_send_frame:
-            self._send_frame()
-        else:
-            self._check_if_can_send_frame()
+        busy = self._receive_acks()
+        can_send_frame = len(self._frame_send_times) < SEND_WINDOW
+        if can_send_frame:
+            busy = self._send_frame() or busy
+            can_send_frame = len(self._frame_send_times) < SEND_WINDOW
+        self.screen_recorder.frame_wanted = can_send_frame
+        self._log_report()
+        if not busy:
+            time.sleep(IDLE_INTERVAL)
 
     def start(self, connection):
         """
@@ -53,7 +235,11 @@ class ScreenStreamer(Component):
         :param connection: The connection to use to stream
         """
         self._connection = connection
-        self._can_send_frame = True
+        self._frame_send_times.clear()
+        self._next_sequence_number = 0
+        self._last_ack = None
+        self.screen_recorder.frame_wanted = False
+        self._last_report_time = time.monotonic()
         self.screen_recorder.start()
         self._start()
 
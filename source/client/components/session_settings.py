@@ -33,11 +33,105 @@ class SessionSettings(Component):
         self._app.other_screen_width = width
         self._app.other_screen_height = height
 
+    @mainthread
+    def _change_frame_codec(self, image_format, quality, adaptive):
+        """
+        Change the settings of the frame codec.
+        :param image_format: The image format of the frames
+        :param quality: The quality (1 to 100) of lossy formats
+        :param adaptive: Whether the quality changes by the link
+        """
+        self._app.screen_image_format = image_format
+        self._app.screen_image_quality = quality
+        self._app.screen_adaptive_quality = adaptive
+
+    @mainthread
+    def _change_frame_rate(self, target_fps, max_fps):
+        """
+        Change the frame rate of the stream.
+        :param target_fps: The frames per second to stream at
+        :param max_fps: The most frames per second to stream at
+        """
+        self._app.screen_target_fps = target_fps
+        self._app.screen_max_fps = max_fps
+
+    @mainthread
+    def _change_keyframe_interval(self, keyframe_interval):
+        """
+        Change the most frames between keyframes.
+        :param keyframe_interval: The keyframe interval
+        """
+        self._app.screen_keyframe_interval = keyframe_interval
+
+    @mainthread
+    def _change_progressive(self, progressive):
+        """
+        Change whether large changes are sent as a draft first.
+        :param progressive: A bool
+        """
+        self._app.screen_progressive = progressive
+
+    @mainthread
+    def _change_other_view(self, width, height):
+        """
+        Change the size the other side shows the frames at.
+        :param width: The width of the view
+        :param height: The height of the view
+        """
+        self._app.other_view_size = [width, height]
+
+    @mainthread
+    def _change_other_viewport(self, viewport):
+        """
+        Change the region of this screen the other side shows.
+        :param viewport: The region like [x, y, width, height] in
+                         fractions of the screen
+        """
+        self._app.other_viewport = viewport
+
+    @mainthread
+    def _change_color_mode(self, color_mode):
+        """
+        Change the color mode of the frames.
+        :param color_mode: The color mode or "auto"
+        """
+        self._app.screen_color_mode = color_mode
+
+    @mainthread
+    def _change_frame_timing(self, frame_timing):
+        """
+        Change whether the frames carry timestamps.
+        :param frame_timing: A bool
+        """
+        self._app.screen_frame_timing = frame_timing
+
     def _handle_settings(self, setting):
         name, value = setting.split(":")
         if name == "other screen size":
             width, height = value.split(", ")
             self._change_other_screen(width, height)
+        elif name == "frame codec":
+            image_format, quality, mode = value.split(", ")
+            self._change_frame_codec(image_format,
+                                     int(quality),
+                                     mode == "adaptive")
+        elif name == "view size":
+            width, height = value.split(", ")
+            self._change_other_view(int(width), int(height))
+        elif name == "viewport":
+            self._change_other_viewport(
+                [float(part) for part in value.split(", ")])
+        elif name == "color mode":
+            self._change_color_mode(value)
+        elif name == "frame rate":
+            target_fps, max_fps = value.split(", ")
+            self._change_frame_rate(int(target_fps), int(max_fps))
+        elif name == "keyframe interval":
+            self._change_keyframe_interval(int(value))
+        elif name == "progressive":
+            self._change_progressive(value == "on")
+        elif name == "frame timing":
+            self._change_frame_timing(value == "on")
         else:
             # TODO: what other settings to add?
             pass
@@ -0,0 +1,4 @@
+"""
+This is where everything that turns the screen into frame updates and
+back is stored
+"""
@@ -0,0 +1,171 @@
+"""
+Choose the quality of lossy frames by how fast the link delivers them
+"""
+__author__ = "Ron Remets"
+
+import time
+
+MIN_QUALITY = 20
+MAX_QUALITY = 90
+# The round trip in seconds of a frame (send until ACK) to aim for
+DEFAULT_TARGET_ROUND_TRIP = 0.1
+# How much every new round trip affects the smoothed round trip
+ROUND_TRIP_SMOOTHING = 0.2
+# The quality is lowered when the smoothed round trip is over the high
+# mark and raised when it is under the low mark (both times the target)
+HIGH_ROUND_TRIP_MARK = 1.5
+LOW_ROUND_TRIP_MARK = 0.6
+# Lower fast (multiply) and raise slowly (add) so the link recovers fast
+QUALITY_DECREASE_FACTOR = 0.8
+QUALITY_INCREASE_STEP = 2
+# The least time in seconds between changes of the quality, so the
+# link has time to show the effect of the last change
+ADJUST_INTERVAL = 0.5
+# The least time in seconds between changes of the color mode. Changing
+# it changes every tile, so it changes less often than the quality.
+COLOR_MODE_ADJUST_INTERVAL = 2
+
+
+class AdaptiveQuality(object):
+    """
+    Choose the quality of lossy frames by how fast the link delivers
+    them. Only the round trip of the frames is measured, the queue depth
+    of the mediator is not known here. A frame is only sent while the
+    send window has room, so every frame that waits in a queue on the
+    way already makes the round trip longer.
+    Not thread safe, use it only in the thread that measures the round
+    trips.
+    """
+    def __init__(self,
+                 quality,
+                 min_quality=MIN_QUALITY,
+                 max_quality=MAX_QUALITY,
+                 target_round_trip=DEFAULT_TARGET_ROUND_TRIP):
+        """
+        :param quality: The quality to start from.
+        :param min_quality: The lowest quality to use.
+        :param max_quality: The highest quality to use.
+        :param target_round_trip: The round trip in seconds to aim for.
+        """
+        self._min_quality = min_quality
+        self._max_quality = max_quality
+        self._target_round_trip = target_round_trip
+        self._quality = max(min_quality, min(quality, max_quality))
+        self._round_trip = None
+        self._last_adjust_time = time.monotonic()
+
+    @property
+    def quality(self):
+        """
+        :return: The quality to use right now.
+        """
+        return self._quality
+
+    @property
+    def round_trip(self):
+        """
+        :return: The smoothed round trip in seconds or None if none was
+                 measured yet.
+        """
+        return self._round_trip
+
+    @property
+    def is_lowest(self):
+        """
+        :return: True if the quality can not be lowered any more.
+        """
+        return self._quality <= self._min_quality
+
+    @property
+    def is_highest(self):
+        """
+        :return: True if the quality can not be raised any more.
+        """
+        return self._quality >= self._max_quality
+
+    def add_round_trip(self, round_trip):
+        """
+        Add the round trip of a frame and adjust the quality.
+        :param round_trip: The time in seconds from sending the frame
+                           until its ACK.
+        :return: The quality to use from now on.
+        """
+        if self._round_trip is None:
+            self._round_trip = round_trip
+        else:
+            self._round_trip += (ROUND_TRIP_SMOOTHING
+                                 * (round_trip - self._round_trip))
+        current_time = time.monotonic()
+        if current_time - self._last_adjust_time < ADJUST_INTERVAL:
+            return self._quality
+        if self._round_trip > self._target_round_trip * HIGH_ROUND_TRIP_MARK:
+            self._quality = max(
+                self._min_quality,
+                int(self._quality * QUALITY_DECREASE_FACTOR))
+            self._last_adjust_time = current_time
+        elif self._round_trip < self._target_round_trip * LOW_ROUND_TRIP_MARK:
+            self._quality = min(self._max_quality,
+                                self._quality + QUALITY_INCREASE_STEP)
+            self._last_adjust_time = current_time
+        return self._quality
+
+
+class AdaptiveColorMode(object):
+    """
+    Choose the color mode of frames by how fast the link delivers them.
+    The color mode only gets smaller when the link is too slow even at
+    the lowest quality, and only gets larger when the link is fast even
+    at the highest quality. Not thread safe, use it only in the thread
+    that measures the round trips.
+    """
+    def __init__(self,
+                 color_modes,
+                 target_round_trip=DEFAULT_TARGET_ROUND_TRIP):
+        """
+        :param color_modes: The color modes to choose from, from the
+                            most bytes to the least.
+        :param target_round_trip: The round trip in seconds to aim for.
+        """
+        self._color_modes = color_modes
+        self._target_round_trip = target_round_trip
+        self._index = 0
+        self._round_trip = None
+        self._last_adjust_time = time.monotonic()
+
+    @property
+    def color_mode(self):
+        """
+        :return: The color mode to use right now.
+        """
+        return self._color_modes[self._index]
+
+    def add_round_trip(self, round_trip, is_lowest=True, is_highest=True):
+        """
+        Add the round trip of a frame and adjust the color mode.
+        :param round_trip: The time in seconds from sending the frame
+                           until its ACK.
+        :param is_lowest: Whether the quality is as low as it goes.
+        :param is_highest: Whether the quality is as high as it goes.
+        :return: The color mode to use from now on.
+        """
+        if self._round_trip is None:
+            self._round_trip = round_trip
+        else:
+            self._round_trip += (ROUND_TRIP_SMOOTHING
+                                 * (round_trip - self._round_trip))
+        current_time = time.monotonic()
+        if current_time - self._last_adjust_time < COLOR_MODE_ADJUST_INTERVAL:
+            return self.color_mode
+        if (is_lowest
+                and self._round_trip
+                > self._target_round_trip * HIGH_ROUND_TRIP_MARK
+                and self._index < len(self._color_modes) - 1):
+            self._index += 1
+            self._last_adjust_time = current_time
+        elif (is_highest
+              and self._round_trip
+              < self._target_round_trip * LOW_ROUND_TRIP_MARK
+              and self._index > 0):
+            self._index -= 1
+            self._last_adjust_time = current_time
+        return self.color_mode
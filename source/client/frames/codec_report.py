@@ -0,0 +1,68 @@
+"""
+Measure how much encoding and sending frames costs
+"""
+__author__ = "Ron Remets"
+
+import threading
+
+
+class CodecReport(object):
+    """
+    Sums the encode time, size and round trip of the frames that were
+    sent since the last summary.
+    THREAD SAFE
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """
+        Forget all the frames. Call this only while holding self._lock.
+        """
+        self._frames = 0
+        self._encode_time = 0
+        self._bytes = 0
+        self._round_trips = 0
+        self._round_trip_time = 0
+
+    def add_frame(self, encode_time, length):
+        """
+        Add a frame that was sent.
+        :param encode_time: The time in seconds it took to encode.
+        :param length: The length of the frame in bytes.
+        """
+        with self._lock:
+            self._frames += 1
+            self._encode_time += encode_time
+            self._bytes += length
+
+    def add_round_trip(self, round_trip):
+        """
+        Add the round trip of a frame.
+        :param round_trip: The time in seconds from sending the frame
+                           until its ACK.
+        """
+        with self._lock:
+            self._round_trips += 1
+            self._round_trip_time += round_trip
+
+    def summary(self, reset=True):
+        """
+        Summarize the frames that were sent.
+        :param reset: Whether to forget the frames after summarizing.
+        :return: A dict like {"frames": amount, "encode ms": average,
+                 "bytes per frame": average, "round trip ms": average}
+        """
+        with self._lock:
+            frames = max(self._frames, 1)
+            summary = {
+                "frames": self._frames,
+                "encode ms": round(self._encode_time / frames * 1000, 3),
+                "bytes per frame": self._bytes // frames,
+                "round trip ms": round(
+                    self._round_trip_time / max(self._round_trips, 1)
+                    * 1000, 3)}
+            if reset:
+                self._reset()
+            return summary
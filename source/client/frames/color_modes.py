@@ -0,0 +1,110 @@
+"""
+Reduce the colors of frames for slow links and expand them back
+"""
+__author__ = "Ron Remets"
+
+import numpy
+import PIL.Image
+
+DEFAULT_COLOR_MODE = "rgb"
+# rgb - full color.
+# rgb565 - 5 bits of red, 6 of green and 5 of blue, 2 bytes a pixel.
+# palette - 256 colors chosen to fit the screen, 1 byte a pixel.
+# gray - 256 shades of gray, 1 byte a pixel.
+COLOR_MODES = ("rgb", "rgb565", "palette", "gray")
+# The modes only a lossless image format can keep, they are always
+# encoded as PNG.
+PNG_ONLY_COLOR_MODES = ("rgb565", "palette")
+# The modes to go through when the link gets slower, from the most
+# bytes to the least. Lossy formats already throw away more than
+# rgb565 and palette do, so they only switch to gray.
+AUTO_COLOR_MODES = ("rgb", "rgb565", "palette", "gray")
+LOSSY_AUTO_COLOR_MODES = ("rgb", "gray")
+PALETTE_COLORS = 256
+# The palette is chosen from a frame scaled down to this size, which is
+# much faster and chooses almost the same colors.
+PALETTE_SAMPLE_SIZE = (256, 256)
+# The time in seconds a palette is used before it is chosen again
+PALETTE_REFRESH_INTERVAL = 2
+# The PIL modes rgb565 pixels can be decoded as
+RGB565_IMAGE_MODES = ("I;16", "I;16B", "I")
+
+
+def create_palette(frame):
+    """
+    Choose the colors of the palette mode for a frame.
+    :param frame: The frame as an array like (height, width, 3).
+    :return: A palette PIL image to quantize tiles with.
+    """
+    sample = PIL.Image.fromarray(frame).resize(PALETTE_SAMPLE_SIZE,
+                                               PIL.Image.NEAREST)
+    return sample.quantize(PALETTE_COLORS,
+                           method=PIL.Image.Quantize.FASTOCTREE)
+
+
+def pack_rgb565(pixels):
+    """
+    Pack RGB pixels to 16 bits each.
+    :param pixels: An array like (height, width, 3).
+    :return: A uint16 array like (height, width).
+    """
+    red = pixels[:, :, 0].astype(numpy.uint16) >> 3
+    green = pixels[:, :, 1].astype(numpy.uint16) >> 2
+    blue = pixels[:, :, 2].astype(numpy.uint16) >> 3
+    return (red << 11) | (green << 5) | blue
+
+
+def expand_rgb565(values):
+    """
+    Expand 16 bit pixels to RGBA. The high bits are repeated in the low
+    bits, so white stays white.
+    :param values: An array like (height, width) of rgb565 pixels.
+    :return: A uint8 array like (height, width, 4).
+    """
+    values = values.astype(numpy.uint16)
+    red = (values >> 11) & 0x1f
+    green = (values >> 5) & 0x3f
+    blue = values & 0x1f
+    pixels = numpy.empty(values.shape + (4,), dtype=numpy.uint8)
+    pixels[:, :, 0] = (red << 3) | (red >> 2)
+    pixels[:, :, 1] = (green << 2) | (green >> 4)
+    pixels[:, :, 2] = (blue << 3) | (blue >> 2)
+    pixels[:, :, 3] = 255
+    return pixels
+
+
+def reduce_colors(pixels, color_mode, palette=None):
+    """
+    Turn pixels to an image in a color mode.
+    :param pixels: An array like (height, width, 3).
+    :param color_mode: One of COLOR_MODES.
+    :param palette: The palette image of the palette mode, see
+                    create_palette.
+    :return: A PIL image.
+    :raise ValueError: If the color mode does not exist or the palette
+                       mode has no palette.
+    """
+    if color_mode == "rgb":
+        return PIL.Image.fromarray(pixels)
+    if color_mode == "gray":
+        return PIL.Image.fromarray(pixels).convert("L")
+    if color_mode == "rgb565":
+        return PIL.Image.fromarray(pack_rgb565(pixels))
+    if color_mode == "palette":
+        if palette is None:
+            raise ValueError("The palette mode needs a palette")
+        return PIL.Image.fromarray(pixels).quantize(
+            palette=palette,
+            dither=PIL.Image.Dither.NONE)
+    raise ValueError(f"No such color mode: {color_mode}")
+
+
+def expand_colors(image):
+    """
+    Turn a decoded image in any color mode back to full color.
+    :param image: The decoded PIL image.
+    :return: The pixels as RGBA bytes, rows from top to bottom.
+    """
+    if image.mode in RGB565_IMAGE_MODES:
+        return expand_rgb565(numpy.asarray(image)).tobytes()
+    return image.convert("RGBA").tobytes()
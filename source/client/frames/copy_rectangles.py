@@ -0,0 +1,182 @@
+"""
+Find the parts of a frame that moved since the last frame, like
+scrolled text and moved windows
+"""
+__author__ = "Ron Remets"
+
+import numpy
+
+from frames.frame_update import CopyRectangle
+
+# The least rows that must agree on a shift before it is trusted
+MIN_SHIFT_VOTES = 16
+# The seed of the multipliers of the row hashes, both frames must be
+# hashed with the same multipliers
+HASH_SEED = 0
+HASH_WORD_LENGTH = 8
+
+
+def _hash_strip_rows(frame, tile_size):
+    """
+    Split the frame to strips one tile wide and hash every row of every
+    strip. The columns after the last whole strip are not hashed.
+    :param frame: The frame as an array like (height, width, channels).
+    :param tile_size: The width of every strip in pixels.
+    :return: An array like (height, strips) of the hashes or None if the
+             strips can not be hashed.
+    """
+    height, width, channels = frame.shape
+    strips = width // tile_size
+    strip_length = tile_size * channels
+    if strips == 0 or strip_length % HASH_WORD_LENGTH != 0:
+        return None
+    # Does not copy if the frame is already made of whole strips
+    frame = numpy.ascontiguousarray(frame[:, :strips * tile_size])
+    words = frame.reshape(height, -1).view(numpy.uint64).reshape(
+        height, strips, strip_length // HASH_WORD_LENGTH)
+    multipliers = numpy.random.default_rng(HASH_SEED).integers(
+        1,
+        2 ** 63,
+        words.shape[2],
+        dtype=numpy.uint64) | 1
+    # The sums overflow and wrap around, which is fine for a hash
+    return (words * multipliers).sum(axis=2, dtype=numpy.uint64)
+
+
+def _find_shift(previous_hashes, current_hashes):
+    """
+    Find how far the rows of a strip moved. Every row that is only once
+    in the previous strip votes for the distance it moved.
+    :param previous_hashes: The hashes of the rows of the previous strip.
+    :param current_hashes: The hashes of the rows of the current strip.
+    :return: The distance in rows, 0 if the rows did not move.
+    """
+    height = len(previous_hashes)
+    order = numpy.argsort(previous_hashes, kind="stable")
+    sorted_hashes = previous_hashes[order]
+    # Rows that repeat, like empty lines, can not tell where they moved
+    unique = numpy.ones(height, dtype=bool)
+    unique[1:] &= sorted_hashes[1:] != sorted_hashes[:-1]
+    unique[:-1] &= sorted_hashes[:-1] != sorted_hashes[1:]
+    positions = numpy.searchsorted(sorted_hashes, current_hashes).clip(
+        max=height - 1)
+    matched = (sorted_hashes[positions] == current_hashes) & unique[positions]
+    shifts = numpy.arange(height)[matched] - order[positions[matched]]
+    shifts = shifts[shifts != 0]
+    if len(shifts) < MIN_SHIFT_VOTES:
+        return 0
+    votes = numpy.bincount(shifts + height)
+    shift = int(votes.argmax())
+    if votes[shift] < MIN_SHIFT_VOTES:
+        return 0
+    return shift - height
+
+
+def _find_matching_rows(previous_hashes, current_hashes, shift):
+    """
+    Find the rows of the current strip that are the rows of the previous
+    strip moved by shift.
+    :param previous_hashes: The hashes of the rows of the previous strip.
+    :param current_hashes: The hashes of the rows of the current strip.
+    :param shift: The distance the rows moved.
+    :return: A bool array of the rows of the current strip.
+    """
+    height = len(current_hashes)
+    matching = numpy.zeros(height, dtype=bool)
+    start = max(shift, 0)
+    end = height + min(shift, 0)
+    matching[start:end] = (current_hashes[start:end]
+                           == previous_hashes[start - shift:end - shift])
+    return matching
+
+
+def _find_runs(values, min_length):
+    """
+    :param values: A bool array.
+    :param min_length: The least length of a run.
+    :return: A list of the runs of True like (start, end).
+    """
+    padded = numpy.zeros(len(values) + 2, dtype=numpy.int8)
+    padded[1:-1] = values
+    edges = numpy.diff(padded)
+    starts = numpy.nonzero(edges == 1)[0]
+    ends = numpy.nonzero(edges == -1)[0]
+    return [(int(start), int(end)) for start, end in zip(starts, ends)
+            if end - start >= min_length]
+
+
+def _find_vertical_copies(previous, current, tile_size):
+    """
+    Find the strips whose rows moved up or down, like scrolled text.
+    :param previous: The previous frame as an array.
+    :param current: The current frame as an array with the same shape.
+    :param tile_size: The width of every strip in pixels.
+    :return: A list of copies like (source x, source y, width, height,
+             x, y).
+    """
+    previous_hashes = _hash_strip_rows(previous, tile_size)
+    current_hashes = _hash_strip_rows(current, tile_size)
+    if previous_hashes is None:
+        return []
+    shifts = [_find_shift(previous_hashes[:, strip],
+                          current_hashes[:, strip])
+              for strip in range(previous_hashes.shape[1])]
+    copies = []
+    strip = 0
+    while strip < len(shifts):
+        shift = shifts[strip]
+        group_end = strip + 1
+        while group_end < len(shifts) and shifts[group_end] == shift:
+            group_end += 1
+        if shift != 0:
+            matching = numpy.ones(len(current_hashes), dtype=bool)
+            for group_strip in range(strip, group_end):
+                matching &= _find_matching_rows(
+                    previous_hashes[:, group_strip],
+                    current_hashes[:, group_strip],
+                    shift)
+            x = strip * tile_size
+            width = (group_end - strip) * tile_size
+            for start, end in _find_runs(matching, tile_size):
+                copies.append((x, start - shift, width, end - start,
+                               x, start))
+        strip = group_end
+    return copies
+
+
+def find_copy_rectangles(previous, current, tile_size):
+    """
+    Find the parts of the frame that moved, so the receiver can copy
+    them from its own frame instead of getting them again. Looks for
+    strips one tile wide that moved up or down, and if there are none,
+    for bands one tile high that moved left or right.
+    :param previous: The previous frame as an array like
+                     (height, width, channels).
+    :param current: The current frame as an array with the same shape.
+    :param tile_size: The width and height of every tile in pixels.
+    :return: A list of CopyRectangle objects. They do not overlap each
+             other.
+    """
+    copies = _find_vertical_copies(previous, current, tile_size)
+    if copies:
+        return [CopyRectangle(*copy) for copy in copies]
+    # Moving left or right is moving up or down in the transposed frame
+    copies = _find_vertical_copies(previous.transpose(1, 0, 2),
+                                   current.transpose(1, 0, 2),
+                                   tile_size)
+    return [CopyRectangle(source_y, source_x, height, width, y, x)
+            for source_x, source_y, width, height, x, y in copies]
+
+
+def apply_copy_rectangles(frame, copies):
+    """
+    Copy the parts of the frame that moved, in order.
+    :param frame: The frame as an array like (height, width, channels).
+                  It is changed in place.
+    :param copies: A list of CopyRectangle objects.
+    """
+    for copy in copies:
+        # numpy copies through a buffer when the parts overlap
+        frame[copy.y:copy.y + copy.height, copy.x:copy.x + copy.width] = (
+            frame[copy.source_y:copy.source_y + copy.height,
+                  copy.source_x:copy.source_x + copy.width])
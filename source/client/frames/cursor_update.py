@@ -0,0 +1,128 @@
+"""
+The format of the updates of the cursor, which is streamed on its own
+instead of in the frames
+"""
+__author__ = "Ron Remets"
+
+import io
+
+import PIL.Image
+
+HEADER_ENCODING = "ascii"
+HEADER_END = b"\n\n"
+# The line of updates of a cursor that is hidden or off the screen
+HIDDEN_LINE = "hidden"
+SHAPE_IMAGE_FORMAT = "png"
+# The digits of the position, enough for screens of 100000 pixels
+POSITION_DIGITS = 5
+
+
+class CursorShape(object):
+    """
+    The image of a shape of the cursor
+    """
+    def __init__(self, shape_id, hotspot_x, hotspot_y, image):
+        """
+        :param shape_id: The id of the shape as a string without commas.
+        :param hotspot_x: The left of the point of the image that is at
+                          the position of the cursor.
+        :param hotspot_y: The top of that point.
+        :param image: The image as an RGBA PIL image.
+        """
+        self.shape_id = shape_id
+        self.hotspot_x = hotspot_x
+        self.hotspot_y = hotspot_y
+        self.image = image
+
+    def __repr__(self):
+        return (f"CursorShape({self.shape_id}, {self.hotspot_x}, "
+                f"{self.hotspot_y}, {self.image.size})")
+
+
+class CursorUpdate(object):
+    """
+    Where the cursor is and which shape it has. The receiver keeps the
+    shapes by their id, so the image of a shape is only sent with the
+    first update that has it.
+    Packed as text lines, an empty line and then the image of the shape:
+        cursor {x},{y},{shape id}
+        [shape {hotspot x},{hotspot y}]
+
+        [{the image of the shape as PNG}]
+    x and y are fractions of the screen from the top left corner. The
+    update of a hidden cursor is only the line "hidden".
+    """
+    def __init__(self, x=None, y=None, shape_id=None, shape=None):
+        """
+        :param x: The left of the cursor in fractions of the screen or
+                  None if the cursor is hidden.
+        :param y: The top of the cursor in fractions of the screen.
+        :param shape_id: The id of the shape of the cursor.
+        :param shape: The CursorShape object of the shape if the
+                      receiver does not have it yet, None otherwise.
+        """
+        self.x = x
+        self.y = y
+        self.shape_id = shape_id
+        self.shape = shape
+
+    @property
+    def visible(self):
+        """
+        :return: True if the cursor is shown, False otherwise.
+        """
+        return self.x is not None
+
+    def pack(self):
+        """
+        Pack the update to bytes.
+        :return: The update as bytes.
+        """
+        if not self.visible:
+            return HIDDEN_LINE.encode(HEADER_ENCODING)
+        lines = [f"cursor {round(self.x, POSITION_DIGITS)},"
+                 f"{round(self.y, POSITION_DIGITS)},{self.shape_id}"]
+        image_bytes = io.BytesIO()
+        if self.shape is not None:
+            lines.append(f"shape {self.shape.hotspot_x},"
+                         f"{self.shape.hotspot_y}")
+            self.shape.image.save(image_bytes, SHAPE_IMAGE_FORMAT)
+        header = "\n".join(lines).encode(HEADER_ENCODING) + HEADER_END
+        return header + image_bytes.getvalue()
+
+    @staticmethod
+    def unpack(content):
+        """
+        Unpack an update from bytes.
+        :param content: The update as bytes (See pack).
+        :return: A CursorUpdate object.
+        :raise ValueError: If the content is not a valid update.
+        """
+        content = bytes(content)
+        if content == HIDDEN_LINE.encode(HEADER_ENCODING):
+            return CursorUpdate()
+        header_end = content.find(HEADER_END)
+        if header_end == -1:
+            raise ValueError("Cursor update has no header")
+        lines = content[:header_end].decode(HEADER_ENCODING).split("\n")
+        kind, value = lines[0].split(" ", 1)
+        if kind != "cursor":
+            raise ValueError("Cursor update does not start with a cursor")
+        x, y, shape_id = value.split(",")
+        cursor_update = CursorUpdate(float(x), float(y), shape_id)
+        if len(lines) == 1:
+            return cursor_update
+        kind, value = lines[1].split(" ", 1)
+        if kind != "shape" or len(lines) > 2:
+            raise ValueError("Cursor update has a bad shape line")
+        hotspot_x, hotspot_y = (int(number) for number in value.split(","))
+        try:
+            image = PIL.Image.open(io.BytesIO(
+                content[header_end + len(HEADER_END):])).convert("RGBA")
+        except OSError as e:
+            raise ValueError(f"Cursor shape image is damaged: {e}")
+        cursor_update.shape = CursorShape(shape_id,
+                                          hotspot_x,
+                                          hotspot_y,
+                                          image)
+        return cursor_update
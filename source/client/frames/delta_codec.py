@@ -0,0 +1,85 @@
+"""
+Encode parts of frames as the difference from the frame before them,
+without any image or video codec
+"""
+__author__ = "Ron Remets"
+
+import zlib
+
+import numpy
+
+from frames.frame_update import Tile
+
+# The tile formats of the delta codec. A raw tile has the pixels of the
+# tile, a delta tile has the difference (modulo 256) of the pixels from
+# the pixels the receiver already has in the same place. Small changes,
+# like fading, are small differences, which compress better than XOR.
+RAW_TILE_FORMAT = "raw"
+DELTA_TILE_FORMAT = "delta"
+DELTA_TILE_FORMATS = (RAW_TILE_FORMAT, DELTA_TILE_FORMAT)
+# The pixels that did not change are zeros, which even the fastest level
+# compresses to almost nothing.
+COMPRESSION_LEVEL = 1
+# The channels of the pixels the delta codec encodes (RGB)
+CHANNELS = 3
+# The frames between keyframes, a keyframe has only raw tiles so the
+# receiver can not drift from the sender for long. Video formats use it
+# too, a receiver can only start watching them from a keyframe.
+DEFAULT_KEYFRAME_INTERVAL = 300
+# The least frames between keyframes, every frame is a keyframe
+MIN_KEYFRAME_INTERVAL = 1
+
+
+def encode_delta_tile(frame, rectangle, reference=None):
+    """
+    Encode a rectangle of a frame as the difference from the reference
+    frame, or as its raw pixels if there is no reference.
+    :param frame: The frame as an array like (height, width, 3).
+    :param rectangle: The rectangle to encode like (x, y, width, height).
+    :param reference: The frame the receiver has as an array with the
+                      same shape, or None.
+    :return: A Tile object.
+    """
+    x, y, width, height = rectangle
+    pixels = frame[y:y + height, x:x + width]
+    if reference is None:
+        tile_format = RAW_TILE_FORMAT
+    else:
+        tile_format = DELTA_TILE_FORMAT
+        # uint8 wraps around, so the receiver adds it back exactly
+        pixels = pixels - reference[y:y + height, x:x + width]
+    # zlib releases the GIL, so tiles compress in parallel
+    data = zlib.compress(numpy.ascontiguousarray(pixels), COMPRESSION_LEVEL)
+    return Tile(x, y, width, height, tile_format, data)
+
+
+def decode_delta_tile(tile, previous=None):
+    """
+    Decode a raw or delta tile to pixels.
+    :param tile: The Tile object.
+    :param previous: The pixels the receiver has where the tile is, as
+                     an array like (height, width, channels) with at
+                     least 3 channels. Needed by delta tiles.
+    :return: The pixels of the tile as RGBA bytes, rows from top to
+             bottom.
+    :raise ValueError: If the tile is damaged or a delta tile has no
+                       previous pixels.
+    """
+    try:
+        data = zlib.decompress(tile.data)
+    except zlib.error as e:
+        raise ValueError(f"Tile {tile} is damaged: {e}")
+    if len(data) != tile.width * tile.height * CHANNELS:
+        raise ValueError(f"Tile {tile} has {len(data)} bytes of pixels")
+    pixels = numpy.frombuffer(data, numpy.uint8).reshape(
+        tile.height, tile.width, CHANNELS)
+    decoded = numpy.empty((tile.height, tile.width, 4), dtype=numpy.uint8)
+    if tile.image_format == DELTA_TILE_FORMAT:
+        if previous is None:
+            raise ValueError(f"Delta tile {tile} has nothing to apply to")
+        numpy.add(pixels, previous[:, :, :CHANNELS],
+                  out=decoded[:, :, :CHANNELS])
+    else:
+        decoded[:, :, :CHANNELS] = pixels
+    decoded[:, :, CHANNELS] = 255
+    return decoded.tobytes()
@@ -0,0 +1,133 @@
+"""
+Find the parts of a frame that changed since the last frame
+"""
+__author__ = "Ron Remets"
+
+import numpy
+
+DEFAULT_TILE_SIZE = 64
+
+
+def find_dirty_tiles(previous, current, tile_size=DEFAULT_TILE_SIZE):
+    """
+    Split the frames to tiles and find the tiles that changed.
+    The edge tiles are smaller if the frame size is not a multiple of
+    the tile size.
+    :param previous: The previous frame as an array like
+                     (height, width, channels).
+    :param current: The current frame as an array with the same shape.
+    :param tile_size: The width and height of every tile in pixels.
+    :return: A bool array like (tile rows, tile columns) that is True
+             where the tile changed.
+    """
+    height, width = current.shape[:2]
+    # Compare every row as one line of bytes, the channels of a pixel
+    # are next to each other so a tile is tile_size * channels bytes
+    # wide.
+    row_length = current.size // height
+    pixel_length = row_length // width
+    changed_bytes = (previous.reshape(height, row_length)
+                     != current.reshape(height, row_length)).view(numpy.uint8)
+    # Reduce the columns first since the bytes of a row are next to each
+    # other in memory, which is a lot faster than reducing the rows.
+    changed_columns = numpy.maximum.reduceat(
+        changed_bytes,
+        numpy.arange(0, row_length, tile_size * pixel_length),
+        axis=1)
+    changed_tiles = numpy.maximum.reduceat(
+        changed_columns,
+        numpy.arange(0, height, tile_size),
+        axis=0)
+    return changed_tiles > 0
+
+
+def find_dirty_rectangles(previous, current, tile_size=DEFAULT_TILE_SIZE):
+    """
+    Find the rectangles that changed between the frames. Dirty tiles
+    that are next to each other in the same row are joined to one
+    rectangle so every rectangle costs less to encode and send.
+    :param previous: The previous frame as an array like
+                     (height, width, channels) or None if there is no
+                     previous frame.
+    :param current: The current frame as an array.
+    :param tile_size: The width and height of every tile in pixels.
+    :return: A list of rectangles like (x, y, width, height). Every row
+             of tiles if there is no previous frame or its size changed,
+             so even the whole frame can be encoded in parallel.
+    """
+    height, width = current.shape[:2]
+    if previous is None or previous.shape != current.shape:
+        return [(0, y, width, min(tile_size, height - y))
+                for y in range(0, height, tile_size)]
+    return find_tile_rectangles(find_dirty_tiles(previous,
+                                                 current,
+                                                 tile_size),
+                                (width, height),
+                                tile_size)
+
+
+def find_tile_rectangles(tiles, size, tile_size=DEFAULT_TILE_SIZE):
+    """
+    Turn tiles to rectangles, tiles that are next to each other in the
+    same row are joined to one rectangle.
+    :param tiles: A bool array like (tile rows, tile columns) that is
+                  True where there is a tile.
+    :param size: The size of the frame like (width, height).
+    :param tile_size: The width and height of every tile in pixels.
+    :return: A list of rectangles like (x, y, width, height).
+    """
+    width, height = size
+    rectangles = []
+    for row, column_start, column_end in _find_dirty_runs(tiles):
+        x = column_start * tile_size
+        y = row * tile_size
+        rectangles.append((x,
+                           y,
+                           min(column_end * tile_size, width) - x,
+                           min(y + tile_size, height) - y))
+    return rectangles
+
+
+def create_tile_grid(size, tile_size=DEFAULT_TILE_SIZE):
+    """
+    :param size: The size of the frame like (width, height).
+    :param tile_size: The width and height of every tile in pixels.
+    :return: A bool array like (tile rows, tile columns) with no tiles.
+    """
+    width, height = size
+    return numpy.zeros((-(-height // tile_size), -(-width // tile_size)),
+                       dtype=bool)
+
+
+def mark_tiles(tiles, rectangle, tile_size=DEFAULT_TILE_SIZE):
+    """
+    Mark every tile a rectangle touches.
+    :param tiles: A bool array like (tile rows, tile columns), changed
+                  in place.
+    :param rectangle: The rectangle like (x, y, width, height).
+    :param tile_size: The width and height of every tile in pixels.
+    """
+    x, y, width, height = rectangle
+    tiles[y // tile_size:-(-(y + height) // tile_size),
+          x // tile_size:-(-(x + width) // tile_size)] = True
+
+
+def _find_dirty_runs(dirty_tiles):
+    """
+    Find the runs of dirty tiles in every row.
+    :param dirty_tiles: A bool array like (tile rows, tile columns).
+    :return: A list of runs like (row, first column, column after the
+             last column).
+    """
+    runs = []
+    # Pad every row with a clean tile on both sides so every run has a
+    # start and an end where the value changes.
+    padded = numpy.zeros((dirty_tiles.shape[0], dirty_tiles.shape[1] + 2),
+                         dtype=numpy.int8)
+    padded[:, 1:-1] = dirty_tiles
+    edges = numpy.diff(padded, axis=1)
+    starts_rows, starts_columns = numpy.nonzero(edges == 1)
+    _, ends_columns = numpy.nonzero(edges == -1)
+    for row, start, end in zip(starts_rows, starts_columns, ends_columns):
+        runs.append((int(row), int(start), int(end)))
+    return runs
@@ -0,0 +1,159 @@
+"""
+Rebuild the frames of the screen recorder from the updates it sends
+"""
+__author__ = "Ron Remets"
+
+import numpy
+
+from frames.copy_rectangles import apply_copy_rectangles
+from frames.delta_codec import DELTA_TILE_FORMAT
+from frames.tile_cache import TileCache, load_cached_tile, store_tile
+from frames.tile_codec import decode_tile
+from frames.video_codec import VIDEO_FORMATS, VideoDecoder
+
+# The channels of the pixels of the frame, matches the tile decoder
+FRAME_CHANNELS = 4
+
+
+class FrameSyncError(ValueError):
+    """
+    Occurs if an update does not follow the frame the receiver has, so
+    it can only start again from a keyframe
+    """
+    pass
+
+
+class FrameBuffer(object):
+    """
+    The pixels of the frame the receiver shows, rebuilt from the frame
+    updates. It copies the rectangles that moved, takes cached tiles from
+    its tile cache and decodes the rest. The screen recorder keeps its
+    tile cache the same way.
+    Not thread safe.
+    """
+    def __init__(self):
+        # The pixels of the frame like (height, width, FRAME_CHANNELS),
+        # rows from top to bottom.
+        self.pixels = None
+        self._tile_cache = TileCache()
+        # The decoder of the video formats, started by every keyframe
+        self._video_decoder = None
+
+    @property
+    def size(self):
+        """
+        :return: The size of the frame like (width, height) or None if no
+                 frame was received yet.
+        """
+        if self.pixels is None:
+            return None
+        height, width = self.pixels.shape[:2]
+        return width, height
+
+    def clear(self):
+        """
+        Forget the frame and the tile cache, the next update must be a
+        keyframe sent with an empty tile cache.
+        """
+        self.pixels = None
+        self._tile_cache.clear()
+        self._video_decoder = None
+
+    def _decode_video_tile(self, tile, keyframe):
+        """
+        Decode a packet of a video format.
+        :param tile: The Tile object.
+        :param keyframe: Whether the update of the tile is a keyframe.
+        :return: The pixels of the frame as an array like
+                 (height, width, FRAME_CHANNELS) or None if the packet
+                 had no frame.
+        :raise FrameSyncError: If the packet does not follow the packets
+                               that were decoded before it.
+        """
+        if self._video_decoder is None:
+            if not keyframe:
+                raise FrameSyncError(f"Tile {tile} needs the packets "
+                                     f"before it")
+            self._video_decoder = VideoDecoder(tile.image_format)
+        elif self._video_decoder.video_format != tile.image_format:
+            raise FrameSyncError(f"Tile {tile} is not in the format of "
+                                 f"the packets before it")
+        try:
+            return self._video_decoder.decode(tile.data,
+                                              (tile.width, tile.height))
+        except ValueError as e:
+            self._video_decoder = None
+            raise FrameSyncError(str(e))
+
+    def _get_tile_pixels(self, tile, frame_update):
+        """
+        Get the pixels of a tile from the tile cache or by decoding it,
+        and add the decoded cells to the tile cache.
+        :param tile: The Tile object
+        :param frame_update: The FrameUpdate object of the tile.
+        :return: The pixels of the tile as an array like
+                 (height, width, FRAME_CHANNELS) or None if the tile
+                 has nothing to draw yet.
+        :raise FrameSyncError: If the tile cache does not have the tile.
+        """
+        if tile.is_cached:
+            try:
+                return load_cached_tile(self._tile_cache, tile)
+            except ValueError as e:
+                raise FrameSyncError(str(e))
+        if tile.image_format in VIDEO_FORMATS:
+            return self._decode_video_tile(tile, frame_update.keyframe)
+        previous = None
+        if tile.image_format == DELTA_TILE_FORMAT:
+            previous = self.pixels[tile.y:tile.y + tile.height,
+                                   tile.x:tile.x + tile.width]
+        pixels = numpy.frombuffer(decode_tile(tile, previous),
+                                  numpy.uint8).reshape(tile.height,
+                                                       tile.width,
+                                                       FRAME_CHANNELS)
+        if tile.keys is not None:
+            store_tile(self._tile_cache,
+                       tile,
+                       pixels,
+                       frame_update.tile_size)
+        return pixels
+
+    def apply(self, frame_update):
+        """
+        Apply an update to the frame.
+        :param frame_update: The FrameUpdate object.
+        :return: A list of the regions that changed like (x, y, pixels),
+                 where pixels is a contiguous array like (height, width,
+                 FRAME_CHANNELS) that later updates do not change, so
+                 another thread can draw it. Drawing them in order gives
+                 the frame.
+        :raise FrameSyncError: If the update does not follow the frame,
+                               like after clear. Only a keyframe can be
+                               applied then.
+        :raise ValueError: If a tile is damaged.
+        """
+        if frame_update.keyframe:
+            # Video packets after a keyframe only depend on it
+            self._video_decoder = None
+            if self.size != frame_update.size:
+                width, height = frame_update.size
+                self.pixels = numpy.zeros((height, width, FRAME_CHANNELS),
+                                          dtype=numpy.uint8)
+        elif self.size != frame_update.size:
+            raise FrameSyncError(f"Frame update of size "
+                                 f"{frame_update.size} does not follow "
+                                 f"the frame of size {self.size}")
+        regions = []
+        apply_copy_rectangles(self.pixels, frame_update.copies)
+        for copy in frame_update.copies:
+            regions.append((copy.x, copy.y, self.pixels[
+                copy.y:copy.y + copy.height,
+                copy.x:copy.x + copy.width].copy()))
+        for tile in frame_update.tiles:
+            pixels = self._get_tile_pixels(tile, frame_update)
+            if pixels is None:
+                continue
+            self.pixels[tile.y:tile.y + tile.height,
+                        tile.x:tile.x + tile.width] = pixels
+            regions.append((tile.x, tile.y, pixels))
+        return regions
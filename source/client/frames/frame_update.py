@@ -0,0 +1,221 @@
+"""
+The format of the updates the screen recorder sends to the streamed
+image
+"""
+__author__ = "Ron Remets"
+
+HEADER_ENCODING = "ascii"
+HEADER_END = b"\n\n"
+# The image format of tiles whose pixels are in the tile cache of the
+# receiver, they have no data.
+CACHED_TILE_FORMAT = "cached"
+KEYS_SEPARATOR = ";"
+# The line of updates that do not depend on the frame the receiver has
+KEYFRAME_LINE = "keyframe"
+# The answers of the receiver to every update. A receiver that can not
+# apply updates anymore asks for a keyframe instead of just an ACK.
+FRAME_ACK = "Message received"
+KEYFRAME_REQUEST = "Keyframe needed"
+
+
+class Tile(object):
+    """
+    A rectangle of a frame and its encoded image
+    """
+    def __init__(self, x, y, width, height, image_format, data, keys=None):
+        """
+        :param x: The left of the tile in pixels.
+        :param y: The top of the tile in pixels.
+        :param width: The width of the tile in pixels.
+        :param height: The height of the tile in pixels.
+        :param image_format: The format the tile is encoded in or
+                             CACHED_TILE_FORMAT.
+        :param data: The encoded image as bytes.
+        :param keys: The tile cache keys of the cells of the tile from
+                     left to right, or None if it is not cached.
+        """
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.image_format = image_format
+        self.data = data
+        self.keys = keys
+
+    @property
+    def is_cached(self):
+        """
+        :return: True if the pixels of the tile are in the tile cache of
+                 the receiver, False otherwise.
+        """
+        return self.image_format == CACHED_TILE_FORMAT
+
+    def __repr__(self):
+        return (f"Tile({self.x}, {self.y}, {self.width}, {self.height}, "
+                f"{self.image_format}, {len(self.data)} bytes)")
+
+
+class CopyRectangle(object):
+    """
+    A rectangle of the frame the receiver already has that moved, so it
+    copies it instead of getting it again
+    """
+    def __init__(self, source_x, source_y, width, height, x, y):
+        """
+        :param source_x: The left of the rectangle before it moved.
+        :param source_y: The top of the rectangle before it moved.
+        :param width: The width of the rectangle in pixels.
+        :param height: The height of the rectangle in pixels.
+        :param x: The left of the rectangle after it moved.
+        :param y: The top of the rectangle after it moved.
+        """
+        self.source_x = source_x
+        self.source_y = source_y
+        self.width = width
+        self.height = height
+        self.x = x
+        self.y = y
+
+    def __repr__(self):
+        return (f"CopyRectangle({self.source_x}, {self.source_y}, "
+                f"{self.width}, {self.height}, {self.x}, {self.y})")
+
+
+class FrameUpdate(object):
+    """
+    The rectangles that moved and the tiles that changed in a frame
+    since the last update. The rectangles are copied in order before the
+    tiles are drawn. A keyframe does not depend on the frame the
+    receiver has (but can depend on its tile cache), so a receiver that
+    lost its frame can start again from it.
+    Packed as text lines, an empty line and then the data of the tiles:
+        frame {width},{height}[,{tile size}]
+        [keyframe]
+        copy {source x},{source y},{width},{height},{x},{y}
+        ...
+        tile {x},{y},{width},{height},{image format},{data length}[,{keys}]
+        ...
+
+        {data of the first tile}{data of the second tile}...
+    The keys are separated by KEYS_SEPARATOR and the tile size is the
+    size of the cells the keys belong to.
+    """
+    def __init__(self,
+                 width,
+                 height,
+                 tiles=None,
+                 tile_size=None,
+                 copies=None,
+                 keyframe=False):
+        """
+        :param width: The width of the whole frame in pixels.
+        :param height: The height of the whole frame in pixels.
+        :param tiles: A list of the tiles that changed.
+        :param tile_size: The size of the cells of the tile cache keys
+                          or None if no tile is cached.
+        :param copies: A list of the CopyRectangle objects that moved.
+        :param keyframe: Whether the update does not depend on the frame
+                         the receiver has.
+        """
+        self.width = width
+        self.height = height
+        if tiles is None:
+            tiles = []
+        self.tiles = tiles
+        self.tile_size = tile_size
+        if copies is None:
+            copies = []
+        self.copies = copies
+        self.keyframe = keyframe
+
+    @property
+    def size(self):
+        """
+        :return: The size of the whole frame like (width, height)
+        """
+        return self.width, self.height
+
+    def pack(self):
+        """
+        Pack the update to bytes.
+        :return: The update as bytes.
+        """
+        frame_line = f"frame {self.width},{self.height}"
+        if self.tile_size is not None:
+            frame_line += f",{self.tile_size}"
+        lines = [frame_line]
+        if self.keyframe:
+            lines.append(KEYFRAME_LINE)
+        for copy in self.copies:
+            lines.append(f"copy {copy.source_x},{copy.source_y},"
+                         f"{copy.width},{copy.height},{copy.x},{copy.y}")
+        for tile in self.tiles:
+            line = (f"tile {tile.x},{tile.y},{tile.width},{tile.height},"
+                    f"{tile.image_format},{len(tile.data)}")
+            if tile.keys is not None:
+                line += "," + KEYS_SEPARATOR.join(tile.keys)
+            lines.append(line)
+        header = "\n".join(lines).encode(HEADER_ENCODING) + HEADER_END
+        return b"".join([header, *(tile.data for tile in self.tiles)])
+
+    @staticmethod
+    def unpack(content):
+        """
+        Unpack an update from bytes.
+        :param content: The update as bytes (See pack).
+        :return: A FrameUpdate object.
+        :raise ValueError: If the content is not a valid update.
+        """
+        header_end = content.find(HEADER_END)
+        if header_end == -1:
+            raise ValueError("Frame update has no header")
+        lines = bytes(content[:header_end]).decode(
+            HEADER_ENCODING).split("\n")
+        content = memoryview(content)
+        kind, value = lines[0].split(" ", 1)
+        if kind != "frame":
+            raise ValueError("Frame update does not start with a frame")
+        numbers = [int(number) for number in value.split(",")]
+        if len(numbers) == 2:
+            tile_size = None
+        elif len(numbers) == 3:
+            tile_size = numbers.pop()
+        else:
+            raise ValueError("Frame update has a bad frame line")
+        width, height = numbers
+        frame_update = FrameUpdate(width, height, tile_size=tile_size)
+        data_start = header_end + len(HEADER_END)
+        for line in lines[1:]:
+            if line == KEYFRAME_LINE:
+                frame_update.keyframe = True
+                continue
+            kind, value = line.split(" ", 1)
+            if kind == "copy":
+                numbers = [int(number) for number in value.split(",")]
+                if len(numbers) != 6:
+                    raise ValueError("Frame update has a bad copy line")
+                frame_update.copies.append(CopyRectangle(*numbers))
+                continue
+            if kind != "tile":
+                raise ValueError(f"Unknown frame update line: {kind}")
+            fields = value.split(",")
+            if len(fields) == 6:
+                keys = None
+            elif len(fields) == 7:
+                keys = fields.pop().split(KEYS_SEPARATOR)
+            else:
+                raise ValueError("Frame update has a bad tile line")
+            x, y, tile_width, tile_height, image_format, length = fields
+            data_end = data_start + int(length)
+            if data_end > len(content):
+                raise ValueError("Frame update is too short")
+            frame_update.tiles.append(Tile(
+                int(x),
+                int(y),
+                int(tile_width),
+                int(tile_height),
+                image_format,
+                bytes(content[data_start:data_end]),
+                keys))
+            data_start = data_end
+        return frame_update
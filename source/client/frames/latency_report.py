@@ -0,0 +1,247 @@
+"""
+Measure how long every stage of the way of a frame takes, from the
+capture on the other side until it is shown here
+"""
+__author__ = "Ron Remets"
+
+import collections
+import threading
+import time
+
+# The time in seconds of frames that the summary is of
+DEFAULT_WINDOW = 5
+# The most ACKs that wait for the other side to say when it got them
+MAX_PENDING_ACKS = 64
+# The clock samples the offset is chosen from. The sample with the
+# shortest round trip is the one the least waiting hides in.
+CLOCK_SAMPLES = 32
+# The stages of the way of a frame in order, and the total
+STAGES = ("encode",
+          "send queue",
+          "mediator",
+          "network",
+          "decode",
+          "present",
+          "total")
+PERCENTILES = (("p50", 50), ("p95", 95))
+
+
+class FrameTiming(object):
+    """
+    The timestamps of a frame, from both sides and the mediator.
+    The timestamps are in seconds since the epoch, each by the clock of
+    the side that took it:
+        capture, encode, send - by the side that streams the frames.
+        ingress, egress - by the mediator, only their difference is used.
+        received, decoded, ack_sent, presented - by this side.
+    """
+    def __init__(self, sequence_number, length, timestamps):
+        """
+        :param sequence_number: The sequence number of the frame.
+        :param length: The length of the frame in bytes.
+        :param timestamps: A dict of the timestamps like {name: time}.
+        """
+        self.sequence_number = sequence_number
+        self.length = length
+        self.timestamps = timestamps
+
+    def __repr__(self):
+        return (f"FrameTiming({self.sequence_number}, {self.length}, "
+                f"{self.timestamps})")
+
+
+def _percentile(sorted_samples, percent):
+    """
+    Get a percentile of the samples using the nearest rank.
+    :param sorted_samples: The samples sorted from small to large.
+    :param percent: The percentile to get (0 - 100)
+    :return: The sample at that percentile.
+    """
+    index = int(round(percent / 100 * (len(sorted_samples) - 1)))
+    return sorted_samples[index]
+
+
+class LatencyReport(object):
+    """
+    Collects the timings of the frames that were shown and summarizes
+    the latency of every stage.
+    The clocks of the sides are not the same, so the offset between
+    them is estimated from the ACKs of the frames, like NTP does: the
+    other side sends when it got the ACK of a frame with the next frame.
+    THREAD SAFE
+    """
+    def __init__(self, window=DEFAULT_WINDOW):
+        """
+        :param window: The time in seconds of frames the summary is of.
+        """
+        self._window = window
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """
+        Forget all the frames. Call this only while holding self._lock.
+        """
+        # The frames that were shown like (present time, length, stage
+        # latencies), the oldest first
+        self._frames = collections.deque()
+        # The ACKs the other side did not say it got yet like {sequence
+        # number: (one way time without the mediator, ACK send time)}
+        self._pending_acks = collections.OrderedDict()
+        # The clock samples like (round trip, offset), the oldest first
+        self._clock_samples = collections.deque(maxlen=CLOCK_SAMPLES)
+        self._clock_offset = None
+        # When the report started, the window is shorter until it is
+        # full
+        self._start_time = time.time()
+
+    def reset(self):
+        """
+        Forget all the frames, like when the stream starts again.
+        """
+        with self._lock:
+            self._reset()
+
+    @staticmethod
+    def _mediator_time(timestamps):
+        """
+        :param timestamps: The timestamps of a frame.
+        :return: The time in seconds the frame waited in the mediator.
+        """
+        if "ingress" in timestamps and "egress" in timestamps:
+            return timestamps["egress"] - timestamps["ingress"]
+        return 0
+
+    def add_ack(self, frame_timing):
+        """
+        Keep when a frame arrived and when its ACK was sent, until the
+        other side says when the ACK arrived (See add_ack_arrival).
+        :param frame_timing: The FrameTiming object of the frame, with
+                             the received and ack_sent timestamps.
+        """
+        timestamps = frame_timing.timestamps
+        if "send" not in timestamps:
+            return
+        one_way = (timestamps["received"]
+                   - timestamps["send"]
+                   - self._mediator_time(timestamps))
+        with self._lock:
+            self._pending_acks[frame_timing.sequence_number] = (
+                one_way,
+                timestamps["ack_sent"])
+            while len(self._pending_acks) > MAX_PENDING_ACKS:
+                self._pending_acks.popitem(last=False)
+
+    def add_ack_arrival(self, sequence_number, arrival_time):
+        """
+        Add a sample of the offset between the clocks.
+        :param sequence_number: The sequence number of the frame whose
+                                ACK arrived.
+        :param arrival_time: When the ACK arrived by the clock of the
+                             other side.
+        """
+        with self._lock:
+            if sequence_number not in self._pending_acks:
+                return
+            one_way, ack_time = self._pending_acks.pop(sequence_number)
+            # Both ways are assumed to take the same time, what is left
+            # is how far this clock is ahead of the other one.
+            back_way = arrival_time - ack_time
+            self._clock_samples.append((one_way + back_way,
+                                        (one_way - back_way) / 2))
+            self._clock_offset = min(self._clock_samples)[1]
+
+    @property
+    def clock_offset(self):
+        """
+        :return: How far in seconds the clock of this side is ahead of
+                 the clock of the other side, or None if it is unknown.
+        """
+        with self._lock:
+            return self._clock_offset
+
+    def _find_stages(self, timestamps):
+        """
+        Call this only while holding self._lock.
+        :param timestamps: The timestamps of a frame that was shown.
+        :return: A dict of the latencies of the stages of the frame like
+                 {stage: seconds}. The stages that need timestamps the
+                 frame does not have are missing.
+        """
+        stages = {"decode": timestamps["decoded"] - timestamps["received"],
+                  "present": timestamps["presented"] - timestamps["decoded"]}
+        if "send" not in timestamps:
+            return stages
+        mediator = self._mediator_time(timestamps)
+        stages["encode"] = timestamps["encode"] - timestamps["capture"]
+        stages["send queue"] = timestamps["send"] - timestamps["encode"]
+        stages["mediator"] = mediator
+        if self._clock_offset is not None:
+            sent = timestamps["send"] + self._clock_offset
+            stages["network"] = timestamps["received"] - sent - mediator
+            stages["total"] = (timestamps["presented"]
+                               - timestamps["capture"]
+                               - self._clock_offset)
+        return stages
+
+    def add_presented(self, frame_timings, present_time):
+        """
+        Add frames that were shown.
+        :param frame_timings: A list of the FrameTiming objects of the
+                              frames, with the decoded timestamps.
+        :param present_time: When they were shown in seconds since the
+                             epoch.
+        """
+        with self._lock:
+            for frame_timing in frame_timings:
+                frame_timing.timestamps["presented"] = present_time
+                self._frames.append((
+                    present_time,
+                    frame_timing.length,
+                    self._find_stages(frame_timing.timestamps)))
+            self._forget_old_frames(present_time)
+
+    def _forget_old_frames(self, current_time):
+        """
+        Forget the frames that are older than the window. Call this only
+        while holding self._lock.
+        :param current_time: The current time in seconds since the epoch.
+        """
+        while (self._frames
+               and current_time - self._frames[0][0] > self._window):
+            self._frames.popleft()
+
+    def summary(self):
+        """
+        Summarize the frames that were shown in the window.
+        :return: A dict like {"fps": frames per second, "kbps": kilobits
+                 per second, "clock offset ms": offset, "stages":
+                 {stage: {"p50 ms": latency, "p95 ms": latency}}}. The
+                 offset and the latencies are None if unknown.
+        """
+        current_time = time.time()
+        with self._lock:
+            self._forget_old_frames(current_time)
+            frames = list(self._frames)
+            clock_offset = self._clock_offset
+            window = min(max(current_time - self._start_time, 0.001),
+                         self._window)
+        summary = {
+            "fps": round(len(frames) / window, 2),
+            "kbps": round(sum(length for _, length, _ in frames)
+                          * 8 / 1000 / window, 2),
+            "clock offset ms": None,
+            "stages": {}}
+        if clock_offset is not None:
+            summary["clock offset ms"] = round(clock_offset * 1000, 3)
+        for stage in STAGES:
+            samples = sorted(stages[stage] for _, _, stages in frames
+                             if stage in stages)
+            summary["stages"][stage] = {}
+            for name, percent in PERCENTILES:
+                latency = None
+                if samples:
+                    latency = round(_percentile(samples, percent) * 1000,
+                                    3)
+                summary["stages"][stage][f"{name} ms"] = latency
+        return summary
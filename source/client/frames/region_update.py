@@ -0,0 +1,75 @@
+"""
+The decoded regions of a frame that the receiver draws on its texture
+"""
+__author__ = "Ron Remets"
+
+
+def _contains(outer, inner):
+    """
+    :param outer: A rectangle like (x, y, width, height).
+    :param inner: Another rectangle.
+    :return: True if outer covers all of inner, False otherwise.
+    """
+    outer_x, outer_y, outer_width, outer_height = outer
+    inner_x, inner_y, inner_width, inner_height = inner
+    return (outer_x <= inner_x
+            and outer_y <= inner_y
+            and inner_x + inner_width <= outer_x + outer_width
+            and inner_y + inner_height <= outer_y + outer_height)
+
+
+class RegionUpdate(object):
+    """
+    The regions of a frame that changed, already decoded to pixels. All
+    the regions of a frame are drawn together, so the receiver never
+    shows half of a frame.
+    """
+    def __init__(self, size, regions, frame_timings=None):
+        """
+        :param size: The size of the frame like (width, height).
+        :param regions: A list of the regions like (x, y, pixels), where
+                        pixels is a contiguous RGBA array like (height,
+                        width, 4). Drawing them in order gives the frame.
+        :param frame_timings: A list of the FrameTiming objects of the
+                              frames the regions are of.
+        """
+        self.size = size
+        self.regions = regions
+        if frame_timings is None:
+            frame_timings = []
+        self.frame_timings = frame_timings
+
+    def __repr__(self):
+        return f"RegionUpdate({self.size}, {len(self.regions)} regions)"
+
+    @staticmethod
+    def merge(region_updates):
+        """
+        Merge updates that arrived before they could be drawn, so they
+        are drawn at once. Regions that a later region covers are not
+        drawn, and neither is anything before a change of the size,
+        which starts a new texture. The timings of all the frames are
+        kept, they are all shown when the merged update is.
+        :param region_updates: A list of RegionUpdate objects, in order.
+        :return: A RegionUpdate object or None if the list is empty.
+        """
+        if not region_updates:
+            return None
+        size = region_updates[-1].size
+        merged = []
+        rectangles = []
+        for region_update in reversed(region_updates):
+            if region_update.size != size:
+                break
+            for x, y, pixels in reversed(region_update.regions):
+                height, width = pixels.shape[:2]
+                rectangle = (x, y, width, height)
+                if any(_contains(later, rectangle) for later in rectangles):
+                    continue
+                rectangles.append(rectangle)
+                merged.append((x, y, pixels))
+        merged.reverse()
+        frame_timings = [frame_timing
+                         for region_update in region_updates
+                         for frame_timing in region_update.frame_timings]
+        return RegionUpdate(size, merged, frame_timings)
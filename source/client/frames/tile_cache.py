@@ -0,0 +1,179 @@
+"""
+Remember tiles by their content so tiles the receiver already has are
+not sent again
+"""
+__author__ = "Ron Remets"
+
+import collections
+import hashlib
+
+import numpy
+
+from frames.frame_update import CACHED_TILE_FORMAT, Tile
+
+# The most cells both caches hold. The receiver keeps the RGBA pixels of
+# every cell, which is 32MB for cells of 64 pixels. Both sides must use
+# the same capacity so they evict the same cells.
+DEFAULT_TILE_CACHE_SIZE = 2048
+# The length in bytes of the content hash of a cell
+KEY_LENGTH = 8
+
+
+class TileCache(object):
+    """
+    A least recently used cache of cells by the hash of their content.
+    The sender and the receiver each have one and do the same operations
+    on it in the same order, so they always hold the same keys and the
+    sender knows which cells the receiver has.
+    Not thread safe.
+    """
+    def __init__(self, capacity=DEFAULT_TILE_CACHE_SIZE):
+        """
+        :param capacity: The most cells the cache holds.
+        """
+        self._capacity = capacity
+        self._cells = collections.OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._cells
+
+    def __len__(self):
+        return len(self._cells)
+
+    def copy(self):
+        """
+        :return: A new TileCache with the same cells in the same order.
+        """
+        tile_cache = TileCache(self._capacity)
+        tile_cache._cells = self._cells.copy()
+        return tile_cache
+
+    def get(self, key):
+        """
+        Get a cell and make it the most recently used.
+        :param key: The key of the cell.
+        :return: The value of the cell.
+        :raise KeyError: If the cell is not in the cache.
+        """
+        self._cells.move_to_end(key)
+        return self._cells[key]
+
+    def put(self, key, value=None):
+        """
+        Add a cell as the most recently used and evict the least
+        recently used cell if the cache is full.
+        :param key: The key of the cell.
+        :param value: The value of the cell, the sender only needs keys.
+        """
+        self._cells[key] = value
+        self._cells.move_to_end(key)
+        if len(self._cells) > self._capacity:
+            self._cells.popitem(last=False)
+
+    def clear(self):
+        """
+        Forget all the cells.
+        """
+        self._cells.clear()
+
+
+def find_cell_keys(frame, rectangle, tile_size, variant=""):
+    """
+    Hash the content of the cells of a rectangle.
+    :param frame: The frame as an array like (height, width, channels).
+    :param rectangle: A rectangle like (x, y, width, height) that starts
+                      at a cell and is one cell high.
+    :param tile_size: The width and height of a cell in pixels.
+    :param variant: A string that changes the keys, for cells that are
+                    decoded to different pixels, like in another color
+                    mode.
+    :return: A list of the keys of the cells from left to right.
+    """
+    x, y, width, height = rectangle
+    keys = []
+    for cell_x in range(x, x + width, tile_size):
+        cell = numpy.ascontiguousarray(
+            frame[y:y + height, cell_x:min(cell_x + tile_size, x + width)])
+        cell_hash = hashlib.blake2b(cell, digest_size=KEY_LENGTH)
+        # Cells of different sizes can have the same bytes
+        cell_hash.update(f"{cell.shape}{variant}".encode())
+        keys.append(cell_hash.hexdigest())
+    return keys
+
+
+def split_cached_cells(tile_cache, rectangle, keys, tile_size):
+    """
+    Split a rectangle to runs of cells the receiver has and runs of
+    cells it does not have, and update the cache like the receiver will
+    when it gets them.
+    :param tile_cache: The TileCache of the sender.
+    :param rectangle: A rectangle like (x, y, width, height) that starts
+                      at a cell and is one cell high.
+    :param keys: The keys of the cells of the rectangle.
+    :param tile_size: The width and height of a cell in pixels.
+    :return: A list of runs like (rectangle, keys, cached).
+    """
+    x, y, width, height = rectangle
+    runs = []
+    for index, key in enumerate(keys):
+        cached = key in tile_cache
+        if cached:
+            tile_cache.get(key)
+        else:
+            tile_cache.put(key)
+        cell_x = x + index * tile_size
+        cell_width = min(tile_size, x + width - cell_x)
+        if runs and runs[-1][2] == cached:
+            run_rectangle, run_keys, _ = runs[-1]
+            run_x, _, run_width, _ = run_rectangle
+            runs[-1] = ((run_x, y, run_width + cell_width, height),
+                        run_keys + [key],
+                        cached)
+        else:
+            runs.append(((cell_x, y, cell_width, height), [key], cached))
+    return runs
+
+
+def create_cached_tile(rectangle, keys):
+    """
+    Create a tile the receiver takes from its tile cache.
+    :param rectangle: The rectangle of the tile like (x, y, width,
+                      height).
+    :param keys: The keys of the cells of the tile.
+    :return: A Tile object.
+    """
+    x, y, width, height = rectangle
+    return Tile(x, y, width, height, CACHED_TILE_FORMAT, b"", keys)
+
+
+def load_cached_tile(tile_cache, tile):
+    """
+    Take the pixels of a cached tile from the cache of the receiver.
+    :param tile_cache: The TileCache of the receiver.
+    :param tile: A cached Tile object.
+    :return: The pixels of the tile as an array like
+             (height, width, channels).
+    :raise ValueError: If a cell is not in the cache, which means the
+                       caches are out of sync.
+    """
+    try:
+        cells = [tile_cache.get(key) for key in tile.keys]
+    except KeyError:
+        raise ValueError(f"Tile {tile} is not in the tile cache")
+    return numpy.hstack(cells)
+
+
+def store_tile(tile_cache, tile, pixels, tile_size):
+    """
+    Add the cells of a decoded tile to the cache of the receiver.
+    :param tile_cache: The TileCache of the receiver.
+    :param tile: The Tile object.
+    :param pixels: The decoded pixels of the tile as an array like
+                   (height, width, channels).
+    :param tile_size: The width and height of a cell in pixels.
+    """
+    for index, key in enumerate(tile.keys):
+        cell_x = index * tile_size
+        # Copy so the cell does not keep the pixels of the whole tile
+        tile_cache.put(key,
+                       pixels[:, cell_x:cell_x + tile_size].copy())
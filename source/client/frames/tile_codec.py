@@ -0,0 +1,112 @@
+"""
+Encode parts of frames to images and decode them back to pixels
+"""
+__author__ = "Ron Remets"
+
+import io
+
+import PIL.features
+import PIL.Image
+
+from frames.color_modes import (DEFAULT_COLOR_MODE,
+                                PNG_ONLY_COLOR_MODES,
+                                expand_colors,
+                                reduce_colors)
+from frames.delta_codec import (DELTA_TILE_FORMATS,
+                                decode_delta_tile,
+                                encode_delta_tile)
+from frames.frame_update import Tile
+from frames.video_codec import VIDEO_FORMATS, is_video_format_supported
+
+DEFAULT_IMAGE_FORMAT = "png"
+# delta is not an image format, it encodes the difference from the frame
+# the receiver has (see delta_codec)
+IMAGE_FORMATS = ("png", "jpeg", "webp", "delta")
+# Formats that lose some of the image and take a quality (1 to 100)
+LOSSY_IMAGE_FORMATS = ("jpeg", "webp")
+DEFAULT_QUALITY = 75
+# The range of the quality of the lossy formats
+MIN_QUALITY = 1
+MAX_QUALITY = 100
+# The WebP encoder effort (0 is the fastest, 6 the smallest). Frames
+# have to be encoded in real time, so use the fastest.
+WEBP_METHOD = 0
+# The format of the pixels that decoding returns
+DECODED_COLOR_FORMAT = "RGBA"
+
+
+def is_image_format_supported(image_format):
+    """
+    Check whether tiles can be encoded in a format on this device. The
+    video formats encode whole frames (see video_codec).
+    :param image_format: The name of the format.
+    :return: True if it is supported, False otherwise
+    """
+    if image_format in VIDEO_FORMATS:
+        return is_video_format_supported(image_format)
+    if image_format == "webp":
+        return PIL.features.check("webp")
+    return image_format in IMAGE_FORMATS
+
+
+def encode_tile(frame,
+                rectangle,
+                image_format=DEFAULT_IMAGE_FORMAT,
+                quality=DEFAULT_QUALITY,
+                color_mode=DEFAULT_COLOR_MODE,
+                palette=None,
+                reference=None):
+    """
+    Encode a rectangle of a frame to an image.
+    :param frame: The frame as an array like (height, width, 3).
+    :param rectangle: The rectangle to encode like (x, y, width, height).
+    :param image_format: The format to encode the image in. Ignored by
+                         the color modes only PNG can keep.
+    :param quality: The quality (1 to 100) of lossy formats.
+    :param color_mode: The color mode of the image, see COLOR_MODES.
+    :param palette: The palette image of the palette mode.
+    :param reference: The frame the receiver has, for the delta format.
+                      None sends the raw pixels.
+    :return: A Tile object.
+    """
+    if image_format == "delta":
+        if color_mode == DEFAULT_COLOR_MODE:
+            return encode_delta_tile(frame, rectangle, reference)
+        # The other color modes change the pixels, so the receiver does
+        # not have the reference.
+        image_format = "png"
+    x, y, width, height = rectangle
+    image = reduce_colors(frame[y:y + height, x:x + width],
+                          color_mode,
+                          palette)
+    if color_mode in PNG_ONLY_COLOR_MODES:
+        image_format = "png"
+    save_options = {}
+    if image_format in LOSSY_IMAGE_FORMATS:
+        save_options["quality"] = quality
+    if image_format == "webp":
+        save_options["method"] = WEBP_METHOD
+    image_bytes = io.BytesIO()
+    image.save(image_bytes, image_format, **save_options)
+    return Tile(x, y, width, height, image_format, image_bytes.getvalue())
+
+
+def decode_tile(tile, previous=None):
+    """
+    Decode the image of a tile to pixels. Images in a reduced color mode
+    are expanded back to full color.
+    :param tile: The Tile object.
+    :param previous: The pixels the receiver has where the tile is, as
+                     an array like (height, width, channels). Needed by
+                     delta tiles.
+    :return: The pixels of the tile as RGBA bytes, rows from top to
+             bottom.
+    :raise ValueError: If the image does not match the size of the tile.
+    """
+    if tile.image_format in DELTA_TILE_FORMATS:
+        return decode_delta_tile(tile, previous)
+    image = PIL.Image.open(io.BytesIO(tile.data))
+    if image.size != (tile.width, tile.height):
+        raise ValueError(f"Tile image size {image.size} does not match "
+                         f"the tile {tile}")
+    return expand_colors(image)
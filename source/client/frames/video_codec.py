@@ -0,0 +1,166 @@
+"""
+Encode whole frames with a software video encoder, for video and
+animations that change too much of the frame for tiles
+"""
+__author__ = "Ron Remets"
+
+import fractions
+
+import numpy
+
+try:
+    import av
+except ImportError:
+    av = None
+
+# The video formats, named like the codecs of FFmpeg. A tile of a video
+# format covers the whole frame and has one encoded packet.
+VIDEO_FORMATS = ("h264", "vp8")
+# The options of the encoders that make them output every frame right
+# away instead of waiting for the frames after it.
+LOW_LATENCY_OPTIONS = {
+    "h264": {"preset": "ultrafast", "tune": "zerolatency"},
+    "vp8": {"deadline": "realtime", "cpu-used": "8", "lag-in-frames": "0"}}
+# The quality of the encoders, with lossy image formats it changes with
+# the link, but an encoder can not change it once it started.
+H264_CRF = "23"
+VP8_CRF = "10"
+VP8_BIT_RATE = 8 * 1024 * 1024
+# The YUV format the encoders take, it has half the color resolution so
+# frames must have an even width and height.
+PIXEL_FORMAT = "yuv420p"
+# The pixel format of the frames the recorder captures and the frames
+# the frame buffer draws
+INPUT_PIXEL_FORMAT = "rgb24"
+OUTPUT_PIXEL_FORMAT = "rgba"
+# Frames are numbered one after the other, the time between them does
+# not matter to the encoder.
+TIME_BASE = fractions.Fraction(1, 1000)
+
+
+def is_video_format_supported(video_format):
+    """
+    Check whether frames can be encoded in a video format on this
+    device.
+    :param video_format: The name of the format.
+    :return: True if it is supported, False otherwise
+    """
+    if av is None or video_format not in VIDEO_FORMATS:
+        return False
+    try:
+        av.codec.Codec(video_format, "w")
+        av.codec.Codec(video_format, "r")
+    except ValueError:
+        return False
+    return True
+
+
+def _pad_to_even(pixels):
+    """
+    Pad a frame to an even width and height by repeating its last row
+    and column.
+    :param pixels: The frame as an array like (height, width, 3).
+    :return: The padded frame as an array.
+    """
+    height, width = pixels.shape[:2]
+    if height % 2 == 0 and width % 2 == 0:
+        return pixels
+    return numpy.pad(pixels,
+                     ((0, height % 2), (0, width % 2), (0, 0)),
+                     mode="edge")
+
+
+class VideoEncoder(object):
+    """
+    Encode frames of one size with a video codec. The first frame is a
+    keyframe, every frame after it depends on the frames before it, so
+    every packet must reach the decoder in order. To start from a
+    keyframe again, create a new encoder.
+    Not thread safe.
+    """
+    def __init__(self, video_format, size, keyframe_interval):
+        """
+        :param video_format: One of VIDEO_FORMATS.
+        :param size: The size of the frames like (width, height).
+        :param keyframe_interval: The most frames between keyframes.
+        :raise ValueError: If the format is not supported.
+        """
+        if not is_video_format_supported(video_format):
+            raise ValueError(f"Video format {video_format} is not "
+                             f"supported")
+        self.video_format = video_format
+        self.size = size
+        width, height = size
+        options = dict(LOW_LATENCY_OPTIONS[video_format])
+        if video_format == "h264":
+            options["crf"] = H264_CRF
+        else:
+            options["crf"] = VP8_CRF
+        self._context = av.CodecContext.create(video_format, "w")
+        self._context.width = width + width % 2
+        self._context.height = height + height % 2
+        self._context.pix_fmt = PIXEL_FORMAT
+        self._context.time_base = TIME_BASE
+        self._context.gop_size = keyframe_interval
+        # B-frames depend on frames after them, which adds latency
+        self._context.max_b_frames = 0
+        if video_format == "vp8":
+            self._context.bit_rate = VP8_BIT_RATE
+        self._context.options = options
+        self._frame_index = 0
+
+    def encode(self, pixels):
+        """
+        Encode the next frame.
+        :param pixels: The frame as an array like (height, width, 3).
+        :return: A list of the encoded packets like (data, is keyframe).
+                 Usually one packet, but it can be empty.
+        """
+        frame = av.VideoFrame.from_ndarray(
+            numpy.ascontiguousarray(_pad_to_even(pixels)),
+            format=INPUT_PIXEL_FORMAT)
+        frame.pts = self._frame_index
+        self._frame_index += 1
+        return [(bytes(packet), packet.is_keyframe)
+                for packet in self._context.encode(frame)]
+
+
+class VideoDecoder(object):
+    """
+    Decode the packets of a VideoEncoder, in the order they were
+    encoded, starting from a keyframe.
+    Not thread safe.
+    """
+    def __init__(self, video_format):
+        """
+        :param video_format: One of VIDEO_FORMATS.
+        :raise ValueError: If the format is not supported.
+        """
+        if not is_video_format_supported(video_format):
+            raise ValueError(f"Video format {video_format} is not "
+                             f"supported")
+        self.video_format = video_format
+        self._context = av.CodecContext.create(video_format, "r")
+
+    def decode(self, data, size):
+        """
+        Decode a packet.
+        :param data: The packet as bytes.
+        :param size: The size of the frame like (width, height), without
+                     the padding of the encoder.
+        :return: The pixels of the last frame in the packet as a
+                 contiguous array like (height, width, 4), or None if it
+                 had no frame.
+        :raise ValueError: If the packet is damaged or does not follow
+                           the packets before it.
+        """
+        try:
+            frames = self._context.decode(av.Packet(data))
+        except av.FFmpegError as e:
+            raise ValueError(f"Video packet is damaged: {e}")
+        if not frames:
+            return None
+        width, height = size
+        pixels = frames[-1].to_ndarray(format=OUTPUT_PIXEL_FORMAT)
+        # Without the padding of the encoder
+        return numpy.ascontiguousarray(pixels[:height, :width])
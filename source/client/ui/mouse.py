@@ -13,10 +13,11 @@ from kivy.properties import (ObjectProperty,
                              OptionProperty)
 
 from communication.message import Message, MESSAGE_TYPES
+from communication.mouse_events import MOVE_ACTION
 from popup.error_popup import ErrorPopup
 
 DEFAULT_BUTTON_TYPE = "left"
-DEFAULT_CLICK_TYPE = "move"
+DEFAULT_CLICK_TYPE = MOVE_ACTION
 DEFAULT_MOUSE_INSIDE_SPRITE_PERCENT = 0.9
 MOUSE_OUTSIDE_COLOR = 0, 0, 0, 1
 MOUSE_INSIDE_COLOR = 1, 1, 1, 1
@@ -53,6 +54,9 @@ class Mouse(Widget):
 
         self.bind(pos=self._update_sprite)
         self.bind(size=self._update_sprite)
+        # The position on the other screen of the last event that was
+        # sent, so moves that do not change it are not sent
+        self._last_sent_pos = None
 
     def _update_sprite(self, *_):
         """
@@ -71,7 +75,8 @@ class Mouse(Widget):
     def _transform_pos(self, pos):
         """
         Turn the position of the widget on this screen to the position
-        of the mouse in the other screen
+        of the mouse in the other screen. The frame only shows the
+        viewport of the other screen, so the position is moved into it.
         :param pos: The current position of the mouse
         :return: The transformed position
         """
@@ -80,6 +85,8 @@ class Mouse(Widget):
         other_width = self._app.other_screen_width
         other_height = self._app.other_screen_height
         width, height = self._app.screen_size
+        viewport_x, viewport_y, viewport_width, viewport_height = (
+            self._app.viewport)
         # TODO: use screen pos and not divide by.
         #  what if image is not centered?
         dy = pos[1] - (Window.height - height) / 2
@@ -87,13 +94,37 @@ class Mouse(Widget):
         if width == 0:
             transformed_x = 0
         else:
-            transformed_x = int((dx / width) * other_width)
+            transformed_x = int(
+                (viewport_x + (dx / width) * viewport_width) * other_width)
         if height == 0:
             transformed_y = 0
         else:
-            transformed_y = int(other_height - (dy / height) * other_height)
+            transformed_y = int(
+                (viewport_y + (1 - dy / height) * viewport_height)
+                * other_height)
         return transformed_x, transformed_y
 
+    def _send_event(self, action, pos):
+        """
+        Send an event of the mouse to the other side.
+        :param action: The action of the event, like "move" or "press".
+        :param pos: The position of the event on this screen.
+        """
+        x, y = self._transform_pos(pos)
+        self._last_sent_pos = (x, y)
+        self.connection.socket.send(Message(
+            MESSAGE_TYPES["controller"],
+            f"{action} {self.button_type} {x},{y}"))
+
+    def _crash(self):
+        """
+        Stop tracking and tell the user the mouse crashed.
+        """
+        self.is_tracking = False
+        error_popup = ErrorPopup()
+        error_popup.content_label.text = "Mouse crashed"
+        error_popup.open()
+
     def on_touch_down(self, touch):
         """
         On touch down, move the mouse to that location and send it pos
@@ -107,26 +138,22 @@ class Mouse(Widget):
             self.pos = touch.pos
             if touch.is_double_tap:
                 action = "click"
-            elif self.click_type == "move":
-                action = "move"
+            elif self.click_type == MOVE_ACTION:
+                action = MOVE_ACTION
             else:
                 action = "press"
-            x, y = self._transform_pos(touch.pos)
-
-            self.connection.socket.send(Message(
-                MESSAGE_TYPES["controller"],
-                f"{action} {self.button_type} {x},{y}"))
+            self._send_event(action, touch.pos)
         except Exception as e:
             print(e)
-            self.is_tracking = False
-            error_popup = ErrorPopup()
-            error_popup.content_label.text = "Mouse crashed"
-            error_popup.open()
+            self._crash()
         return super().on_touch_down(touch)
 
     def on_touch_move(self, touch):
         """
-        Happens every frame while touch is down
+        Happens every frame while touch is down. Move the mouse of the
+        other side with the touch, so it can drag and hover. The socket
+        keeps only the newest of the moves that were not sent yet, and
+        never drops or reorders presses and releases around them.
         :param touch: The touch object
         """
         if (not self.is_tracking
@@ -134,6 +161,12 @@ class Mouse(Widget):
                 or self.click_type_spinner.collide_point(*touch.pos)):
             return False
         self.pos = touch.pos
+        try:
+            if self._transform_pos(touch.pos) != self._last_sent_pos:
+                self._send_event(MOVE_ACTION, touch.pos)
+        except Exception as e:
+            print(e)
+            self._crash()
 
     def on_touch_up(self, touch):
         """
@@ -147,18 +180,11 @@ class Mouse(Widget):
             return False
         try:
             self.pos = touch.pos
-            if self.click_type == "move":
-                action = "move"
+            if self.click_type == MOVE_ACTION:
+                action = MOVE_ACTION
             else:
                 action = "release"
-            x, y = self._transform_pos(touch.pos)
-
-            self.connection.socket.send(Message(
-                MESSAGE_TYPES["controller"],
-                f"{action} {self.button_type} {x},{y}"))
+            self._send_event(action, touch.pos)
         except Exception as e:
             print(e)
-            self.is_tracking = False
-            error_popup = ErrorPopup()
-            error_popup.content_label.text = "Mouse crashed"
-            error_popup.open()
+            self._crash()
@@ -12,6 +12,7 @@ from kivy.clock import Clock
 from kivy.uix.screenmanager import Screen
 from kivy.properties import ObjectProperty
 
+from components.cursor_streamer import CursorStreamer
 from components.mouse_controller import MouseController
 from components.screen_streamer import ScreenStreamer
 from components.keyboard_controller import KeyboardController
@@ -25,6 +26,7 @@ class ControlledScreen(Screen):
     """
     mouse_controller = ObjectProperty(MouseController())
     screen_streamer = ObjectProperty(ScreenStreamer())
+    cursor_streamer = ObjectProperty(CursorStreamer())
     keyboard_controller = ObjectProperty(KeyboardController())
     session_settings = ObjectProperty(SessionSettings())
 
@@ -44,6 +46,71 @@ class ControlledScreen(Screen):
                 MESSAGE_TYPES["controlled"],
                 f"other screen size:{width}, {height}"))
 
+    def _update_frame_codec(self, *_):
+        """
+        Encode the frames the way the other side asked for.
+        """
+        self.screen_streamer.set_frame_codec(
+            self._app.screen_image_format,
+            int(self._app.screen_image_quality),
+            self._app.screen_adaptive_quality)
+
+    def _update_color_mode(self, *_):
+        """
+        Encode the frames in the color mode the other side asked for.
+        The automatic color modes depend on the image format, so this
+        also runs when the image format changes.
+        """
+        self.screen_streamer.set_color_mode(self._app.screen_color_mode)
+
+    def _update_frame_rate(self, *_):
+        """
+        Stream at the frame rate the other side asked for.
+        """
+        self.screen_streamer.screen_recorder.set_frame_rate(
+            int(self._app.screen_target_fps),
+            int(self._app.screen_max_fps))
+
+    def _update_keyframe_interval(self, *_):
+        """
+        Send keyframes as often as the other side asked for.
+        """
+        self.screen_streamer.screen_recorder.keyframe_interval = int(
+            self._app.screen_keyframe_interval)
+
+    def _update_progressive(self, *_):
+        """
+        Send large changes as a draft first if the other side asked for
+        it.
+        """
+        self.screen_streamer.screen_recorder.progressive = (
+            self._app.screen_progressive)
+
+    def _update_frame_timing(self, *_):
+        """
+        Add timestamps to the frames if the other side asked for them.
+        """
+        self.screen_streamer.frame_timing = self._app.screen_frame_timing
+
+    def _update_view_size(self, *_):
+        """
+        Capture at the size the other side shows the frames at.
+        """
+        if self._app.other_view_size:
+            resolution = tuple(self._app.other_view_size)
+        else:
+            resolution = None
+        self.screen_streamer.screen_recorder.resolution = resolution
+
+    def _update_viewport(self, *_):
+        """
+        Capture only the region of the screen the other side shows.
+        """
+        viewport = tuple(self._app.other_viewport)
+        if viewport == (0, 0, 1, 1):
+            viewport = None
+        self.screen_streamer.screen_recorder.region = viewport
+
     def _start_mouse_controller(self, connection_status):
         """
         Start the mouse_controller.
@@ -66,6 +133,17 @@ class ControlledScreen(Screen):
                 self._app.connection_manager.client.get_connection(
                     "screen recorder"))
 
+    def _start_cursor_streamer(self, connection_status):
+        """
+        Start the cursor streamer.
+        :param connection_status: The connection status of the
+                                  connection used to stream the cursor
+        """
+        if connection_status == "ready":
+            self.cursor_streamer.start(
+                self._app.connection_manager.client.get_connection(
+                    "cursor"))
+
     def _start_keyboard(self, connection_status):
         if connection_status == "ready":
             self.keyboard_controller.start(
@@ -100,6 +178,27 @@ class ControlledScreen(Screen):
         """
         When this screen starts, start recording the screen.
         """
+        self._update_frame_codec()
+        self._app.bind(screen_image_format=self._update_frame_codec,
+                       screen_image_quality=self._update_frame_codec,
+                       screen_adaptive_quality=self._update_frame_codec)
+        self._update_color_mode()
+        self._app.bind(screen_color_mode=self._update_color_mode,
+                       screen_image_format=self._update_color_mode)
+        self._update_frame_rate()
+        self._app.bind(screen_target_fps=self._update_frame_rate,
+                       screen_max_fps=self._update_frame_rate)
+        self._update_keyframe_interval()
+        self._app.bind(
+            screen_keyframe_interval=self._update_keyframe_interval)
+        self._update_progressive()
+        self._app.bind(screen_progressive=self._update_progressive)
+        self._update_frame_timing()
+        self._app.bind(screen_frame_timing=self._update_frame_timing)
+        self._update_view_size()
+        self._app.bind(other_view_size=self._update_view_size)
+        self._update_viewport()
+        self._app.bind(other_viewport=self._update_viewport)
         logging.info("Creating mouse tracker connection")
         self._app.connection_manager.add_connection(
             self._app.username,
@@ -113,10 +212,21 @@ class ControlledScreen(Screen):
         self._app.connection_manager.add_connection(
             self._app.username,
             "screen recorder",
-            (True, False),
+            (True, True),
             "frame - sender",
             block=False,
             callback=self._start_screen_streamer)
+        # The cursor is relayed one way with a low delay, like the
+        # mouse, only to the other side.
+        logging.info("Creating cursor connection")
+        self._app.connection_manager.add_connection(
+            self._app.username,
+            "cursor",
+            (True, True),
+            "mouse - sender",
+            block=False,
+            callback=self._start_cursor_streamer,
+            only_send=True)
         logging.info("Creating keyboard tracker connection")
         self._app.connection_manager.add_connection(
             self._app.username,
@@ -139,10 +249,12 @@ class ControlledScreen(Screen):
         """
         # TODO: what happens if sockets die before self.connected but running?
         self.screen_streamer.close()
+        self.cursor_streamer.close()
         self.mouse_controller.close()
         self.keyboard_controller.close()
         self.session_settings.close()
         for connection_name in ("screen recorder",
+                                "cursor",
                                 "mouse tracker",
                                 "keyboard tracker",
                                 "settings"):
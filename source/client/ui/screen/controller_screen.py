@@ -3,17 +3,34 @@ The controller screen.
 """
 __author__ = "Ron Remets"
 
+import json
 import logging
+import time
 
 from kivy.app import App
 from kivy.uix.screenmanager import Screen
 from kivy.properties import ObjectProperty
-from kivy.clock import mainthread
+from kivy.clock import Clock, mainthread
 
 from communication.message import Message, MESSAGE_TYPES
+from communication.mouse_events import is_mouse_move
 from components.session_settings import SessionSettings
 from ui.mouse import Mouse
 
+# The time in seconds the view must keep its size before the other side
+# is told to capture at it, so resizing the window does not restart the
+# stream on every step.
+VIEW_SIZE_DELAY = 0.2
+# How much every scroll of the mouse wheel zooms and how far in it can
+# zoom
+ZOOM_STEP = 1.25
+MAX_ZOOM = 8
+# The viewport of the whole screen
+FULL_VIEWPORT = [0, 0, 1, 1]
+# The time in seconds between updates of the latency overlay and the
+# latency log
+LATENCY_REPORT_INTERVAL = 0.5
+
 
 class ControllerScreen(Screen):
     """
@@ -22,11 +39,16 @@ class ControllerScreen(Screen):
     mouse = ObjectProperty(Mouse())
     screen = ObjectProperty()
     keyboard_tracker = ObjectProperty()
+    latency_label = ObjectProperty()
     session_settings = ObjectProperty(SessionSettings())
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._app = App.get_running_app()
+        self._update_view_size_trigger = Clock.create_trigger(
+            self._update_view_size,
+            VIEW_SIZE_DELAY)
+        self._report_latency_event = None
 
     def _update_screen_size_variable(self, *_):
         self._app.screen_size = self.screen.norm_image_size
@@ -40,11 +62,199 @@ class ControllerScreen(Screen):
                 MESSAGE_TYPES["controller"],
                 f"other screen size:{width}, {height}"))
 
+    def _update_view_size(self, *_):
+        """
+        Tell the other side the size the frames are shown at, so it
+        does not capture more pixels than can be shown.
+        """
+        width, height = (int(value) for value in self.screen.size)
+        logging.info(f"CONTROLLER:View size: {width}, {height}")
+        if self.session_settings.running:
+            self.session_settings.settings_updates.put(Message(
+                MESSAGE_TYPES["controller"],
+                f"view size:{width}, {height}"))
+
+    def _update_viewport(self, *_):
+        """
+        Tell the other side which region of its screen is shown, so it
+        only captures that region, as sharp as the view can show it.
+        """
+        viewport = ", ".join(str(part) for part in self._app.viewport)
+        logging.info(f"CONTROLLER:Viewport: {viewport}")
+        if self.session_settings.running:
+            self.session_settings.settings_updates.put(Message(
+                MESSAGE_TYPES["controller"],
+                f"viewport:{viewport}"))
+
+    def _get_view_fraction(self, pos):
+        """
+        Find where a position is in the shown frame.
+        :param pos: The position in the window
+        :return: The position like (x, y) in fractions of the frame,
+                 from the top left corner, clamped to the frame.
+        """
+        width, height = self.screen.norm_image_size
+        if width == 0 or height == 0:
+            return 0.5, 0.5
+        x = (pos[0] - (self.screen.center_x - width / 2)) / width
+        y = 1 - (pos[1] - (self.screen.center_y - height / 2)) / height
+        return min(max(x, 0), 1), min(max(y, 0), 1)
+
+    def _zoom(self, pos, factor):
+        """
+        Zoom the viewport so the point under pos stays in place.
+        :param pos: The position in the window to zoom around
+        :param factor: How much to zoom in, under 1 zooms out
+        """
+        x, y, width, height = self._app.viewport
+        fraction_x, fraction_y = self._get_view_fraction(pos)
+        new_width = min(max(width / factor, 1 / MAX_ZOOM), 1)
+        new_height = min(max(height / factor, 1 / MAX_ZOOM), 1)
+        new_x = x + fraction_x * (width - new_width)
+        new_y = y + fraction_y * (height - new_height)
+        self._app.viewport = [
+            round(min(max(new_x, 0), 1 - new_width), 4),
+            round(min(max(new_y, 0), 1 - new_height), 4),
+            round(new_width, 4),
+            round(new_height, 4)]
+
+    def _update_frame_codec(self, *_):
+        """
+        Tell the other side how to encode the frames.
+        """
+        if self._app.screen_adaptive_quality:
+            mode = "adaptive"
+        else:
+            mode = "fixed"
+        logging.info(f"CONTROLLER:Frame codec: "
+                     f"{self._app.screen_image_format}, "
+                     f"{self._app.screen_image_quality}, {mode}")
+        if self.session_settings.running:
+            self.session_settings.settings_updates.put(Message(
+                MESSAGE_TYPES["controller"],
+                f"frame codec:{self._app.screen_image_format}, "
+                f"{int(self._app.screen_image_quality)}, {mode}"))
+
+    def _update_color_mode(self, *_):
+        """
+        Tell the other side which color mode to encode the frames in.
+        """
+        logging.info(f"CONTROLLER:Color mode: "
+                     f"{self._app.screen_color_mode}")
+        if self.session_settings.running:
+            self.session_settings.settings_updates.put(Message(
+                MESSAGE_TYPES["controller"],
+                f"color mode:{self._app.screen_color_mode}"))
+
+    def _update_frame_rate(self, *_):
+        """
+        Tell the other side how many frames per second to stream.
+        """
+        target_fps = int(self._app.screen_target_fps)
+        max_fps = int(self._app.screen_max_fps)
+        logging.info(f"CONTROLLER:Frame rate: {target_fps} fps, "
+                     f"at most {max_fps} fps")
+        if self.session_settings.running:
+            self.session_settings.settings_updates.put(Message(
+                MESSAGE_TYPES["controller"],
+                f"frame rate:{target_fps}, {max_fps}"))
+
+    def _update_keyframe_interval(self, *_):
+        """
+        Tell the other side the most frames between keyframes.
+        """
+        keyframe_interval = int(self._app.screen_keyframe_interval)
+        logging.info(f"CONTROLLER:Keyframe interval: {keyframe_interval}")
+        if self.session_settings.running:
+            self.session_settings.settings_updates.put(Message(
+                MESSAGE_TYPES["controller"],
+                f"keyframe interval:{keyframe_interval}"))
+
+    def _update_progressive(self, *_):
+        """
+        Tell the other side whether to send large changes as a draft
+        first.
+        """
+        if self._app.screen_progressive:
+            progressive = "on"
+        else:
+            progressive = "off"
+        logging.info(f"CONTROLLER:Progressive refinement: {progressive}")
+        if self.session_settings.running:
+            self.session_settings.settings_updates.put(Message(
+                MESSAGE_TYPES["controller"],
+                f"progressive:{progressive}"))
+
+    def _update_frame_timing(self, *_):
+        """
+        Ask the other side for the timestamps of the frames only while
+        the latency is shown or logged, they cost the mediator a copy of
+        every frame.
+        """
+        if self._app.show_latency_overlay or self._app.latency_log_path:
+            frame_timing = "on"
+        else:
+            frame_timing = "off"
+        logging.info(f"CONTROLLER:Frame timing: {frame_timing}")
+        if self.session_settings.running:
+            self.session_settings.settings_updates.put(Message(
+                MESSAGE_TYPES["controller"],
+                f"frame timing:{frame_timing}"))
+
+    @staticmethod
+    def _format_latency_summary(summary):
+        """
+        :param summary: A summary of a LatencyReport.
+        :return: The summary as lines of text, a line for every stage.
+        """
+        clock_offset = summary["clock offset ms"]
+        if clock_offset is None:
+            clock_offset = "?"
+        lines = [f"{summary['fps']} fps  {summary['kbps']} kbps  "
+                 f"clock offset {clock_offset} ms"]
+        for stage, latencies in summary["stages"].items():
+            values = "  ".join(
+                f"{name[:-3]} {'-' if latency is None else latency}"
+                for name, latency in latencies.items())
+            lines.append(f"{stage:<10}  {values} ms")
+        return "\n".join(lines)
+
+    def _report_latency(self, _):
+        """
+        Show the latency of the frames on the overlay and append it to
+        the latency log, if they are on.
+        """
+        show_overlay = self._app.show_latency_overlay
+        latency_log_path = self._app.latency_log_path
+        if not show_overlay and not latency_log_path:
+            return
+        summary = self.screen.latency_report.summary()
+        if show_overlay:
+            self.latency_label.text = self._format_latency_summary(summary)
+        if latency_log_path:
+            try:
+                with open(latency_log_path, "a") as latency_log:
+                    latency_log.write(json.dumps(dict(
+                        summary,
+                        time=round(time.time(), 3))) + "\n")
+            except OSError:
+                logging.error("CONTROLLER:Could not write the latency "
+                              "log, stopped logging", exc_info=True)
+                self._app.latency_log_path = ""
+
     def on_touch_down(self, touch):
         """
         On touch down, restore focus to keyboard
         :param touch: The touch event object
         """
+        if touch.is_mouse_scrolling:
+            # Kivy calls scrolling the wheel away from the user
+            # scrolldown
+            if touch.button == "scrolldown":
+                self._zoom(touch.pos, ZOOM_STEP)
+            elif touch.button == "scrollup":
+                self._zoom(touch.pos, 1 / ZOOM_STEP)
+            return True
         self.keyboard_tracker.show_keyboard()
         return super().on_touch_down(touch)
 
@@ -68,6 +278,8 @@ class ControllerScreen(Screen):
         """
         connection = self._app.connection_manager.client.get_connection(
             "mouse tracker")
+        # Moves that were not sent yet are replaced by newer ones
+        connection.socket.set_replaceable(is_mouse_move)
         self.mouse.connection = connection
         self.mouse.is_tracking = True
 
@@ -88,6 +300,14 @@ class ControllerScreen(Screen):
         self.session_settings.start(
             self._app.connection_manager.client.get_connection("settings"))
         self._update_screen_size_variable()
+        self._update_frame_codec()
+        self._update_color_mode()
+        self._update_frame_rate()
+        self._update_keyframe_interval()
+        self._update_progressive()
+        self._update_frame_timing()
+        self._update_view_size()
+        self._update_viewport()
 
     def _handle_settings_connection_status(self, connection_status):
         logging.debug(
@@ -105,6 +325,27 @@ class ControllerScreen(Screen):
         self.screen.connection = connection
         self.screen.start()
 
+    @mainthread
+    def _start_cursor(self):
+        """
+        Start drawing the cursor of the other screen.
+        """
+        self.screen.cursor_connection = (
+            self._app.connection_manager.client.get_connection("cursor"))
+        self.screen.start_cursor()
+
+    def _handle_cursor_connection_status(self, connection_status):
+        """
+        Handle the connection status of the cursor connection.
+        If it is fine than start drawing the cursor.
+        :param connection_status: The connection status as a string.
+        """
+        logging.debug(
+            f"MAIN:Cursor connection status: {connection_status}")
+        # TODO: Handle errors
+        if connection_status == "ready":
+            self._start_cursor()
+
     def _handle_screen_connection_status(self, connection_status):
         """
         Handle the connection status of the screen connection.
@@ -124,7 +365,24 @@ class ControllerScreen(Screen):
         # TODO: what if texture changes? screen size does not update!
         #  for example, if the size of the raw image of the screen changes
         self.screen.bind(size=self._update_screen_size_variable)
+        self.screen.bind(size=self._update_view_size_trigger)
         self._app.bind(screen_size=self._update_screen_size)
+        self._app.bind(screen_image_format=self._update_frame_codec,
+                       screen_image_quality=self._update_frame_codec,
+                       screen_adaptive_quality=self._update_frame_codec)
+        self._app.bind(screen_color_mode=self._update_color_mode)
+        self._app.bind(screen_target_fps=self._update_frame_rate,
+                       screen_max_fps=self._update_frame_rate)
+        self._app.bind(
+            screen_keyframe_interval=self._update_keyframe_interval)
+        self._app.bind(screen_progressive=self._update_progressive)
+        self._app.bind(show_latency_overlay=self._update_frame_timing,
+                       latency_log_path=self._update_frame_timing)
+        self._app.viewport = FULL_VIEWPORT
+        self._app.bind(viewport=self._update_viewport)
+        self._report_latency_event = Clock.schedule_interval(
+            self._report_latency,
+            LATENCY_REPORT_INTERVAL)
 
         logging.info("MAIN:Creating mouse tracker connection")
         self._app.connection_manager.add_connection(
@@ -139,10 +397,21 @@ class ControllerScreen(Screen):
         self._app.connection_manager.add_connection(
             self._app.username,
             "screen recorder",
-            (False, True),
+            (True, True),
             "frame - receiver",
             block=False,
             callback=self._handle_screen_connection_status)
+        # The cursor is relayed one way with a low delay, like the
+        # mouse, only from the other side.
+        logging.info("MAIN:Creating cursor connection")
+        self._app.connection_manager.add_connection(
+            self._app.username,
+            "cursor",
+            (True, True),
+            "mouse - receiver",
+            block=False,
+            callback=self._handle_cursor_connection_status,
+            only_recv=True)
         self._app.connection_manager.add_connection(
             self._app.username,
             "keyboard tracker",
@@ -164,10 +433,15 @@ class ControllerScreen(Screen):
         """
         # TODO: will crash if not finished before connection closes
         self.mouse.is_tracking = False
+        if self._report_latency_event is not None:
+            self._report_latency_event.cancel()
+            self._report_latency_event = None
         self.screen.stop()
+        self.screen.stop_cursor()
         self.keyboard_tracker.is_tracking = False
         self.session_settings.close()
         for connection_name in ("screen recorder",
+                                "cursor",
                                 "mouse tracker",
                                 "keyboard tracker",
                                 "settings"):
@@ -3,58 +3,243 @@ An image that constantly changes trough a socket
 """
 __author__ = "Ron Remets"
 
-import io
 import logging
+import time
 
+from kivy.app import App
 from kivy.clock import Clock
-from kivy.core.image import Image as CoreImage
-from kivy.properties import ObjectProperty, StringProperty, BooleanProperty
+from kivy.graphics import Color, Rectangle
+from kivy.graphics.texture import Texture
+from kivy.properties import ObjectProperty, BooleanProperty
 from kivy.uix.image import Image
 
-from communication.message import Message, MESSAGE_TYPES
+from components.frame_receiver import FrameReceiver
+from frames.cursor_update import CursorUpdate
 
-DEFAULT_IMAGE_FORMAT = "png"
+# The color format of the texture, matches the tile decoder
+TEXTURE_COLOR_FORMAT = "rgba"
+# Draw the cursor with its own colors
+CURSOR_COLOR = (1, 1, 1, 1)
 
 
 class StreamedImage(Image):
     """
-    An image that constantly changes trough a socket
+    An image that constantly changes trough a socket, with the cursor of
+    the other screen drawn over it from another socket
     """
     connection = ObjectProperty()
-    image_format = StringProperty(DEFAULT_IMAGE_FORMAT)
-    _update_frame_event = ObjectProperty(None)
+    cursor_connection = ObjectProperty(None, allownone=True)
     _running = BooleanProperty(False)
+    _cursor_running = BooleanProperty(False)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._app = App.get_running_app()
+        # The shapes of the cursor like {shape id: (texture, hotspot x,
+        # hotspot y)}
+        self._cursor_shapes = {}
+        # The last CursorUpdate or None if no cursor was received yet
+        self._cursor = None
+        with self.canvas.after:
+            Color(*CURSOR_COLOR)
+            self._cursor_rectangle = Rectangle(size=(0, 0))
+        self.bind(pos=self._draw_cursor,
+                  size=self._draw_cursor,
+                  texture=self._draw_cursor)
+        # Receives and decodes the frames in its own thread, this only
+        # draws them on the texture.
+        self._frame_receiver = FrameReceiver()
+        # Nothing is drawn until something arrives. The receiving
+        # threads call the triggers, which are thread safe, and calling
+        # them more than once before the next frame draws once.
+        self._update_frame_trigger = Clock.create_trigger(
+            self._update_frame)
+        self._update_cursor_trigger = Clock.create_trigger(
+            self._update_cursor)
+
+    @property
+    def latency_report(self):
+        """
+        :return: The LatencyReport object of the frames that were shown.
+        """
+        return self._frame_receiver.latency_report
+
+    def _create_frame_texture(self, size):
+        """
+        Create the texture the tiles are drawn on. It is kept until the
+        size of the frame changes, every update only blits the regions
+        that changed.
+        The texture is flipped so its rows go from top to bottom like
+        the rows of the tiles.
+        :param size: The size of the frame like (width, height)
+        :return: The texture.
+        """
+        logging.debug(f"FRAME:Creating texture of size {size}")
+        texture = Texture.create(size=size, colorfmt=TEXTURE_COLOR_FORMAT)
+        texture.flip_vertical()
+        return texture
+
+    @staticmethod
+    def _blit(texture, pixels, x, y):
+        """
+        Draw pixels on a sub-rectangle of a texture.
+        :param texture: The texture.
+        :param pixels: A contiguous array like (height, width, channels)
+        :param x: The left of the pixels in the texture.
+        :param y: The top of the pixels in the texture.
+        """
+        height, width = pixels.shape[:2]
+        texture.blit_buffer(pixels,
+                            size=(width, height),
+                            colorfmt=TEXTURE_COLOR_FORMAT,
+                            bufferfmt="ubyte",
+                            pos=(x, y))
+
+    def apply_region_update(self, region_update):
+        """
+        Draw the regions of a frame on the texture, each with its own
+        blit, all before the next redraw so the frame appears at once.
+        A frame of another size is drawn on a new texture that is only
+        shown once it has all the regions. Drafts and the refined tiles
+        that follow them are drawn in place like any other tile.
+        :param region_update: The RegionUpdate object.
+        """
+        texture = self.texture
+        if texture is None or tuple(texture.size) != region_update.size:
+            texture = self._create_frame_texture(region_update.size)
+        for x, y, pixels in region_update.regions:
+            self._blit(texture, pixels, x, y)
+        if texture is self.texture:
+            self.canvas.ask_update()
+        else:
+            self.texture = texture
 
     def _update_frame(self, _):
         """
-        Update the image to the new frame
+        Draw everything the frame receiver decoded since the last
+        redraw, as one update.
+        """
+        if not self._running:
+            return
+        if not self._frame_receiver.running:
+            self.stop()
+            return
+        region_update = self._frame_receiver.take_region_update()
+        if region_update is None:
+            return
+        self.apply_region_update(region_update)
+        self._frame_receiver.latency_report.add_presented(
+            region_update.frame_timings,
+            time.time())
+        logging.debug("FRAME:SCREEN UPDATED")
+
+    def _add_cursor_shape(self, shape):
         """
+        Keep a shape of the cursor as a texture.
+        :param shape: The CursorShape object.
+        """
+        texture = Texture.create(size=shape.image.size,
+                                 colorfmt=TEXTURE_COLOR_FORMAT)
+        texture.blit_buffer(shape.image.tobytes(),
+                            colorfmt=TEXTURE_COLOR_FORMAT,
+                            bufferfmt="ubyte")
+        # The rows of the image go from top to bottom
+        texture.flip_vertical()
+        self._cursor_shapes[shape.shape_id] = (texture,
+                                               shape.hotspot_x,
+                                               shape.hotspot_y)
+
+    def _hide_cursor(self):
+        self._cursor_rectangle.size = (0, 0)
+
+    def _draw_cursor(self, *_):
+        """
+        Draw the cursor over the frame, where it is on the other screen
+        and scaled like the frame is.
+        """
+        cursor = self._cursor
+        if (cursor is None
+                or not cursor.visible
+                or cursor.shape_id not in self._cursor_shapes
+                or self.texture is None):
+            self._hide_cursor()
+            return
+        viewport_x, viewport_y, viewport_width, viewport_height = (
+            self._app.viewport)
+        # The position in fractions of the shown region
+        x = (cursor.x - viewport_x) / viewport_width
+        y = (cursor.y - viewport_y) / viewport_height
+        if not (0 <= x <= 1 and 0 <= y <= 1):
+            self._hide_cursor()
+            return
+        width, height = self.norm_image_size
+        other_width = float(self._app.other_screen_width)
+        if other_width:
+            scale = width / (other_width * viewport_width)
+        else:
+            scale = 1
+        texture, hotspot_x, hotspot_y = self._cursor_shapes[
+            cursor.shape_id]
+        left = self.center_x - width / 2 + x * width
+        top = self.center_y + height / 2 - y * height
+        self._cursor_rectangle.texture = texture
+        self._cursor_rectangle.size = (texture.width * scale,
+                                       texture.height * scale)
+        self._cursor_rectangle.pos = (
+            left - hotspot_x * scale,
+            top - (texture.height - hotspot_y) * scale)
+
+    def _update_cursor(self, _):
+        """
+        Move the cursor to where the newest cursor update puts it. The
+        updates before it only matter for the shapes they have.
+        """
+        if not self._cursor_running:
+            return
         try:
-            # Try to receive a frame
-            frame_message = self.connection.socket.recv(block=False)
-            # If you did not receive a frame do not update the screen
-            if frame_message is None:
-                return
-            logging.debug(
-                f"FRAME:Received frame with "
-                f"length: {len(frame_message.content)}")
-            self.connection.socket.send(Message(MESSAGE_TYPES["controller"],
-                                                "Message received"))
-
-            frame_data = io.BytesIO(frame_message.content)
-            frame_data.seek(0)
-
-            logging.debug("FRAME:Creating core image")
-            self.texture = CoreImage(frame_data,
-                                     ext=self.image_format).texture
-            logging.debug("FRAME:Reloading screen")
-            self.reload()
-            logging.debug("FRAME:SCREEN UPDATED")
+            cursor = None
+            message = self.cursor_connection.socket.recv(block=False)
+            while message is not None:
+                cursor = CursorUpdate.unpack(message.content)
+                if cursor.shape is not None:
+                    self._add_cursor_shape(cursor.shape)
+                message = self.cursor_connection.socket.recv(block=False)
+            if cursor is not None:
+                self._cursor = cursor
+                self._draw_cursor()
         except Exception as e:  # TODO: dont be broad
             print(e)
-            self.stop()
-            logging.error("FRAME:An error occurred", exc_info=True)
+            self.stop_cursor()
+            logging.error("FRAME:An error occurred in the cursor",
+                          exc_info=True)
+
+    def start_cursor(self):
+        """
+        Start drawing the cursor from cursor_connection. The other side
+        sends every shape again, so start without shapes.
+        """
+        if self._cursor_running:
+            return
+        self._cursor_shapes.clear()
+        self._cursor = None
+        self._app.bind(viewport=self._draw_cursor)
+        self._cursor_running = True
+        self.cursor_connection.socket.set_recv_callback(
+            self._update_cursor_trigger)
+        # Updates could arrive before the callback was set
+        self._update_cursor_trigger()
+
+    def stop_cursor(self):
+        """
+        Stop drawing the cursor.
+        """
+        if not self._cursor_running:
             return
+        self._cursor_running = False
+        self.cursor_connection.socket.set_recv_callback(None)
+        self._update_cursor_trigger.cancel()
+        self._app.unbind(viewport=self._draw_cursor)
+        self._hide_cursor()
 
     def start(self):
         """
@@ -66,11 +251,13 @@ class StreamedImage(Image):
         # TODO: StreamedImage should not know about this variable
         if self._running:
             return
-        logging.debug("FRAME:Starting screen update event")
-        self._update_frame_event = Clock.schedule_interval(
-            self._update_frame,
-            0)
+        logging.debug("FRAME:Starting frame receiver")
+        # The first update has the whole frame, so start from a new
+        # texture.
+        self.texture = None
         self._running = True
+        self._frame_receiver.start(self.connection,
+                                   self._update_frame_trigger)
 
     def stop(self):
         """
@@ -78,5 +265,6 @@ class StreamedImage(Image):
         """
         if not self._running:
             return
-        self._update_frame_event.cancel()
         self._running = False
+        self._update_frame_trigger.cancel()
+        self._frame_receiver.close()
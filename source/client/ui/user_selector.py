@@ -17,6 +17,7 @@ from communication.message import Message, MESSAGE_TYPES
 from communication.advanced_socket import ConnectionClosed
 
 UPDATE_USERS_REFRESH_RATE = 1.5
+USERNAMES_PAGE_SIZE = 50
 
 
 class UserSelector(Button):
@@ -27,16 +28,29 @@ class UserSelector(Button):
     users_dropdown = ObjectProperty(None)
     usernames = ListProperty()
     selected_username = StringProperty()
+    search_prefix = StringProperty("")
     _connection = ObjectProperty(None)
     _update_event = ObjectProperty(None)
     _updating_users = BooleanProperty(False)
     _new_user_selected = BooleanProperty(False)
     _selecting_user = BooleanProperty(False)
+    # The cursor of the page that was last requested
+    _page_cursor = StringProperty("")
+    # Whether the page being received should be dropped and the pages
+    # should start over (Happens when the search prefix changes)
+    _restart_pages = BooleanProperty(False)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._app = App.get_running_app()
         self.users_dropdown = DropDown(on_select=self._select_user)
+        self.bind(search_prefix=self._restart_users_update)
+        # Checks for responses on the next frame instead of waiting for
+        # the refresh rate. The socket calls it when a response arrives,
+        # so nothing checks for responses while none arrive. Calling it
+        # more than once in a frame only checks once.
+        self._check_page_trigger = Clock.create_trigger(
+            self._check_responses)
         print("constructor called")
 
     def _select_user(self, _, username):
@@ -54,14 +68,35 @@ class UserSelector(Button):
     @staticmethod
     def _handle_usernames_response(response):
         """
-        parse the usernames from the server response
+        parse a page of usernames from the server response
         :param response: The response the server sent
-        :return: A list of the usernames the server sent
+        :return: A tuple like (usernames, next cursor). The next cursor
+                 is "" if this is the last page.
         """
-        usernames = response.get_content_as_text().split(", ")
+        next_cursor, *usernames = (
+            response.get_content_as_text().split("\n"))
         Logger.debug(
             f"User selector:Received usernames: {usernames}")
-        return usernames
+        return usernames, next_cursor
+
+    def _merge_usernames_page(self, usernames, next_cursor):
+        """
+        Replace the usernames the page covers with the usernames in it.
+        The usernames of the pages that were not received yet are kept
+        so the list does not shrink while it updates.
+        :param usernames: The usernames in the page
+        :param next_cursor: The cursor of the next page
+        """
+        before_page = [username
+                       for username in self.usernames
+                       if username <= self._page_cursor]
+        if next_cursor:
+            after_page = [username
+                          for username in self.usernames
+                          if username > next_cursor]
+        else:
+            after_page = []
+        self.usernames = before_page + usernames + after_page
 
     def _update_dropdown(self, usernames):
         """
@@ -87,10 +122,14 @@ class UserSelector(Button):
         self._app.partner = self.selected_username
 
     def _send_usernames_request(self):
-        Logger.debug("User selector:Requesting usernames")
+        Logger.debug(
+            f"User selector:Requesting usernames after {self._page_cursor}")
         self._connection.socket.send(Message(
             MESSAGE_TYPES["server interaction"],
-            "get all connected usernames"))
+            (f"get connected usernames page\n"
+             f"{self.search_prefix}\n"
+             f"{self._page_cursor}\n"
+             f"{USERNAMES_PAGE_SIZE}")))
 
     def _send_select_request(self):
         Logger.debug(
@@ -103,11 +142,23 @@ class UserSelector(Button):
         try:
             if self._updating_users:
                 usernames_response = self._check_for_usernames_response()
-                if usernames_response is not None:
-                    usernames = UserSelector._handle_usernames_response(
-                        usernames_response)
-                    self._update_dropdown(usernames)
-                    self._updating_users = False
+                if usernames_response is not None and self._restart_pages:
+                    self._restart_pages = False
+                    self._page_cursor = ""
+                    self._send_usernames_request()
+                elif usernames_response is not None:
+                    usernames, next_cursor = (
+                        UserSelector._handle_usernames_response(
+                            usernames_response))
+                    self._merge_usernames_page(usernames, next_cursor)
+                    self._update_dropdown(self.usernames)
+                    self._page_cursor = next_cursor
+                    if next_cursor:
+                        # Request the next page without waiting for
+                        # the next refresh.
+                        self._send_usernames_request()
+                    else:
+                        self._updating_users = False
             elif self._selecting_user:
                 select_response = self._check_for_select_response()
                 if select_response is not None:
@@ -130,6 +181,27 @@ class UserSelector(Button):
                          exc_info=True)
             self.close()
 
+    def _check_responses(self, dt):
+        """
+        Handle the response that arrived, without sending a new request
+        before the refresh rate.
+        :param dt: The time since the check was triggered.
+        """
+        if self._updating_users or self._selecting_user:
+            self._update_users(dt)
+
+    def _restart_users_update(self, *_):
+        """
+        Start updating the usernames from the first page again. Used
+        when the search prefix changes.
+        """
+        self.usernames = []
+        self._update_dropdown(self.usernames)
+        if self._updating_users:
+            self._restart_pages = True
+        else:
+            self._page_cursor = ""
+
     def on_release(self):
         """
         Open the dropdown
@@ -150,8 +222,11 @@ class UserSelector(Button):
         Logger.info("User selector:Starting")
         self.is_active = True
         self._connection = connection
+        connection.socket.set_recv_callback(self._check_page_trigger)
         self._update_event = Clock.schedule_interval(
             self._update_users, UPDATE_USERS_REFRESH_RATE)
+        # Request the first page now instead of after the refresh rate
+        self._update_users(0)
 
     def close(self):
         """
@@ -162,3 +237,6 @@ class UserSelector(Button):
         self.is_active = False
         if self._update_event is not None:
             self._update_event.cancel()
+        if self._connection is not None:
+            self._connection.socket.set_recv_callback(None)
+        self._check_page_trigger.cancel()
@@ -5,6 +5,11 @@ __author__ = "Ron Remets"
 
 import logging
 import queue
+from socket import (SHUT_RD,
+                    IPPROTO_IP,
+                    IPPROTO_TCP,
+                    IP_TOS,
+                    TCP_NODELAY)
 from socket import timeout as socket_timeout
 from socket import socket as socket_object
 import threading
@@ -26,6 +31,11 @@ DEFAULT_REFRESH_RATE = 3
 DEFAULT_LENGTH_BUFFER_SIZE = 2**4
 DEFAULT_TYPE_BUFFER_SIZE = 2**2
 DEFAULT_CONTENT_BUFFER_SIZE = 2**16
+# The IP type of service that asks routers to minimize delay.
+IPTOS_LOWDELAY = 0x10
+# The time in seconds the recv thread waits before trying again to add
+# a message to a full buffer.
+FULL_BUFFER_RETRY_DELAY = 0.001
 hostname = 'main'
 # context = ssl.create_default_context()
 # context.check_hostname = False
@@ -57,6 +67,8 @@ class AdvancedSocket(object):
         self._recv_error_state_lock = threading.Lock()
         self._send_error_state = None
         self._recv_error_state = None
+        self._recv_callback_lock = threading.Lock()
+        self._recv_callback = None
 
     @property
     def running(self):
@@ -265,9 +277,15 @@ class AdvancedSocket(object):
                     self._messages_received.add(message)
                 except queue.Full:
                     # Can not add a message right now, queue is full.
-                    pass
+                    # Stop reading the socket for a while so the other
+                    # side has to wait until we are ready.
+                    time.sleep(FULL_BUFFER_RETRY_DELAY)
                 else:
                     message = None
+                    with self._recv_callback_lock:
+                        recv_callback = self._recv_callback
+                    if recv_callback is not None:
+                        recv_callback()
         except ConnectionClosed:
             logging.debug("advanced_socket:Socket recv thread closed normally")
         except Exception as e:
@@ -327,6 +345,18 @@ class AdvancedSocket(object):
                     if self._send_error_state is not None:
                         raise self._send_error_state
 
+    def set_recv_callback(self, callback):
+        """
+        Set a function to call every time a message is received, so the
+        messages can be received when they arrive instead of checking
+        for them all the time. It is called from the recv thread, after
+        the message can be received with recv.
+        :param callback: A function that takes no arguments or None to
+                         stop calling it.
+        """
+        with self._recv_callback_lock:
+            self._recv_callback = callback
+
     def recv(self, block=True):
         """
         Receive a message from the other side.
@@ -354,20 +384,69 @@ class AdvancedSocket(object):
                     raise self._recv_error_state
         return message_received
 
-    def switch_state(self, input_is_buffered, output_is_buffered):
+    def _wake_recv_thread(self):
+        """
+        Make a recv that is waiting for data return now instead of after
+        the refresh rate, so the recv thread sees it has to close. The
+        thread then closes normally since it checks that it has to
+        close before handling the result of the recv.
+        """
+        socket = self._socket
+        if socket is None:
+            return
+        try:
+            socket.shutdown(SHUT_RD)
+        except OSError:
+            pass  # Not connected or already closed
+
+    def set_low_delay(self):
+        """
+        Send small messages right away instead of waiting to join them
+        and mark the packets as needing low delay. Use this on sockets
+        of small messages that have to arrive fast, like input.
+        """
+        try:
+            self._socket.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+            self._socket.setsockopt(IPPROTO_IP, IP_TOS, IPTOS_LOWDELAY)
+        except OSError:
+            logging.warning("advanced_socket:Could not set low delay",
+                            exc_info=True)
+
+    def set_replaceable(self, is_replaceable):
+        """
+        Let newer messages replace older ones that were not sent or
+        received yet, when both are replaceable (See
+        MessageBuffer.set_replaceable).
+        :param is_replaceable: A function that takes a message and
+                               returns whether it is replaceable, or
+                               None to keep every message.
+        """
+        self._messages_received.set_replaceable(is_replaceable)
+        self._messages_to_send.set_replaceable(is_replaceable)
+
+    def switch_state(self,
+                     input_is_buffered,
+                     output_is_buffered,
+                     max_received_messages=0):
         """
         Change the state of the socket buffers
         :param input_is_buffered: bool, the input state
         :param output_is_buffered: bool, the output state
+        :param max_received_messages: When the input is buffered, the
+                                      most messages to store before
+                                      the socket stops receiving. If set
+                                      to 0 then store forever.
         """
-        self._messages_received.switch_state(input_is_buffered)
+        self._messages_received.switch_state(input_is_buffered,
+                                              max_received_messages)
         self._messages_to_send.switch_state(output_is_buffered)
 
     def start(self,
               socket,
               input_is_buffered,
               output_is_buffered,
-              buffer_size=DEFAULT_CONTENT_BUFFER_SIZE):
+              buffer_size=DEFAULT_CONTENT_BUFFER_SIZE,
+              max_received_messages=0):
         """
         Start sending and receiving messages.
         :param socket: The socket to use to send.
@@ -376,6 +455,7 @@ class AdvancedSocket(object):
         :param output_is_buffered: Whether the messages sent should be
                                   buffered.
         :param buffer_size: The size of the recv buffer.
+        :param max_received_messages: See switch_state.
         """
         self._socket = socket
         self._send_thread = threading.Thread(
@@ -385,7 +465,9 @@ class AdvancedSocket(object):
             name="AdvancedSocket recv thread",
             target=self._receive_messages,
             args=(buffer_size,))
-        self.switch_state(input_is_buffered, output_is_buffered)
+        self.switch_state(input_is_buffered,
+                          output_is_buffered,
+                          max_received_messages)
         self._is_sending = True
         self._is_receiving = True
         self._send_thread.start()
@@ -404,6 +486,7 @@ class AdvancedSocket(object):
         logging.debug("advanced_socket:Shutting down sockets threads")
         self.close_send_thread()
         self.close_recv_thread()
+        self._wake_recv_thread()
 
         if not block:
             return
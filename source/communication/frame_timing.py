@@ -0,0 +1,70 @@
+"""
+Timestamps that travel at the end of the frames, so every side the frame
+passes through can say when it saw it
+"""
+__author__ = "Ron Remets"
+
+TIMING_ENCODING = "ascii"
+# Starts the timestamps at the end of the content of a frame:
+#     {content}\ntiming {name}={value},{name}={value}...
+TIMING_MARKER = b"\ntiming "
+TIMING_SEPARATOR = b","
+# The most bytes the timestamps of a frame take, the marker is only
+# looked for in them.
+MAX_TIMING_LENGTH = 512
+# The digits after the point of the timestamps, microseconds
+TIMESTAMP_DIGITS = 6
+
+
+def _find_timing(content):
+    """
+    :param content: The content of a frame as bytes.
+    :return: The index of the marker in the content or -1 if the frame
+             has no timestamps.
+    """
+    return content.rfind(TIMING_MARKER,
+                         max(len(content) - MAX_TIMING_LENGTH, 0))
+
+
+def has_timing(content):
+    """
+    :param content: The content of a frame as bytes.
+    :return: True if the frame has timestamps, False otherwise.
+    """
+    return _find_timing(content) != -1
+
+
+def add_timestamps(content, **timestamps):
+    """
+    Add timestamps to the end of a frame, after the ones it has.
+    :param content: The content of the frame as bytes.
+    :param timestamps: The timestamps like name=seconds since the epoch.
+                       Names must not have "," or "=".
+    :return: The content with the timestamps as bytes.
+    """
+    pairs = TIMING_SEPARATOR.join(
+        f"{name}={round(value, TIMESTAMP_DIGITS)}".encode(TIMING_ENCODING)
+        for name, value in timestamps.items())
+    if has_timing(content):
+        return bytes(content) + TIMING_SEPARATOR + pairs
+    return bytes(content) + TIMING_MARKER + pairs
+
+
+def split_timestamps(content):
+    """
+    Take the timestamps off the end of a frame.
+    :param content: The content of the frame as bytes.
+    :return: The content without the timestamps and the timestamps like
+             (content, {name: value}). The timestamps are empty if the
+             frame has none.
+    :raise ValueError: If the timestamps are not valid.
+    """
+    timing_start = _find_timing(content)
+    if timing_start == -1:
+        return content, {}
+    timestamps = {}
+    pairs = content[timing_start + len(TIMING_MARKER):]
+    for pair in bytes(pairs).split(TIMING_SEPARATOR):
+        name, value = pair.decode(TIMING_ENCODING).split("=")
+        timestamps[name] = float(value)
+    return content[:timing_start], timestamps
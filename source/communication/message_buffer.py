@@ -25,9 +25,24 @@ class MessageBuffer(object):
         """
         self._messages = None
         self._buffered = None
+        self._is_replaceable = None
         self._messages_lock = threading.Lock()
         self.switch_state(buffered, maxsize)
 
+    def set_replaceable(self, is_replaceable):
+        """
+        When buffered, let a message replace the newest message in the
+        buffer instead of waiting after it, when both are replaceable.
+        Use this for messages where only the newest one matters, like
+        moves of the mouse, so a burst of them never builds a backlog.
+        Messages that are not replaceable are never dropped or reordered.
+        :param is_replaceable: A function that takes a message and
+                               returns whether it is replaceable, or
+                               None to keep every message.
+        """
+        with self._messages_lock:
+            self._is_replaceable = is_replaceable
+
     def switch_state(self, buffered, maxsize=0):
         """
         Switch the state of the buffer. All current messages in the
@@ -59,7 +74,16 @@ class MessageBuffer(object):
         """
         with self._messages_lock:
             if self._buffered:
-                self._messages.put(message, block=False)
+                # Only this lock guards the queue, so its newest message
+                # can be replaced in place.
+                messages = self._messages.queue
+                if (self._is_replaceable is not None
+                        and messages
+                        and self._is_replaceable(messages[-1])
+                        and self._is_replaceable(message)):
+                    messages[-1] = message
+                else:
+                    self._messages.put(message, block=False)
             else:
                 self._messages = message
 
@@ -0,0 +1,20 @@
+"""
+The events of the mouse that the controller sends to the controlled
+"""
+__author__ = "Ron Remets"
+
+from communication.message import ENCODING
+
+# The events are text like "{action} {button} {x},{y}"
+MOVE_ACTION = "move"
+_MOVE_PREFIX = f"{MOVE_ACTION} ".encode(ENCODING)
+
+
+def is_mouse_move(message):
+    """
+    Moves only matter until the next event, so a newer move can replace
+    them.
+    :param message: A message of a mouse event.
+    :return: True if the message moves the mouse, False otherwise.
+    """
+    return bytes(message.content[:len(_MOVE_PREFIX)]) == _MOVE_PREFIX
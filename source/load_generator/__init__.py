@@ -0,0 +1,4 @@
+"""
+A headless tool that loads the mediator with synthetic clients to
+measure how many sessions it can handle.
+"""
@@ -0,0 +1,85 @@
+"""
+Streams of mouse and keyboard events to replay
+"""
+__author__ = "Ron Remets"
+
+import math
+
+# The names of the connections the events are sent through
+MOUSE_CONNECTION = "mouse tracker"
+KEYBOARD_CONNECTION = "keyboard tracker"
+INPUT_CONNECTIONS = {"mouse": MOUSE_CONNECTION,
+                     "keyboard": KEYBOARD_CONNECTION}
+SYNTHETIC_TEXT = "the quick brown fox jumps over the lazy dog"
+SYNTHETIC_MOUSE_RADIUS = 300
+SYNTHETIC_MOUSE_CENTER = (960, 540)
+
+
+class InputEvent(object):
+    """
+    A mouse or keyboard event to replay
+    """
+    def __init__(self, delay, connection_name, content):
+        """
+        :param delay: The time in seconds to wait before sending this
+                      event.
+        :param connection_name: The name of the connection to send the
+                                event through.
+        :param content: The content of the message the client would
+                        send, like "move left 10,20" or "a, press".
+        """
+        self.delay = delay
+        self.connection_name = connection_name
+        self.content = content
+
+
+def load_input_events(file_name):
+    """
+    Load recorded events from a file. Every line is like
+    "<delay> <mouse or keyboard> <content>", for example
+    "0.016 mouse move left 100,200" or "0.1 keyboard a, press".
+    :param file_name: The name of the file to load.
+    :return: A list of InputEvent.
+    :raise ValueError: If a line is not in the right format.
+    """
+    events = []
+    with open(file_name) as events_file:
+        for line_number, line in enumerate(events_file, 1):
+            line = line.rstrip("\n")
+            if not line or line.startswith("#"):
+                continue
+            try:
+                delay, device, content = line.split(" ", 2)
+                events.append(InputEvent(float(delay),
+                                         INPUT_CONNECTIONS[device],
+                                         content))
+            except (ValueError, KeyError):
+                raise ValueError(
+                    f"Bad event in line {line_number} of {file_name}")
+    return events
+
+
+def generate_input_events(events_per_second):
+    """
+    Generate a stream of events like a user that moves the mouse in a
+    circle while typing.
+    :param events_per_second: How many events to send in a second.
+    :return: A list of InputEvent to replay in a loop.
+    """
+    delay = 1 / events_per_second
+    events = []
+    # The circle closes when the keys loop
+    keys = SYNTHETIC_TEXT.replace(" ", "")
+    for index, key in enumerate(keys):
+        angle = 2 * math.pi * index / len(keys)
+        x = int(SYNTHETIC_MOUSE_CENTER[0]
+                + SYNTHETIC_MOUSE_RADIUS * math.cos(angle))
+        y = int(SYNTHETIC_MOUSE_CENTER[1]
+                + SYNTHETIC_MOUSE_RADIUS * math.sin(angle))
+        events.append(InputEvent(delay, MOUSE_CONNECTION,
+                                 f"move left {x},{y}"))
+        events.append(InputEvent(delay, KEYBOARD_CONNECTION,
+                                 f"{key}, press"))
+        events.append(InputEvent(delay, KEYBOARD_CONNECTION,
+                                 f"{key}, release"))
+    return events
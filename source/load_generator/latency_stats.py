@@ -0,0 +1,71 @@
+"""
+Collects latency samples and summarizes them
+"""
+__author__ = "Ron Remets"
+
+import threading
+
+
+class LatencyStats(object):
+    """
+    Collects latency samples and summarizes them
+    THREAD SAFE
+    """
+    def __init__(self):
+        self._samples = []
+        self._samples_lock = threading.Lock()
+
+    def add(self, latency):
+        """
+        Add a latency sample.
+        :param latency: The latency in seconds.
+        """
+        with self._samples_lock:
+            self._samples.append(latency)
+
+    def extend(self, other):
+        """
+        Add all the samples of other stats to these stats.
+        :param other: A LatencyStats object.
+        """
+        samples = other.get_samples()
+        with self._samples_lock:
+            self._samples.extend(samples)
+
+    def get_samples(self):
+        """
+        :return: A copy of the samples as a list.
+        """
+        with self._samples_lock:
+            return list(self._samples)
+
+    @staticmethod
+    def _percentile(sorted_samples, percent):
+        """
+        Get a percentile of the samples using the nearest rank.
+        :param sorted_samples: The samples sorted from small to large.
+        :param percent: The percentile to get (0 - 100)
+        :return: The sample at that percentile.
+        """
+        index = int(round(percent / 100 * (len(sorted_samples) - 1)))
+        return sorted_samples[index]
+
+    def summary(self):
+        """
+        Summarize the samples.
+        :return: A dict with the count of samples and the p50, p90, p99
+                 and max latencies in milliseconds. The latencies are
+                 None if there are no samples.
+        """
+        samples = sorted(self.get_samples())
+        summary = {"count": len(samples)}
+        for name, percent in (("p50", 50),
+                              ("p90", 90),
+                              ("p99", 99),
+                              ("max", 100)):
+            if samples:
+                summary[f"{name}_ms"] = round(
+                    LatencyStats._percentile(samples, percent) * 1000, 3)
+            else:
+                summary[f"{name}_ms"] = None
+        return summary
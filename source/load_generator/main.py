@@ -0,0 +1,226 @@
+"""
+The entry point for the load generator.
+Runs pairs of synthetic clients against a mediator and reports how
+many sessions it sustained, the relay latency and the resources the
+mediator used.
+Run it with the same paths as the client, for example:
+PYTHONPATH=source:source/client python source/load_generator/main.py
+"""
+
+__author__ = "Ron Remets"
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from input_events import generate_input_events, load_input_events
+from latency_stats import LatencyStats
+from process_monitor import ProcessMonitor
+from session_pair import SessionPair, CLOSE_TIMEOUT
+
+logging.basicConfig(level=logging.INFO)
+DEFAULT_SERVER_ADDRESS = "127.0.0.1:2125"
+DEFAULT_PAIRS = 10
+DEFAULT_DURATION = 60
+DEFAULT_RAMP_UP_DELAY = 0.2
+DEFAULT_FRAME_SIZE = 200 * 2**10
+DEFAULT_FRAMES_PER_SECOND = 10
+DEFAULT_EVENTS_PER_SECOND = 30
+DEFAULT_USERNAME_PREFIX = "load_"
+DEFAULT_OUTPUT_FILE_NAME = "load_results.jsonl"
+
+
+def _parse_arguments():
+    """
+    Parse the command line arguments.
+    :return: The arguments as an argparse.Namespace.
+    """
+    parser = argparse.ArgumentParser(
+        description="Load the mediator with pairs of synthetic clients.")
+    parser.add_argument("--address", default=DEFAULT_SERVER_ADDRESS,
+                        help="The ip:port of the mediator")
+    parser.add_argument("--pairs", type=int, default=DEFAULT_PAIRS,
+                        help="The amount of controlled/controller pairs")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION,
+                        help="The time in seconds to stream for")
+    parser.add_argument("--ramp-up-delay", type=float,
+                        default=DEFAULT_RAMP_UP_DELAY,
+                        help="The time in seconds between connecting pairs")
+    parser.add_argument("--frame-size", type=int, default=DEFAULT_FRAME_SIZE,
+                        help="The size of a synthetic frame in bytes")
+    parser.add_argument("--fps", type=float,
+                        default=DEFAULT_FRAMES_PER_SECOND,
+                        help="The frames each pair tries to send a second")
+    parser.add_argument("--events-per-second", type=float,
+                        default=DEFAULT_EVENTS_PER_SECOND,
+                        help="The rate of the synthetic input events")
+    parser.add_argument("--events-file",
+                        help="A file of recorded input events to replay "
+                             "instead of the synthetic events")
+    parser.add_argument("--server-pid", type=int,
+                        help="The pid of the mediator to monitor")
+    parser.add_argument("--username-prefix", default=DEFAULT_USERNAME_PREFIX,
+                        help="The prefix of the usernames of the clients")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_FILE_NAME,
+                        help="The file to append the JSON report to")
+    return parser.parse_args()
+
+
+def _connect_pairs(pairs, server_address, ramp_up_delay):
+    """
+    Connect all the pairs, each in its own thread.
+    :param pairs: The pairs to connect.
+    :param server_address: The address of the mediator.
+    :param ramp_up_delay: The time in seconds between connecting pairs.
+    :return: A list of the pairs that connected.
+    """
+    def connect(pair):
+        try:
+            pair.connect(server_address)
+        except Exception as e:
+            print(e)
+            logging.error(f"LOAD:Pair {pair.controlled_username} "
+                          f"could not connect", exc_info=True)
+            pair.error = e
+
+    threads = []
+    for pair in pairs:
+        thread = threading.Thread(
+            name=f"Pair {pair.controlled_username} connect thread",
+            target=connect,
+            args=(pair,))
+        threads.append(thread)
+        thread.start()
+        time.sleep(ramp_up_delay)
+    for thread in threads:
+        thread.join()
+    return [pair for pair in pairs if pair.connected]
+
+
+def _make_report(arguments, pairs, connected_pairs, sustained, monitor):
+    """
+    Summarize a run.
+    :param arguments: The arguments of the run.
+    :param pairs: All the pairs.
+    :param connected_pairs: The pairs that connected.
+    :param sustained: The amount of sessions that were sustained.
+    :param monitor: The ProcessMonitor of the mediator or None.
+    :return: The report as a dict.
+    """
+    frame_latency = LatencyStats()
+    input_latency = LatencyStats()
+    counters = {}
+    for pair in connected_pairs:
+        frame_latency.extend(pair.frame_latency)
+        input_latency.extend(pair.input_latency)
+        for name, value in pair.counters.items():
+            counters[name] = counters.get(name, 0) + value
+    frames_per_session = None
+    if connected_pairs:
+        frames_per_session = round(
+            counters["frames received"]
+            / len(connected_pairs)
+            / arguments.duration, 2)
+    return {
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "address": arguments.address,
+        "pairs": len(pairs),
+        "duration_s": arguments.duration,
+        "frame_size": arguments.frame_size,
+        "target_fps": arguments.fps,
+        "sessions_connected": len(connected_pairs),
+        "sessions_sustained": sustained,
+        "received_fps_per_session": frames_per_session,
+        "counters": counters,
+        "frame_latency": frame_latency.summary(),
+        "input_latency": input_latency.summary(),
+        "server": monitor.summary() if monitor is not None else None}
+
+
+def main():
+    """
+    The entry point of the load generator.
+    """
+    arguments = _parse_arguments()
+    host, port = arguments.address.rsplit(":", 1)
+    server_address = (host, int(port))
+    if arguments.events_file is not None:
+        input_events = load_input_events(arguments.events_file)
+    else:
+        input_events = generate_input_events(arguments.events_per_second)
+    pairs = [SessionPair(index,
+                         arguments.username_prefix,
+                         arguments.frame_size,
+                         arguments.fps,
+                         input_events)
+             for index in range(arguments.pairs)]
+
+    monitor = None
+    if arguments.server_pid is not None:
+        monitor = ProcessMonitor(arguments.server_pid)
+        monitor.start()
+    try:
+        logging.info(f"LOAD:Connecting {len(pairs)} pairs")
+        connected_pairs = _connect_pairs(pairs,
+                                         server_address,
+                                         arguments.ramp_up_delay)
+        logging.info(f"LOAD:{len(connected_pairs)} pairs connected, "
+                     f"streaming for {arguments.duration} seconds")
+        for pair in connected_pairs:
+            pair.start()
+        time.sleep(arguments.duration)
+        sustained = sum(pair.stop() for pair in connected_pairs)
+    finally:
+        if monitor is not None:
+            monitor.close()
+
+    report = _make_report(arguments,
+                          pairs,
+                          connected_pairs,
+                          sustained,
+                          monitor)
+    print(json.dumps(report, indent=4))
+    with open(arguments.output, "a") as output_file:
+        output_file.write(json.dumps(report) + "\n")
+    logging.info("LOAD:Closing pairs")
+    close_threads = [threading.Thread(
+        name=f"Pair {pair.controlled_username} close thread",
+        target=pair.close)
+        for pair in pairs]
+    for close_thread in close_threads:
+        close_thread.start()
+    _wait_for_threads(CLOSE_TIMEOUT)
+
+
+def _wait_for_threads(timeout):
+    """
+    Wait for the threads of the connections to close. If they do not,
+    exit anyway since they would keep the process alive and the report
+    is already saved.
+    :param timeout: The time in seconds to wait for the threads.
+    """
+    timeout_time = time.perf_counter() + timeout
+    for thread in threading.enumerate():
+        if thread is threading.current_thread() or thread.daemon:
+            continue
+        thread.join(max(0, timeout_time - time.perf_counter()))
+        if thread.is_alive():
+            logging.warning("LOAD:Some connections did not close, "
+                            "exiting anyway")
+            sys.stdout.flush()
+            os._exit(0)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as outer_e:
+        print(outer_e)
+        logging.critical("LOAD:Error while running:", exc_info=True)
+        sys.exit(1)
+    else:
+        sys.exit(0)
@@ -0,0 +1,129 @@
+"""
+Samples the CPU and memory usage of a process
+"""
+__author__ = "Ron Remets"
+
+import logging
+import os
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+DEFAULT_SAMPLE_INTERVAL = 1
+# The amount of clock ticks in a second, used to read /proc
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class ProcessMonitor(object):
+    """
+    Samples the CPU and memory usage of a process in a thread.
+    Uses psutil if it is installed and /proc otherwise (Linux only).
+    """
+    def __init__(self, pid, sample_interval=DEFAULT_SAMPLE_INTERVAL):
+        self._pid = pid
+        self._sample_interval = sample_interval
+        self._thread = None
+        self._running_lock = threading.Lock()
+        self._samples_lock = threading.Lock()
+        self._cpu_samples = []
+        self._memory_samples = []
+        self._set_running(False)
+
+    @property
+    def running(self):
+        """
+        :return: If the monitor is running.
+        """
+        with self._running_lock:
+            return self._running
+
+    def _set_running(self, value):
+        with self._running_lock:
+            self._running = value
+
+    def _read_proc(self):
+        """
+        Read the CPU time and memory of the process from /proc.
+        :return: A tuple like (CPU seconds, resident memory in bytes)
+        """
+        with open(f"/proc/{self._pid}/stat") as stat_file:
+            # The name of the process can have spaces, so split after it
+            fields = stat_file.read().rsplit(")", 1)[1].split()
+        # utime and stime are fields 14 and 15, rss is field 24
+        cpu_time = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+        memory = int(fields[21]) * PAGE_SIZE
+        return cpu_time, memory
+
+    def _run(self):
+        """
+        Sample the process until the monitor stops.
+        """
+        try:
+            if psutil is not None:
+                process = psutil.Process(self._pid)
+                process.cpu_percent()
+            else:
+                process = None
+                last_cpu_time, _ = self._read_proc()
+                last_time = time.perf_counter()
+            while self.running:
+                time.sleep(self._sample_interval)
+                if process is not None:
+                    cpu_percent = process.cpu_percent()
+                    memory = process.memory_info().rss
+                else:
+                    cpu_time, memory = self._read_proc()
+                    now = time.perf_counter()
+                    cpu_percent = ((cpu_time - last_cpu_time)
+                                   / (now - last_time) * 100)
+                    last_cpu_time, last_time = cpu_time, now
+                with self._samples_lock:
+                    self._cpu_samples.append(cpu_percent)
+                    self._memory_samples.append(memory)
+        except Exception as e:
+            print(e)
+            logging.error(f"MONITOR:Can not monitor process {self._pid}",
+                          exc_info=True)
+
+    def start(self):
+        """
+        Start sampling the process.
+        """
+        self._set_running(True)
+        self._thread = threading.Thread(
+            name=f"Process {self._pid} monitor thread",
+            target=self._run)
+        self._thread.start()
+
+    def close(self):
+        """
+        Stop sampling the process.
+        """
+        self._set_running(False)
+        if self._thread is not None:
+            self._thread.join()
+
+    def summary(self):
+        """
+        Summarize the samples.
+        :return: A dict with the average and max CPU percent and the max
+                 resident memory in MB. Values are None if there are no
+                 samples.
+        """
+        with self._samples_lock:
+            cpu_samples = list(self._cpu_samples)
+            memory_samples = list(self._memory_samples)
+        if not cpu_samples:
+            return {"cpu_average_percent": None,
+                    "cpu_max_percent": None,
+                    "memory_max_mb": None}
+        return {
+            "cpu_average_percent": round(
+                sum(cpu_samples) / len(cpu_samples), 1),
+            "cpu_max_percent": round(max(cpu_samples), 1),
+            "memory_max_mb": round(max(memory_samples) / 2**20, 1)}
@@ -0,0 +1,432 @@
+"""
+A pair of synthetic clients where one controls the other
+"""
+__author__ = "Ron Remets"
+
+import collections
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+
+from communication.connection import ConnectionStatus
+from communication.message import Message, MESSAGE_TYPES
+from connection_manager import ConnectionManager
+from input_events import MOUSE_CONNECTION, KEYBOARD_CONNECTION
+from latency_stats import LatencyStats
+
+PASSWORD = "load generator"
+# The time in seconds to wait for the mediator to answer while
+# connecting.
+CONNECT_TIMEOUT = 30
+# The time in seconds to wait for connections to close.
+CLOSE_TIMEOUT = 10
+# The time in seconds to sleep between polls of a socket. Polling
+# without sleeping would take the CPU the mediator needs.
+POLL_INTERVAL = 0.001
+FRAME_CONNECTION = "screen recorder"
+# Every synthetic frame starts with its sequence number
+FRAME_HEADER = struct.Struct("!Q")
+# Every input event ends with its sequence number like
+# "{content} #{sequence number}"
+INPUT_SEQUENCE_SEPARATOR = " #"
+# The connections of the controlled client like
+# (name, buffer state, type, only send, only recv)
+CONTROLLED_CONNECTIONS = (
+    (FRAME_CONNECTION, (True, True), "frame - sender", False, False),
+    (MOUSE_CONNECTION, (True, True), "mouse - receiver", False, True),
+    (KEYBOARD_CONNECTION, (True, True), "keyboard - receiver", False, False))
+CONTROLLER_CONNECTIONS = (
+    (FRAME_CONNECTION, (True, True), "frame - receiver", False, False),
+    (MOUSE_CONNECTION, (True, True), "mouse - sender", True, False),
+    (KEYBOARD_CONNECTION, (True, True), "keyboard - sender", False, False))
+
+
+class SessionPair(object):
+    """
+    A pair of synthetic clients where one controls the other.
+    The controlled client streams frames and the controller client
+    replays mouse and keyboard events, both through the mediator.
+    """
+    def __init__(self,
+                 index,
+                 username_prefix,
+                 frame_size,
+                 frames_per_second,
+                 input_events):
+        """
+        :param index: The index of the pair, used in the usernames.
+        :param username_prefix: The prefix of the usernames.
+        :param frame_size: The size of a synthetic frame in bytes.
+        :param frames_per_second: The rate to send frames in.
+        :param input_events: A list of InputEvent to replay in a loop.
+        """
+        self.controlled_username = f"{username_prefix}{index}_controlled"
+        self.controller_username = f"{username_prefix}{index}_controller"
+        self._frame_content = os.urandom(frame_size)
+        self._frame_interval = 1 / frames_per_second
+        self._input_events = input_events
+        self._controlled = ConnectionManager()
+        self._controller = ConnectionManager()
+        self._threads = []
+        self._running_lock = threading.Lock()
+        self._counters_lock = threading.Lock()
+        self._send_times_lock = threading.Lock()
+        # Frames can be dropped by the mediator, so match them by their
+        # sequence number like {sequence number: send time}
+        self._frame_send_times = {}
+        # The mediator replaces mouse moves that wait with newer ones,
+        # but never reorders events, so match them by their sequence
+        # number like {connection name: {sequence number: send time}},
+        # the oldest first
+        self._input_send_times = {
+            MOUSE_CONNECTION: collections.OrderedDict(),
+            KEYBOARD_CONNECTION: collections.OrderedDict()}
+        self.frame_latency = LatencyStats()
+        self.input_latency = LatencyStats()
+        self.counters = {"frames sent": 0,
+                         "frames received": 0,
+                         "input events sent": 0,
+                         "input events received": 0,
+                         "input events replaced": 0}
+        self.connected = False
+        self.error = None
+        self._set_running(False)
+
+    @property
+    def running(self):
+        """
+        :return: If the pair is streaming.
+        """
+        with self._running_lock:
+            return self._running
+
+    def _set_running(self, value):
+        with self._running_lock:
+            self._running = value
+
+    def _count(self, name):
+        with self._counters_lock:
+            self.counters[name] += 1
+
+    @staticmethod
+    def _call_and_wait(function, *args, **kwargs):
+        """
+        Call a ConnectionManager function that reports the connection
+        status with a callback and wait for that status.
+        :param function: The function to call.
+        :return: The connection status.
+        :raise TimeoutError: If the mediator did not answer in time.
+        """
+        statuses = queue.Queue()
+        function(*args, callback=statuses.put, **kwargs)
+        try:
+            return statuses.get(timeout=CONNECT_TIMEOUT)
+        except queue.Empty:
+            raise TimeoutError("Mediator did not answer")
+
+    @staticmethod
+    def _recv(connection, timeout=CONNECT_TIMEOUT):
+        """
+        Receive a message without blocking forever.
+        :param connection: The connection to receive from.
+        :param timeout: The time in seconds to wait for the message.
+        :return: The message.
+        :raise TimeoutError: If no message was received in time.
+        """
+        timeout_time = time.perf_counter() + timeout
+        while time.perf_counter() < timeout_time:
+            message = connection.socket.recv(block=False)
+            if message is not None:
+                return message
+            time.sleep(POLL_INTERVAL)
+        raise TimeoutError(f"Nothing received on {connection.name}")
+
+    @staticmethod
+    def _login(connection_manager, username):
+        """
+        Sign up the user (or log in if it already exists) and connect
+        its main connection.
+        :param connection_manager: The connection manager of the user.
+        :param username: The username of the user.
+        :raise ValueError: If the mediator refused the user.
+        """
+        status = SessionPair._call_and_wait(connection_manager.add_connector,
+                                            username,
+                                            PASSWORD,
+                                            "signup")
+        if status == "User already exists":
+            status = SessionPair._call_and_wait(
+                connection_manager.add_connector,
+                username,
+                PASSWORD,
+                "login")
+        if status != "ready":
+            raise ValueError(f"{username} could not log in: {status}")
+        status = SessionPair._call_and_wait(connection_manager.add_connection,
+                                            username,
+                                            "main",
+                                            (True, True),
+                                            "main")
+        if status != "ready":
+            raise ValueError(f"{username} could not connect main: {status}")
+
+    @staticmethod
+    def _set_partner(connection_manager, partner_username):
+        """
+        Set the partner of a user.
+        :param connection_manager: The connection manager of the user.
+        :param partner_username: The username of the partner.
+        """
+        main = connection_manager.client.get_connection("main")
+        main.socket.send(Message(MESSAGE_TYPES["server interaction"],
+                                 f"set partner\n{partner_username}"))
+        SessionPair._recv(main)
+
+    @staticmethod
+    def _add_connections(connection_manager, username, connections):
+        """
+        Add connections and wait until they all connect.
+        :param connection_manager: The connection manager of the user.
+        :param username: The username of the user.
+        :param connections: The connections to add like
+                            CONTROLLED_CONNECTIONS.
+        :return: A queue the connection statuses will be put in.
+        """
+        statuses = queue.Queue()
+        for (name,
+             buffer_state,
+             connection_type,
+             only_send,
+             only_recv) in connections:
+            connection_manager.add_connection(username,
+                                              name,
+                                              buffer_state,
+                                              connection_type,
+                                              callback=statuses.put,
+                                              only_send=only_send,
+                                              only_recv=only_recv)
+        return statuses
+
+    def connect(self, server_address):
+        """
+        Log in both clients, make them partners and connect all the
+        connections a session uses.
+        :param server_address: The address of the mediator.
+        :raise ValueError: If the mediator refused a connection.
+        :raise TimeoutError: If the mediator did not answer in time.
+        """
+        self._controlled.start(server_address)
+        self._controller.start(server_address)
+        SessionPair._login(self._controlled, self.controlled_username)
+        SessionPair._login(self._controller, self.controller_username)
+        SessionPair._set_partner(self._controlled, self.controller_username)
+        SessionPair._set_partner(self._controller, self.controlled_username)
+        statuses = [
+            SessionPair._add_connections(self._controlled,
+                                         self.controlled_username,
+                                         CONTROLLED_CONNECTIONS),
+            SessionPair._add_connections(self._controller,
+                                         self.controller_username,
+                                         CONTROLLER_CONNECTIONS)]
+        for connection_statuses in statuses:
+            for _ in CONTROLLED_CONNECTIONS:
+                try:
+                    status = connection_statuses.get(timeout=CONNECT_TIMEOUT)
+                except queue.Empty:
+                    raise TimeoutError("Mediator did not answer")
+                if status != "ready":
+                    raise ValueError(f"Could not connect: {status}")
+        self.connected = True
+        logging.info(f"LOAD:Pair {self.controlled_username} connected")
+
+    def _run_loop(self, loop, *args):
+        """
+        Run a loop of the pair and save its error if it crashes.
+        :param loop: The loop to run.
+        """
+        try:
+            loop(*args)
+        except Exception as e:
+            print(e)
+            logging.error(f"LOAD:Pair {self.controlled_username} crashed",
+                          exc_info=True)
+            self.error = e
+            self._set_running(False)
+
+    def _send_frames(self):
+        """
+        Send frames at the frame rate. Like ScreenStreamer, wait for an
+        ACK before sending the next frame.
+        """
+        connection = self._controlled.client.get_connection(FRAME_CONNECTION)
+        sequence_number = 0
+        next_frame_time = time.perf_counter()
+        while self.running:
+            now = time.perf_counter()
+            if now < next_frame_time:
+                time.sleep(min(next_frame_time - now, POLL_INTERVAL))
+                continue
+            next_frame_time = max(next_frame_time + self._frame_interval,
+                                  now)
+            sequence_number += 1
+            with self._send_times_lock:
+                self._frame_send_times[sequence_number] = now
+            connection.socket.send(Message(
+                MESSAGE_TYPES["controlled"],
+                FRAME_HEADER.pack(sequence_number) + self._frame_content))
+            self._count("frames sent")
+            while self.running:
+                if connection.socket.recv(block=False) is not None:
+                    break
+                time.sleep(POLL_INTERVAL)
+
+    def _receive_frames(self):
+        """
+        Receive frames, measure their latency and ACK them like
+        StreamedImage.
+        """
+        connection = self._controller.client.get_connection(FRAME_CONNECTION)
+        while self.running:
+            message = connection.socket.recv(block=False)
+            if message is None:
+                time.sleep(POLL_INTERVAL)
+                continue
+            now = time.perf_counter()
+            sequence_number, = FRAME_HEADER.unpack_from(message.content)
+            with self._send_times_lock:
+                send_time = self._frame_send_times.pop(sequence_number)
+            self.frame_latency.add(now - send_time)
+            self._count("frames received")
+            connection.socket.send(Message(MESSAGE_TYPES["controller"],
+                                           "Message received"))
+
+    def _replay_input(self):
+        """
+        Replay the input events in a loop.
+        """
+        connections = {
+            name: self._controller.client.get_connection(name)
+            for name in (MOUSE_CONNECTION, KEYBOARD_CONNECTION)}
+        next_event_time = time.perf_counter()
+        sequence_number = 0
+        while self.running:
+            for event in self._input_events:
+                next_event_time += event.delay
+                delay = next_event_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                if not self.running:
+                    break
+                sequence_number += 1
+                with self._send_times_lock:
+                    self._input_send_times[event.connection_name][
+                        sequence_number] = time.perf_counter()
+                connections[event.connection_name].socket.send(Message(
+                    MESSAGE_TYPES["controller"],
+                    f"{event.content}{INPUT_SEQUENCE_SEPARATOR}"
+                    f"{sequence_number}"))
+                self._count("input events sent")
+
+    def _receive_input(self, connection_name):
+        """
+        Receive input events and measure their latency. The events
+        before the received one that did not arrive were replaced by
+        newer ones on the way.
+        :param connection_name: The name of the connection to receive
+                                from.
+        """
+        connection = self._controlled.client.get_connection(connection_name)
+        while self.running:
+            message = connection.socket.recv(block=False)
+            if message is None:
+                time.sleep(POLL_INTERVAL)
+                continue
+            now = time.perf_counter()
+            _, _, sequence_number = message.get_content_as_text().rpartition(
+                INPUT_SEQUENCE_SEPARATOR)
+            sequence_number = int(sequence_number)
+            replaced = 0
+            with self._send_times_lock:
+                send_times = self._input_send_times[connection_name]
+                while next(iter(send_times)) != sequence_number:
+                    send_times.popitem(last=False)
+                    replaced += 1
+                send_time = send_times.pop(sequence_number)
+            self.input_latency.add(now - send_time)
+            self._count("input events received")
+            for _ in range(replaced):
+                self._count("input events replaced")
+
+    def start(self):
+        """
+        Start streaming frames and replaying input events.
+        """
+        self._set_running(True)
+        loops = [(self._send_frames,),
+                 (self._receive_frames,),
+                 (self._receive_input, MOUSE_CONNECTION),
+                 (self._receive_input, KEYBOARD_CONNECTION)]
+        if self._input_events:
+            loops.append((self._replay_input,))
+        for loop in loops:
+            thread = threading.Thread(
+                name=(f"Pair {self.controlled_username} "
+                      f"{loop[0].__name__} thread"),
+                target=self._run_loop,
+                args=loop)
+            self._threads.append(thread)
+            thread.start()
+
+    def _connections_alive(self):
+        """
+        :return: True if every connection of both clients is still
+                 connected, False otherwise.
+        """
+        for connection_manager in (self._controlled, self._controller):
+            client = connection_manager.client
+            if client is None:
+                return False
+            for connection in client.get_all_connections():
+                if connection.status is not ConnectionStatus.CONNECTED:
+                    return False
+        return True
+
+    def stop(self):
+        """
+        Stop streaming.
+        :return: True if the session was sustained until now, False
+                 otherwise.
+        """
+        sustained = (self.connected
+                     and self.running
+                     and self.error is None
+                     and self._connections_alive())
+        self._set_running(False)
+        for thread in self._threads:
+            thread.join()
+        return sustained
+
+    def close(self):
+        """
+        Disconnect both clients from the mediator.
+        :return: True if both clients closed in time, False otherwise.
+        """
+        close_threads = []
+        for connection_manager in (self._controlled, self._controller):
+            close_thread = threading.Thread(
+                name=f"Pair {self.controlled_username} close thread",
+                target=connection_manager.close,
+                daemon=True)
+            close_thread.start()
+            close_threads.append(close_thread)
+        timeout_time = time.perf_counter() + CLOSE_TIMEOUT
+        for close_thread in close_threads:
+            close_thread.join(max(0, timeout_time - time.perf_counter()))
+        if any(close_thread.is_alive() for close_thread in close_threads):
+            logging.warning(f"LOAD:Pair {self.controlled_username} "
+                            f"did not close in time")
+            return False
+        return True
@@ -0,0 +1,114 @@
+"""
+Decides when the server can send frames so input is not stuck behind
+them
+"""
+__author__ = "Ron Remets"
+
+import threading
+
+from rate_limiter import TokenBucket
+
+# The time in seconds worth of bytes every bucket can send at once.
+EGRESS_BURST_TIME = 0.1
+
+
+class EgressScheduler(object):
+    """
+    Shapes the traffic the server sends to the clients.
+    Every session (a client and the messages it receives from its
+    partner) has a cap on the bytes per second it gets, and frames can
+    only take a share of it. Input and settings are never delayed, but
+    the bytes they take are counted, so frames slow down to make room
+    for them. On top of that, all the sessions share a cap on the bytes
+    per second of the server.
+    THREAD SAFE
+    """
+    def __init__(self, server_rate, session_rate, default_frame_share):
+        """
+        :param server_rate: The most bytes per second the server sends.
+        :param session_rate: The most bytes per second every session
+                             gets.
+        :param default_frame_share: The part (0 to 1) of the session's
+                                    bytes that frames can take.
+        """
+        self._session_rate = session_rate
+        self._default_frame_share = default_frame_share
+        self._server_bucket = TokenBucket(
+            server_rate,
+            server_rate * EGRESS_BURST_TIME)
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+
+    def _create_bucket(self, rate):
+        """
+        :param rate: The bytes per second of the bucket.
+        :return: A token bucket that bursts EGRESS_BURST_TIME worth of
+                 bytes.
+        """
+        return TokenBucket(rate, rate * EGRESS_BURST_TIME)
+
+    def _get_session(self, username):
+        """
+        Get the buckets of a session, creating them if needed.
+        :param username: The username of the client that receives.
+        :return: A tuple like (session bucket, frames bucket)
+        """
+        with self._sessions_lock:
+            if username not in self._sessions:
+                self._sessions[username] = (
+                    self._create_bucket(self._session_rate),
+                    self._create_bucket(
+                        self._session_rate * self._default_frame_share))
+            return self._sessions[username]
+
+    def set_frame_share(self, username, frame_share):
+        """
+        Change the part of the session's bytes that frames can take.
+        :param username: The username of the client that receives.
+        :param frame_share: The part (0 to 1) frames can take.
+        """
+        _, frames_bucket = self._get_session(username)
+        frame_rate = self._session_rate * frame_share
+        frames_bucket.set_rate(frame_rate, frame_rate * EGRESS_BURST_TIME)
+
+    def can_send_frame(self, username):
+        """
+        Check whether a frame can be sent to a client now.
+        :param username: The username of the client that receives.
+        :return: True if the frame can be sent, False otherwise
+        """
+        session_bucket, frames_bucket = self._get_session(username)
+        return (frames_bucket.has_tokens()
+                and session_bucket.has_tokens()
+                and self._server_bucket.has_tokens())
+
+    def consume_frame(self, username, length):
+        """
+        Count a frame that was sent to a client.
+        :param username: The username of the client that receives.
+        :param length: The length of the content of the frame.
+        """
+        session_bucket, frames_bucket = self._get_session(username)
+        frames_bucket.consume(length)
+        session_bucket.consume(length)
+        self._server_bucket.consume(length)
+
+    def consume_input(self, username, length):
+        """
+        Count an input or settings message that was sent to a client.
+        These are sent right away, so this only slows down the frames
+        that come after them.
+        :param username: The username of the client that receives.
+        :param length: The length of the content of the message.
+        """
+        session_bucket, _ = self._get_session(username)
+        session_bucket.consume(length)
+        self._server_bucket.consume(length)
+
+    def remove_session(self, username):
+        """
+        Remove the buckets of a session.
+        :param username: The username of the client that receives.
+        """
+        with self._sessions_lock:
+            self._sessions.pop(username, None)
@@ -7,7 +7,7 @@ __author__ = "Ron Remets"
 import logging
 import sys
 
-from server import Server
+from server import Server, DEFAULT_SHUTDOWN_TIMEOUT
 from users_database import UsersDatabase
 
 logging.basicConfig(level=logging.DEBUG)
@@ -39,34 +39,50 @@ def _command_check_server_status(server):
     return False
 
 
-def _command_shutdown_server(server):
+def _shutdown_server(server, timeout=DEFAULT_SHUTDOWN_TIMEOUT):
     """
-    Close server threads
+    Close server threads and print how long every phase took
     :param server: The server to shutdown
-    :return: Whether to close the server
+    :param timeout: The amount of seconds the clients have to
+                    disconnect before they are force closed.
     """
-    # print("Type the timeout for shutdown. Type 'None' to not use timeout")
-    # timeout = input()
-    # if timeout.lower() != "none":
-    #     try:
-    #         timeout = float(timeout)
-    #     except ValueError as value_error:
-    #         print(value_error)
-    #         logging.error("Input was not a number, aborting shutdown")
-    #         print("Please enter a number or None. Aborting shutdown.")
-    #         return False
-    # else:
-    #     timeout = None
-
     logging.info(f"MAIN:Shutting down server")
     try:
-        server.shutdown()
+        report = server.shutdown(timeout)
     except Exception as e:
         print(e)
         logging.critical("MAIN:Error while Shutting down server:",
                          exc_info=True)
     else:
         logging.info(f"MAIN:Shut down server")
+        print(f"Disconnected {report['clients']} clients, "
+              f"force closed {report['force closed']}")
+        for phase, duration in report["phases"].items():
+            print(f"{phase}: {duration:.3f} seconds")
+
+
+def _command_shutdown_server(server):
+    """
+    Close server threads
+    :param server: The server to shutdown
+    :return: Whether to close the server
+    """
+    print("Type the timeout for shutdown. Type 'None' to not use timeout. "
+          f"Leave empty for {DEFAULT_SHUTDOWN_TIMEOUT} seconds")
+    timeout = input()
+    if timeout == "":
+        timeout = DEFAULT_SHUTDOWN_TIMEOUT
+    elif timeout.lower() != "none":
+        try:
+            timeout = float(timeout)
+        except ValueError as value_error:
+            print(value_error)
+            logging.error("Input was not a number, aborting shutdown")
+            print("Please enter a number or None. Aborting shutdown.")
+            return False
+    else:
+        timeout = None
+    _shutdown_server(server, timeout)
     return False
 
 
@@ -101,8 +117,8 @@ def _command_quick_close(server):
     :return: Whether to close the server
     """
     try:
-        if not _command_shutdown_server(server):
-            _command_close_server(server)
+        _shutdown_server(server)
+        _command_close_server(server)
     except Exception as e:
         print(e)
         logging.critical("MAIN:Error while quick closing server:",
@@ -0,0 +1,163 @@
+"""
+Limits how fast users can send messages to the server
+"""
+__author__ = "Ron Remets"
+
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    A token bucket. Tokens are added at a constant rate until the bucket
+    is full and every message takes tokens out of it.
+    A message can take more tokens than the bucket has, leaving the
+    bucket in debt until it refills. That way messages bigger than the
+    bucket can still pass, just less often.
+    THREAD SAFE
+    """
+    def __init__(self, rate, capacity=None):
+        """
+        :param rate: The amount of tokens added every second.
+        :param capacity: The most tokens the bucket can hold. If None,
+                         the bucket holds a second worth of tokens.
+        """
+        if capacity is None:
+            capacity = rate
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._last_refill_time = time.monotonic()
+        self._tokens_lock = threading.Lock()
+
+    def set_rate(self, rate, capacity=None):
+        """
+        Change how fast tokens are added to the bucket.
+        :param rate: The amount of tokens added every second.
+        :param capacity: The most tokens the bucket can hold. If None,
+                         the bucket holds a second worth of tokens.
+        """
+        if capacity is None:
+            capacity = rate
+        with self._tokens_lock:
+            self._refill()
+            self._rate = rate
+            self._capacity = capacity
+            self._tokens = min(self._tokens, capacity)
+
+    def _refill(self):
+        """
+        Add the tokens that were added since the last refill.
+        Call this only while holding self._tokens_lock.
+        """
+        current_time = time.monotonic()
+        self._tokens = min(
+            self._capacity,
+            self._tokens
+            + (current_time - self._last_refill_time) * self._rate)
+        self._last_refill_time = current_time
+
+    def has_tokens(self):
+        """
+        Check whether the bucket is not in debt and can let a message
+        pass.
+        :return: True if it has tokens, False otherwise
+        """
+        with self._tokens_lock:
+            self._refill()
+            return self._tokens > 0
+
+    def time_until_tokens(self):
+        """
+        :return: The amount of seconds until the bucket has tokens.
+        """
+        with self._tokens_lock:
+            self._refill()
+            if self._tokens > 0:
+                return 0
+            return -self._tokens / self._rate
+
+    def consume(self, amount=1):
+        """
+        Take tokens out of the bucket even if it does not have enough.
+        :param amount: The amount of tokens to take.
+        """
+        with self._tokens_lock:
+            self._refill()
+            self._tokens -= amount
+
+
+class RateLimiter(object):
+    """
+    Keeps a token bucket of messages and a token bucket of bytes for
+    every user and type of connection.
+    THREAD SAFE
+    """
+    def __init__(self, limits):
+        """
+        :param limits: A dict like {connection type: (messages per
+                       second, bytes per second)}. Connection types
+                       that are not in it are not limited.
+        """
+        self._limits = limits
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+
+    def _get_buckets(self, username, connection_type):
+        """
+        Get the buckets of a user's connection type, creating them if
+        needed.
+        :param username: The username of the user.
+        :param connection_type: The type of the connection.
+        :return: A tuple like (messages bucket, bytes bucket) or None if
+                 the connection type is not limited.
+        """
+        if connection_type not in self._limits:
+            return None
+        key = (username, connection_type)
+        with self._buckets_lock:
+            if key not in self._buckets:
+                messages_rate, bytes_rate = self._limits[connection_type]
+                self._buckets[key] = (TokenBucket(messages_rate),
+                                      TokenBucket(bytes_rate))
+            return self._buckets[key]
+
+    def time_until_allowed(self, username, connection_type):
+        """
+        Check how long until the user can send another message through
+        the connection type.
+        :param username: The username of the user.
+        :param connection_type: The type of the connection.
+        :return: The amount of seconds until the user is within his
+                 limits again, 0 if he did not pass them.
+        """
+        buckets = self._get_buckets(username, connection_type)
+        if buckets is None:
+            return 0
+        messages_bucket, bytes_bucket = buckets
+        return max(messages_bucket.time_until_tokens(),
+                   bytes_bucket.time_until_tokens())
+
+    def consume(self, username, connection_type, message_length):
+        """
+        Count a message the user sent through the connection type.
+        :param username: The username of the user.
+        :param connection_type: The type of the connection.
+        :param message_length: The length of the content of the message.
+        """
+        buckets = self._get_buckets(username, connection_type)
+        if buckets is None:
+            return
+        messages_bucket, bytes_bucket = buckets
+        messages_bucket.consume()
+        bytes_bucket.consume(message_length)
+
+    def remove_user(self, username):
+        """
+        Remove the buckets of a user.
+        :param username: The username of the user.
+        """
+        with self._buckets_lock:
+            for key in list(self._buckets.keys()):
+                if key[0] == username:
+                    del self._buckets[key]
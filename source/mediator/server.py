@@ -5,6 +5,7 @@ TODO: Add exception handling.
 
 __author__ = "Ron Remets"
 
+import bisect
 import enum
 import logging
 import socket
@@ -22,7 +23,11 @@ from communication.advanced_socket import AdvancedSocket
 from communication.connection import Connection, ConnectionStatus
 from users_database import UsersDatabase
 from token_generator import TokenGenerator
+from rate_limiter import RateLimiter
+from egress_scheduler import EgressScheduler
 from communication.connector import Connector
+from communication.frame_timing import add_timestamps, has_timing
+from communication.mouse_events import is_mouse_move
 
 # TODO: Add a DNS request instead of static IP and port.
 DEFAULT_SERVER_ADDRESS = ("0.0.0.0", 2125)
@@ -30,6 +35,55 @@ DEFAULT_SERVER_ADDRESS = ("0.0.0.0", 2125)
 #  set it
 DEFAULT_REFRESH_RATE = 2
 DEFAULT_DB_FILENAME = 'users.db'
+# The amount of usernames in a page if the client did not ask for an
+# amount and the most usernames the server will send in one page.
+DEFAULT_USERNAMES_PAGE_SIZE = 50
+MAX_USERNAMES_PAGE_SIZE = 200
+# The time in seconds the clients have to disconnect when shutting down
+# before they are force closed.
+DEFAULT_SHUTDOWN_TIMEOUT = 30
+# The time in seconds between checks if all clients disconnected
+SHUTDOWN_POLL_INTERVAL = 0.05
+# The limits of the messages every user can send through every type of
+# connection like {connection type: (messages per second, bytes per
+# second)}. A user can send a second worth of messages at once.
+RATE_LIMITS = {
+    "connector": (10, 2**14),
+    "main": (20, 2**16),
+    "settings": (20, 2**16),
+    "keyboard - sender": (200, 2**18),
+    "mouse - sender": (500, 2**18),
+    "frame - sender": (60, 2**25)}
+# The time in seconds a connection whose partner is behind waits before
+# trying again.
+RATE_LIMIT_RETRY_DELAY = 0.005
+# The most time in seconds a connection that passed its limits waits
+# at once, so it still notices when it closes.
+MAX_RATE_LIMIT_WAIT = 0.1
+# The most messages the server stores for every connection. When full,
+# the server stops receiving from the connection until it catches up.
+MAX_RECEIVED_MESSAGES = 256
+# The most connections that can connect (login, signup or use a token)
+# at the same time. The rest are told the server is busy.
+MAX_CONCURRENT_HANDSHAKES = 32
+# The time in seconds a connection has to connect and the time between
+# checks if it sent the next part of the handshake.
+HANDSHAKE_TIMEOUT = 10
+HANDSHAKE_POLL_INTERVAL = 0.001
+# The most bytes per second the server sends to all the clients and to
+# every client.
+SERVER_EGRESS_RATE = 2**27
+SESSION_EGRESS_RATE = 2**24
+# The part of the bytes every client gets that frames can take if the
+# client did not choose one, and the range the client can choose from.
+# The rest is kept for input. The app never chooses one, it is an admin
+# knob of the raw protocol (See _set_frame_share).
+DEFAULT_FRAME_SHARE = 0.8
+MIN_FRAME_SHARE = 0.1
+MAX_FRAME_SHARE = 0.95
+# The time in seconds to wait before checking again if a frame can be
+# sent.
+EGRESS_RETRY_DELAY = 0.002
 # context = ssl.create_default_context()
 # context.check_hostname = False
 # context.verify_mode = ssl.VerifyMode.CERT_NONE
@@ -96,9 +150,6 @@ class ServerDisconnectedError(DisconnectedError):
 # TODO: make every connection have its loop in its thread
 #  and share a buffer instead
 # TODO: what if connector has ERROR while closing?
-# TODO: server close - close now, server shutdown - tell connector to
-#  close everything
-#  server crash - kill everything
 
 # TODO: remember that Message().get_content_as_text()
 #  can raise UnicodeDecodeError!
@@ -113,10 +164,18 @@ class Server(object):
         self._server_socket = None
         self._clients = None
         self._token_generator = TokenGenerator()
+        self._rate_limiter = RateLimiter(RATE_LIMITS)
+        self._egress_scheduler = EgressScheduler(SERVER_EGRESS_RATE,
+                                                 SESSION_EGRESS_RATE,
+                                                 DEFAULT_FRAME_SHARE)
+        self._handshakes = threading.BoundedSemaphore(
+            MAX_CONCURRENT_HANDSHAKES)
         self._accept_connections_thread = None
         self._running_lock = threading.Lock()
+        self._accepting_lock = threading.Lock()
         self._clients_lock = threading.Lock()
         self._set_running(False)
+        self._set_accepting(False)
 
     @property
     def running(self):
@@ -130,6 +189,18 @@ class Server(object):
         with self._running_lock:
             self._running = value
 
+    @property
+    def accepting(self):
+        """
+        :return: If the server accepts new connections.
+        """
+        with self._accepting_lock:
+            return self._accepting
+
+    def _set_accepting(self, value):
+        with self._accepting_lock:
+            self._accepting = value
+
     def _set_partner(self, connection, client, partner_username):
         """
         Set a client's partner.
@@ -146,6 +217,32 @@ class Server(object):
             "set partner"))
         logging.info(f"set partner to: partner_username")
 
+    def _set_frame_share(self, connection, client, params):
+        """
+        Set the part of the bytes the client receives that frames can
+        take. The rest is kept for input.
+        This is an admin knob of the raw protocol, the app does not send
+        it. Send it through the "main" connection of the user that
+        receives the frames, before or during its session:
+            set frame share
+            {share between MIN_FRAME_SHARE and MAX_FRAME_SHARE}
+        The answer is "set frame share". The share is kept until the
+        user disconnects.
+        :param connection: The connection to the user
+        :param client: The client
+        :param params: The lines of the request like [command, share]
+        :raise ValueError: If the share is not a number.
+        """
+        frame_share = max(MIN_FRAME_SHARE,
+                          min(float(params[1]), MAX_FRAME_SHARE))
+        self._egress_scheduler.set_frame_share(client.user.username,
+                                               frame_share)
+        connection.socket.send(Message(
+            MESSAGE_TYPES["server interaction"],
+            "set frame share"))
+        logging.info(f"MAIN SERVER:set frame share of "
+                     f"{client.user.username} to {frame_share}")
+
     def _get_all_usernames(self, connection, db_connection):
         """
         Send all usernames to a user
@@ -171,6 +268,85 @@ class Server(object):
             MESSAGE_TYPES["server interaction"],
             formatted_response))
 
+    @staticmethod
+    def _parse_usernames_page_request(params):
+        """
+        Parse the parameters of a request for a page of usernames.
+        :param params: The lines of the request like
+                       [command, prefix, cursor, page size]. All but the
+                       command can be left out.
+        :return: A tuple like (prefix, cursor, page size)
+        :raise ValueError: If the page size is not a number.
+        """
+        prefix = params[1] if len(params) > 1 else ""
+        cursor = params[2] if len(params) > 2 else ""
+        if len(params) > 3 and params[3] != "":
+            page_size = int(params[3])
+        else:
+            page_size = DEFAULT_USERNAMES_PAGE_SIZE
+        page_size = max(1, min(page_size, MAX_USERNAMES_PAGE_SIZE))
+        return prefix, cursor, page_size
+
+    @staticmethod
+    def _send_usernames_page(connection, usernames, next_cursor):
+        """
+        Send a page of usernames to a user.
+        The first line is the cursor of the next page (empty if this is
+        the last page) and every line after it is a username.
+        :param connection: The connection to the user
+        :param usernames: The usernames in the page
+        :param next_cursor: The cursor of the next page or None
+        """
+        if next_cursor is None:
+            next_cursor = ""
+        connection.socket.send(Message(
+            MESSAGE_TYPES["server interaction"],
+            "\n".join([next_cursor, *usernames])))
+
+    def _get_usernames_page(self, connection, db_connection, params):
+        """
+        Send a user a page of the usernames in the database
+        :param connection: The connection to the user
+        :param db_connection: The connection to the database
+        :param params: The parameters of the request
+                       (See _parse_usernames_page_request)
+        """
+        prefix, cursor, page_size = Server._parse_usernames_page_request(
+            params)
+        usernames, next_cursor = db_connection.get_usernames_page(
+            prefix,
+            cursor,
+            page_size)
+        logging.debug(f"MAIN SERVER:Sending {len(usernames)} usernames "
+                      f"after '{cursor}' with prefix '{prefix}'")
+        Server._send_usernames_page(connection, usernames, next_cursor)
+
+    def _get_connected_usernames_page(self, connection, params):
+        """
+        Send a user a page of the usernames of the connected users
+        :param connection: The connection to the user
+        :param params: The parameters of the request
+                       (See _parse_usernames_page_request)
+        """
+        prefix, cursor, page_size = Server._parse_usernames_page_request(
+            params)
+        with self._clients_lock:
+            usernames = sorted(self._clients.keys())
+        if cursor >= prefix:
+            start = bisect.bisect_right(usernames, cursor)
+        else:
+            start = bisect.bisect_left(usernames, prefix)
+        page = []
+        for username in usernames[start:]:
+            if not username.startswith(prefix) or len(page) > page_size:
+                break
+            page.append(username)
+        next_cursor = None
+        if len(page) > page_size:
+            page.pop()
+            next_cursor = page[-1]
+        Server._send_usernames_page(connection, page, next_cursor)
+
     def _generate_token(self, name, connection, client):
         """
         Create a token and send it to the client.
@@ -202,7 +378,33 @@ class Server(object):
             client.connector_close_all_connections(server_side)
         finally:
             with self._clients_lock:
-                self._clients.remove(client)
+                self._clients.pop(client.user.username, None)
+            self._rate_limiter.remove_user(client.user.username)
+            self._egress_scheduler.remove_session(client.user.username)
+
+    def _recv_limited(self, connection, client):
+        """
+        Receive a message from a connection only if the client did not
+        pass the limits of the connection. Otherwise, wait until it is
+        within them again (at most MAX_RATE_LIMIT_WAIT), so the messages
+        stay in the socket and the client has to slow down.
+        :param connection: The connection to receive from
+        :param client: The client of the connection
+        :return: The message or None if there is no message or the
+                 client passed its limits.
+        """
+        username = client.user.username
+        wait_time = self._rate_limiter.time_until_allowed(username,
+                                                          connection.type)
+        if wait_time > 0:
+            time.sleep(min(wait_time, MAX_RATE_LIMIT_WAIT))
+            return None
+        message = connection.socket.recv(block=False)
+        if message is not None:
+            self._rate_limiter.consume(username,
+                                       connection.type,
+                                       len(message.content))
+        return message
 
     def _handle_connector_command(self,
                                   connector,
@@ -254,7 +456,7 @@ class Server(object):
                 elif connector.status is not ConnectionStatus.CONNECTED:
                     break
                 time.sleep(0)  # Release GIL
-                message = connector.socket.recv(block=False)
+                message = self._recv_limited(connector, client)
                 if message is not None:
                     command = message.get_content_as_text()
                     self._handle_connector_command(connector,
@@ -283,10 +485,10 @@ class Server(object):
             logging.error("CONNECTIONS:Connector error", exc_info=True)
         finally:
             client.stop_adding_connections()
-            connector.status = ConnectionStatus.DISCONNECTING
-            while True:
-                time.sleep(0)
-                pass
+            # If the connector was not closed normally, let the threads
+            # that wait for it know it is not connected anymore.
+            if connector.status is not ConnectionStatus.CLOSED:
+                connector.status = ConnectionStatus.DISCONNECTING
 
     def _run_main(self, connection, client, db_connection):
         while True:
@@ -296,7 +498,7 @@ class Server(object):
             elif not self.running:
                 raise ServerDisconnectedError()
 
-            message = connection.socket.recv(block=False)
+            message = self._recv_limited(connection, client)
             if message is None:
                 continue
             params = message.get_content_as_text().split("\n")
@@ -306,6 +508,13 @@ class Server(object):
                 self._get_all_usernames(connection, db_connection)
             elif params[0] == "get all connected usernames":
                 self._get_all_connected_usernames(connection)
+            elif params[0] == "get usernames page":
+                self._get_usernames_page(connection, db_connection, params)
+            elif params[0] == "get connected usernames page":
+                self._get_connected_usernames_page(connection, params)
+            elif params[0] == "set frame share":
+                # Only sent by admin tools, not by the app
+                self._set_frame_share(connection, client, params)
             else:
                 raise ValueError("No such command")
             # TODO: Delete user and more
@@ -395,11 +604,22 @@ class Server(object):
                                                   partner_connection)
         return partner_connection
 
-    def _send_messages_to_partner(self, partner_connection, buffer):
+    def _send_messages_to_partner(self,
+                                  connection,
+                                  partner_connection,
+                                  buffer,
+                                  partner_username):
         """
-        Send messages from a buffer to partner until connection closes
+        Send messages from a buffer to partner until connection closes.
+        The ACKs of the partner are sent back through the connection, so
+        the client only sends another message after its partner got the
+        last one and no message is lost on the way.
+        :param connection: The connection that sends the messages
         :param partner_connection: The connection of the partner
         :param buffer: A reference to the buffer of messages to send
+                       like (message, when it arrived)
+        :param partner_username: The username of the partner, used to
+                                 shape the traffic of its session.
         """
         can_send_message = True
         try:
@@ -412,14 +632,32 @@ class Server(object):
                 elif not self.running:
                     break
 
-                message = buffer.pop()
-                if message is not None and can_send_message:
-                    partner_connection.socket.send(message)
-                    can_send_message = False
-                elif not can_send_message:
-                    # Receive an ACK
+                if can_send_message:
+                    if not self._egress_scheduler.can_send_frame(
+                            partner_username):
+                        # The client waits for the ACK, so waiting here
+                        # slows it down too.
+                        time.sleep(EGRESS_RETRY_DELAY)
+                        continue
+                    buffered_message = buffer.pop()
+                    if buffered_message is not None:
+                        message, ingress_time = buffered_message
+                        if has_timing(message.content):
+                            # Both at once, every stamp copies the frame
+                            message.content = add_timestamps(
+                                message.content,
+                                ingress=ingress_time,
+                                egress=time.time())
+                        partner_connection.socket.send(message)
+                        self._egress_scheduler.consume_frame(
+                            partner_username,
+                            len(message.content))
+                        can_send_message = False
+                else:
+                    # Receive an ACK and pass it to the client
                     response = partner_connection.socket.recv(block=False)
                     if response is not None:
+                        connection.socket.send(response)
                         can_send_message = True
         except OSError:
             partner_connection.status = ConnectionStatus.DISCONNECTING
@@ -436,7 +674,7 @@ class Server(object):
     def _run_connection_to_partner(self, connection, client):
         """
         Run a connection that sends data to the partner of the client
-        and are buffered.
+        and waits for the partner to ACK every message.
         :param connection: The connection that sends data.
         :param client: The client of the connection.
         :raise DisconnectError: (raises a subclass) if the client,
@@ -444,7 +682,7 @@ class Server(object):
         :raise ValueError: if cant connect to the partner
         """
         logging.info("starting main loop of connection to partner")
-        buffer = MessageBuffer(False)
+        buffer = MessageBuffer(True, MAX_RECEIVED_MESSAGES)
 
         partner_connection = self.get_partner_connection(connection, client)
 
@@ -455,9 +693,14 @@ class Server(object):
                   f"User {client.user.username} to "
                   f"{client.partner.user.username}"),
             target=self._send_messages_to_partner,
-            args=(partner_connection, buffer))
+            args=(connection,
+                  partner_connection,
+                  buffer,
+                  client.partner.user.username))
         partner_thread.start()
 
+        message = None
+        ingress_time = None
         try:
             while True:
                 time.sleep(0)  # Release GIL
@@ -468,15 +711,23 @@ class Server(object):
                 elif not self.running:
                     raise ServerDisconnectedError()
 
-                # Try to receive a message.
-                message = connection.socket.recv(block=False)
+                # Try to receive a message if the last one was added.
+                if message is None:
+                    message = self._recv_limited(connection, client)
+                    # Frames with timestamps say when they arrived, so
+                    # the receiver can tell how long they waited here.
+                    ingress_time = time.time()
                 if message is not None:
-                    # If you did receive a message, add it to the buffer.
-                    buffer.add(message)
-                    # Finally, send an ACK to get another message.
-                    connection.socket.send(Message(
-                        MESSAGE_TYPES["controlled"],
-                        "Message received"))
+                    # The ACK is sent by the partner when it gets the
+                    # message (See _send_messages_to_partner).
+                    try:
+                        buffer.add((message, ingress_time))
+                    except queue.Full:
+                        # The client sends more than the partner
+                        # receives, stop receiving until it catches up.
+                        time.sleep(RATE_LIMIT_RETRY_DELAY)
+                    else:
+                        message = None
         except ConnectionDisconnectedError:
             partner_connection.status = ConnectionStatus.DISCONNECTING
             raise
@@ -500,6 +751,7 @@ class Server(object):
         partner_connection = self.get_partner_connection(connection, client)
         logging.debug(f"Got connection {partner_connection.name} of "
                       f"partner of {client.user.username}")
+        partner_username = client.partner.user.username
         while True:
             time.sleep(0)  # Release GIL
             if partner_connection.status is not ConnectionStatus.CONNECTED:
@@ -508,9 +760,11 @@ class Server(object):
                 raise ConnectionDisconnectedError()
             elif not self.running:
                 raise ServerDisconnectedError()
-            message = connection.socket.recv(block=False)
+            message = self._recv_limited(connection, client)
             if message is not None:
                 partner_connection.socket.send(message)
+                self._egress_scheduler.consume_input(partner_username,
+                                                     len(message.content))
 
     def _get_client(self, connection_name, username, token):
         """
@@ -670,6 +924,27 @@ class Server(object):
             f"added to {client.user.username}")
         return connection, client, database_connection
 
+    def _recv_handshake_message(self,
+                                connection_advanced_socket,
+                                timeout_time):
+        """
+        Receive the next message of the handshake of a connection.
+        :param connection_advanced_socket: The advanced socket of the
+                                           connection.
+        :param timeout_time: The time (like time.time()) to stop waiting
+                             at.
+        :return: The message
+        :raise ValueError: If the time ran out or the server closed.
+        """
+        while time.time() < timeout_time:
+            if not self.running:
+                raise ValueError("Server is closing")
+            message = connection_advanced_socket.recv(block=False)
+            if message is not None:
+                return message
+            time.sleep(HANDSHAKE_POLL_INTERVAL)
+        raise ValueError("Connecting took too long")
+
     def _connect_connection(self, connection_advanced_socket):
         """
         Connect a connection
@@ -678,12 +953,15 @@ class Server(object):
         :return: Connection object and its client object and its
                  connection to the database
         """
-        connecting_method = connection_advanced_socket.recv(
-        ).get_content_as_text()
+        timeout_time = time.time() + HANDSHAKE_TIMEOUT
+        connecting_method = self._recv_handshake_message(
+            connection_advanced_socket,
+            timeout_time).get_content_as_text()
         logging.info("connecting method: " + connecting_method)
         # TODO: dont decode or use base64 on token
-        connection_info = connection_advanced_socket.recv(
-        ).get_content_as_text().split("\n")
+        connection_info = self._recv_handshake_message(
+            connection_advanced_socket,
+            timeout_time).get_content_as_text().split("\n")
 
         try:
             if connecting_method == "login":
@@ -719,10 +997,10 @@ class Server(object):
                 connection_advanced_socket.send(Message(
                     MESSAGE_TYPES["server interaction"],
                     "ready"))
-                # TODO: what if server closes? block=True can hang!
                 # Make sure buffers are empty before switching
-                client_connection_status = connection_advanced_socket.recv(
-                    block=True).get_content_as_text()
+                client_connection_status = self._recv_handshake_message(
+                    connection_advanced_socket,
+                    timeout_time).get_content_as_text()
                 if client_connection_status != "ready":
                     logging.debug(
                         f"CONNECTIONS:Crashed with "
@@ -759,13 +1037,17 @@ class Server(object):
             self._run_main(connection, client, db_connection)
         elif connection.type == "settings":
             logging.info("connecting two ways buffered sender socket")
-            connection.socket.switch_state(True, True)
+            connection.socket.switch_state(True,
+                                          True,
+                                          MAX_RECEIVED_MESSAGES)
             connection.status = ConnectionStatus.CONNECTED
             connection.connected = True
             self._run_buffered_connection_to_partner(connection, client)
         elif connection.type in ("keyboard - sender", "mouse - sender"):
             logging.info("connecting buffered sender socket")
-            connection.socket.switch_state(True, True)
+            connection.socket.switch_state(True,
+                                          True,
+                                          MAX_RECEIVED_MESSAGES)
             # (Does not block) Senders do not need to receive any data.
             # Therefore, the server will never send to them data and
             # thus, their sending threads can be closed to conserve CPU
@@ -773,12 +1055,17 @@ class Server(object):
             logging.debug(
                 f"closing send thread of connection {connection.name}")
             connection.socket.close_send_thread()
+            if connection.type == "mouse - sender":
+                # A fast drag never waits behind its own old moves
+                connection.socket.set_replaceable(is_mouse_move)
             connection.status = ConnectionStatus.CONNECTED
             connection.connected = True
             self._run_buffered_connection_to_partner(connection, client)
         elif connection.type in ("keyboard - receiver", "mouse - receiver"):
             logging.info("connecting buffered receiver socket")
-            connection.socket.switch_state(True, True)
+            connection.socket.switch_state(True,
+                                          True,
+                                          MAX_RECEIVED_MESSAGES)
             # (Does not block) Receivers do not need to send any data.
             # Therefore, the server will never receive from them data
             # and thus, their receiving threads can be closed to conserve
@@ -786,18 +1073,25 @@ class Server(object):
             logging.debug(
                 f"closing recv thread of connection {connection.name}")
             connection.socket.close_recv_thread()
+            connection.socket.set_low_delay()
+            if connection.type == "mouse - receiver":
+                connection.socket.set_replaceable(is_mouse_move)
             connection.status = ConnectionStatus.CONNECTED
             connection.connected = True
             db_connection.close()
         elif connection.type == "frame - sender":
-            logging.info("connecting unbuffered sender socket")
-            connection.socket.switch_state(False, True)
+            logging.info("connecting frame sender socket")
+            connection.socket.switch_state(True,
+                                          True,
+                                          MAX_RECEIVED_MESSAGES)
             connection.status = ConnectionStatus.CONNECTED
             connection.connected = True
             self._run_connection_to_partner(connection, client)
         elif connection.type == "frame - receiver":
-            logging.info("connecting unbuffered receiver socket")
-            connection.socket.switch_state(True, False)
+            logging.info("connecting frame receiver socket")
+            connection.socket.switch_state(True,
+                                          True,
+                                          MAX_RECEIVED_MESSAGES)
             connection.status = ConnectionStatus.CONNECTED
             connection.connected = True
             db_connection.close()
@@ -872,14 +1166,23 @@ class Server(object):
     def _run_connection(self, connection_socket, address):
         """
         run a connection to a client until the server closes
+        Call this only after taking a place in self._handshakes, it is
+        released when the connection finishes connecting.
         :param connection_socket: the socket of the connection
         :param address: the address of the socket
         """
         connection_advanced_socket = AdvancedSocket()
-        connection_advanced_socket.start(connection_socket, True, True)
         try:
-            connection, client, db_connection = self._connect_connection(
-                connection_advanced_socket)
+            try:
+                connection_advanced_socket.start(
+                    connection_socket,
+                    True,
+                    True,
+                    max_received_messages=MAX_RECEIVED_MESSAGES)
+                connection, client, db_connection = self._connect_connection(
+                    connection_advanced_socket)
+            finally:
+                self._handshakes.release()
         # TODO: maybe reconnect socket on value error
         except Exception as e:
             print(e)
@@ -936,11 +1239,28 @@ class Server(object):
             # If main loop exits and does not raise DisconnectError,
             # then that means it is handled in another thread
 
+    @staticmethod
+    def _reject_connection(connection_socket):
+        """
+        Tell a connection that the server is busy and close it. This is
+        done without an AdvancedSocket so rejecting stays cheap while
+        the server is overloaded.
+        :param connection_socket: The socket of the connection
+        """
+        try:
+            connection_socket.sendall(AdvancedSocket._pack_message(Message(
+                MESSAGE_TYPES["server interaction"],
+                "server is busy")))
+        except OSError:
+            pass  # The connection will fail on the client side anyway
+        finally:
+            connection_socket.close()
+
     def _accept_connections(self):
         """
         Accept and handle connections until server closes.
         """
-        while self.running:
+        while self.running and self.accepting:
             try:
                 connection_socket, address = self._server_socket.accept()
                 connection_socket.settimeout(
@@ -953,6 +1273,11 @@ class Server(object):
             except socket.timeout:
                 pass
             else:
+                if not self._handshakes.acquire(blocking=False):
+                    logging.warning(f"ACCEPT:Too many connections are "
+                                    f"connecting, rejecting {address}")
+                    Server._reject_connection(connection_socket)
+                    continue
                 logging.info(f"ACCEPT:New client: {address}")
                 threading.Thread(
                     name=f"Accept {address} thread",
@@ -988,62 +1313,134 @@ class Server(object):
             name="accept connections thread",
             target=self._accept_connections)
         self._set_running(True)
+        self._set_accepting(True)
         self._accept_connections_thread.start()
 
-    def shutdown(self):  # , timeout=None):
+    def _signal_clients(self):
         """
-        Close all threads
-        TODO: remove or keep timeout?
-        param timeout: The amount of seconds to wait for threads to
-                        close before closing the server
-        :raise TimeoutError: If timeout occurs. Some threads might
-                             still be open. Call this again to close
-                             them. (If no timeout occurs, all threads
-                             are closed)
+        Tell the connector of every client to disconnect the client.
+        Every connector does it in its own thread, so all the clients
+        disconnect at the same time.
+        :return: The amount of clients that were told to disconnect.
         """
+        with self._clients_lock:
+            clients = list(self._clients.values())
+        for client in clients:
+            try:
+                connector = client.get_connection("connector")
+            except KeyError:
+                continue  # Still logging in, will be force closed
+            connector.commands.put("disconnect:")
+        return len(clients)
+
+    def _wait_for_clients_to_disconnect(self, timeout_time):
+        """
+        Wait until all the clients disconnect.
+        :param timeout_time: The time (like time.time()) to stop waiting
+                             at. Set to None to wait forever.
+        :return: True if all the clients disconnected, False otherwise.
+        """
+        while timeout_time is None or time.time() < timeout_time:
+            with self._clients_lock:
+                if not self._clients:
+                    return True
+            time.sleep(SHUTDOWN_POLL_INTERVAL)
+        return False
+
+    @staticmethod
+    def _force_close_connection(connection):
+        """
+        Close a connection without telling the other side.
+        :param connection: The connection to close
+        """
+        try:
+            connection.socket.shutdown(block=False)
+            connection.socket.close()
+        except Exception as e:
+            print(e)
+            logging.error(f"SERVER:Error while force closing connection "
+                          f"{connection.name}", exc_info=True)
+        # Break the loops that wait for the connection to change status
+        connection.status = ConnectionStatus.CLOSED
+
+    def _force_close_clients(self):
+        """
+        Close all the connections of the clients that are still
+        connected without telling them.
+        :return: The amount of clients that were force closed.
+        """
+        with self._clients_lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            logging.warning(
+                f"SERVER:Force closing client {client.user.username}")
+            client.stop_adding_connections()
+            self._rate_limiter.remove_user(client.user.username)
+            self._egress_scheduler.remove_session(client.user.username)
+            for connection in client.get_all_connections():
+                # Removing the connection first stops the threads that
+                # wait for the client to not have connections.
+                client.safe_remove_connection(connection.name)
+                Server._force_close_connection(connection)
+        return len(clients)
+
+    def shutdown(self, timeout=DEFAULT_SHUTDOWN_TIMEOUT):
+        """
+        Stop accepting connections and disconnect all the clients at
+        the same time. Clients that did not disconnect until the timeout
+        are force closed.
+        :param timeout: The amount of seconds the clients have to
+                        disconnect. Set to None to wait forever.
+        :return: A dict with the time in seconds every phase of the
+                 shutdown took like {"phases": {phase name: seconds},
+                 "clients": amount of clients,
+                 "force closed": amount of clients force closed}
+        """
+        phases = {}
+        shutdown_start_time = time.time()
+        timeout_time = None
+        if timeout is not None:
+            timeout_time = shutdown_start_time + timeout
+        self._set_accepting(False)
+
+        phase_start_time = time.time()
+        clients = 0
+        if self._clients is not None:
+            clients = self._signal_clients()
+        phases["signal clients"] = time.time() - phase_start_time
+        logging.info(f"SERVER:Told {clients} clients to disconnect")
+
+        phase_start_time = time.time()
+        if self._clients is not None:
+            self._wait_for_clients_to_disconnect(timeout_time)
+        phases["drain clients"] = time.time() - phase_start_time
+
+        phase_start_time = time.time()
         self._set_running(False)
+        force_closed = 0
+        if self._clients is not None:
+            force_closed = self._force_close_clients()
+        phases["force close"] = time.time() - phase_start_time
+        logging.info(f"SERVER:Force closed {force_closed} clients")
+
+        phase_start_time = time.time()
         if self._accept_connections_thread is not None:
+            # The accept thread stops after the refresh rate at most, so
+            # it was probably done while the clients disconnected.
             self._accept_connections_thread.join()
-        """timeout_time = None
-        current_timeout = timeout
-        if timeout is not None:
-            timeout_time = time.time() + timeout
-        self._set_running(False)
-        try:
-            if self._accept_connections_thread is not None:
-                self._accept_connections_thread.join(current_timeout)
-        except RuntimeError as e:
-            # Raise if error is not that thread was already closed
-            if e.args[0] != 'cannot join thread before it is started':
-                raise
-        self._accept_connections_thread = None
-        if timeout is not None:
-            current_timeout = timeout_time - time.time()
-            if current_timeout <= 0:
-                raise TimeoutError()
-        # Other clients can not connect
-        with self._clients_threads_lock:
-            for client_thread in self._clients_threads.values()[:]:
-                if timeout is not None:
-                    current_timeout = timeout_time - time.time()
-                    if current_timeout <= 0:
-                        raise TimeoutError()
-                try:
-                    client_thread.join(current_timeout)
-                except RuntimeError as e:
-                    # Raise if error is not that thread was already closed
-                    if e.args[0] != 'cannot join thread before it is started':
-                        raise
-                if not client_thread.is_alive:
-                    self._clients_threads.remove(client_thread)"""
+        phases["stop accepting"] = time.time() - phase_start_time
+        phases["total"] = time.time() - shutdown_start_time
+        return {"phases": phases,
+                "clients": clients,
+                "force closed": force_closed}
 
     def close(self):
         """
-        Close the server.
+        Close the server. Clients that are still connected are force
+        closed.
         """
-        # TODO: Make sure all connections are closed before calling close
-        #  on server socket
-        # with self._clients_lock:
-        #    for client in self._clients[:]:
-        #        client.close_all_connections()
-        self._server_socket.close()
+        if self._clients is not None:
+            self._force_close_clients()
+        if self._server_socket is not None:
+            self._server_socket.close()
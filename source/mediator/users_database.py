@@ -5,9 +5,13 @@ a database class for users
 __author__ = "Ron Remets"
 
 import logging
+import sys
 
 import sqlite3
 
+# The amount of usernames in a page if the page size is not given.
+DEFAULT_PAGE_SIZE = 50
+
 
 class UsersDatabase(object):
     """
@@ -113,6 +117,57 @@ class UsersDatabase(object):
         logging.warning("No users found")
         return []
 
+    @staticmethod
+    def _get_prefix_upper_bound(prefix):
+        """
+        Get the smallest string that is bigger than every string that
+        starts with the prefix. SQLite compares text by its UTF-8 bytes
+        which are ordered like the code points, so this can be used as
+        an upper bound in a range query.
+        :param prefix: The prefix.
+        :return: The upper bound as a string or None if there is no
+                 upper bound.
+        """
+        while prefix:
+            last_character = ord(prefix[-1])
+            if last_character < sys.maxunicode:
+                return prefix[:-1] + chr(last_character + 1)
+            prefix = prefix[:-1]
+        return None
+
+    def get_usernames_page(self,
+                           prefix="",
+                           cursor="",
+                           limit=DEFAULT_PAGE_SIZE):
+        """
+        Get a page of the usernames in alphabetical order.
+        The usernames are selected with a range on the unique index of
+        the username column so SQLite never scans the whole table, no
+        matter how far the cursor is.
+        :param prefix: Only get usernames that start with this prefix.
+        :param cursor: Only get usernames that come after this one. Use
+                       the cursor returned by the previous page to get
+                       the next page. Use "" to get the first page.
+        :param limit: The maximum amount of usernames in the page.
+        :return: A tuple like (usernames, next cursor). The next cursor
+                 is None if this is the last page.
+        """
+        query = ("SELECT username FROM users\n"
+                 "WHERE username > ? AND username >= ?\n")
+        parameters = [cursor, prefix]
+        upper_bound = UsersDatabase._get_prefix_upper_bound(prefix)
+        if upper_bound is not None:
+            query += "AND username < ?\n"
+            parameters.append(upper_bound)
+        query += "ORDER BY username LIMIT ?"
+        # Get one more username to know if there is another page.
+        parameters.append(limit + 1)
+        self._cursor.execute(query, parameters)
+        usernames = [result[0] for result in self._cursor.fetchall()]
+        if len(usernames) > limit:
+            return usernames[:limit], usernames[limit - 1]
+        return usernames, None
+
     def username_exists(self, username):
         """
         CHeck if a username exists